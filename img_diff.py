@@ -2,6 +2,21 @@ from PIL import Image
 import math
 import operator
 from functools import reduce
+import sys
+import os
+import argparse
+import mmap
+import struct
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import numpy as np
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'source')
+# bytes of pixel rows compared at a time in the memory-mapped mode
+CHUNK_BYTES = 32 << 20
+# in 'auto' mode BMPs at least this large are compared memory-mapped
+MMAP_MIN_BYTES = 256 << 20
 
 
 def image_contrast(img1, img2):
@@ -20,10 +35,383 @@ def image_blend(img1, img2):
     return Image.blend(image1, image2, 0.5)
 
 
+def load_rgb(path):
+    '''
+    :param path: 图像路径
+    :return: ndarray (H, W, 3) uint8
+    '''
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGB'))
+
+
+def pixel_diff(a, b):
+    '''逐像素精确比较两张同样大小的图像
+
+    :param a: ndarray (H, W, 3) uint8
+    :param b: ndarray (H, W, 3) uint8
+    :return: (ndarray (H, W) bool, int, list | None, int) 不同像素的掩码、个数、
+             包围盒[x0, y0, x1, y1]（闭区间，无差异时为None）、各通道的最大差值
+    '''
+    mask = np.any(a != b, axis=2)
+    mismatches = int(np.count_nonzero(mask))
+    if not mismatches:
+        return mask, 0, None, 0
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    bbox = [int(cols[0]), int(rows[0]), int(cols[-1]), int(rows[-1])]
+    max_delta = int(np.abs(a[mask].astype(np.int16) - b[mask]).max())
+    return mask, mismatches, bbox, max_delta
+
+
+def diff_image(a, b, mask):
+    '''差异图：参考图淡化为灰色作底，不同的像素标红，并用绿框圈出差异的包围盒
+
+    :param a: ndarray (H, W, 3) uint8 参考图
+    :param b: ndarray (H, W, 3) uint8 待比较的图
+    :param mask: pixel_diff返回的掩码
+    :return: PIL.Image
+    '''
+    gray = a.mean(axis=2, dtype=np.float32) * 0.25 + 191
+    out = np.repeat(gray.astype(np.uint8)[:, :, None], 3, axis=2)
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if len(rows):
+        x0, x1, y0, y1 = cols[0], cols[-1], rows[0], rows[-1]
+        out[[y0, y1], x0:x1 + 1] = (0, 160, 0)
+        out[y0:y1 + 1, [x0, x1]] = (0, 160, 0)
+    out[mask] = (255, 0, 0)
+    return Image.fromarray(out)
+
+
+def bmp_layout(path):
+    '''读取未压缩24位BMP的像素数据位置
+
+    :param path: BMP文件路径
+    :return: (int, int, int, int, bool) 像素数据的偏移、宽度、高度、每行字节数（含补齐）、
+             文件中的行是否自下而上存放
+    :raise ValueError: 不是未压缩的24位BMP
+    '''
+    with open(path, 'rb') as fp:
+        head = fp.read(14 + 40)
+    if len(head) < 54 or head[:2] != b'BM':
+        raise ValueError(f'{path} is not a BMP file')
+    offset, = struct.unpack_from('<I', head, 10)
+    width, height, _, bpp, compression = struct.unpack_from('<iiHHI', head, 18)
+    if bpp != 24 or compression != 0:
+        raise ValueError(f'{path} is not an uncompressed 24-bit BMP')
+    return offset, width, abs(height), (width * 3 + 3) & ~3, height > 0
+
+
+class MappedBmp:
+    '''
+    只读映射BMP文件，按文件中的行序取出若干行像素，用过的页可以交还系统，
+    常驻内存只与正在比较的行数有关
+    '''
+
+    def __init__(self, path):
+        self.offset, self.width, self.height, self.stride, self.bottom_up = bmp_layout(path)
+        if os.path.getsize(path) < self.offset + self.stride * self.height:
+            raise ValueError(f'{path} is truncated')
+        with open(path, 'rb') as fp:
+            self._mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._mm.close()
+
+    def rows(self, r0, r1):
+        '''文件中第r0到r1-1行的像素（BGR），返回的数组只在下一次release之前有效
+
+        :return: ndarray (r1 - r0, width * 3) uint8
+        '''
+        start = self.offset + r0 * self.stride
+        data = np.frombuffer(self._mm, np.uint8, (r1 - r0) * self.stride, start)
+        return data.reshape(r1 - r0, self.stride)[:, :self.width * 3]
+
+    def release(self, r0, r1):
+        '''不再需要第r0到r1-1行，让系统回收这些页'''
+        start = (self.offset + r0 * self.stride) & ~(mmap.PAGESIZE - 1)
+        end = self.offset + r1 * self.stride
+        if hasattr(self._mm, 'madvise') and end > start:
+            self._mm.madvise(mmap.MADV_DONTNEED, start, end - start)
+
+
+def compare_mapped(golden, output, strict=False, chunk_bytes=CHUNK_BYTES):
+    '''内存映射两张BMP，按行块逐像素比较，不解码整张图
+
+    :param golden: 参考图路径（未压缩24位BMP）
+    :param output: 输出图路径（未压缩24位BMP）
+    :param strict: (bool) 为True时在第一个有差异的行块处停止
+    :param chunk_bytes: (int) 每块的字节数，决定内存占用
+    :return: dict pixels/mismatches/bbox/max_delta/first/chunks/size，first为第一个
+             不同像素[x, y]（按文件中的行序），chunks为各行块的行范围、差异数与最大差值，
+             两图大小不同时size为错误信息；行块的rows为图像中（自上而下）的行范围[y0, y1)
+    '''
+    result = {'pixels': 0, 'mismatches': 0, 'bbox': None, 'max_delta': 0,
+              'first': None, 'chunks': [], 'size': None}
+    with MappedBmp(golden) as a, MappedBmp(output) as b:
+        result['pixels'] = a.width * a.height
+        if (a.width, a.height) != (b.width, b.height):
+            result['size'] = f'size {b.width}x{b.height}, expected {a.width}x{a.height}'
+            return result
+        step = max(1, chunk_bytes // max(a.stride, 1))
+        x0 = y0 = np.iinfo(np.int64).max
+        x1 = y1 = -1
+        for r0 in range(0, a.height, step):
+            r1 = min(r0 + step, a.height)
+            rows_a, rows_b = a.rows(r0, r1), b.rows(r0, r1)
+            mask = (rows_a != rows_b).reshape(r1 - r0, a.width, 3).any(axis=2)
+            mismatches = int(np.count_nonzero(mask))
+            max_delta = 0
+            if mismatches:
+                rows = np.flatnonzero(mask.any(axis=1))
+                cols = np.flatnonzero(mask.any(axis=0))
+                pa = rows_a.reshape(r1 - r0, a.width, 3)[mask].astype(np.int16)
+                max_delta = int(np.abs(pa - rows_b.reshape(r1 - r0, a.width, 3)[mask]).max())
+                # image rows run top-down, BMP rows usually bottom-up
+                if a.bottom_up:
+                    top, bottom = a.height - 1 - (r0 + rows[-1]), a.height - 1 - (r0 + rows[0])
+                else:
+                    top, bottom = r0 + rows[0], r0 + rows[-1]
+                x0, x1 = min(x0, int(cols[0])), max(x1, int(cols[-1]))
+                y0, y1 = min(y0, int(top)), max(y1, int(bottom))
+                if result['first'] is None:
+                    first_x = int(np.flatnonzero(mask[rows[0]])[0])
+                    first_y = r0 + int(rows[0])
+                    result['first'] = [first_x, a.height - 1 - first_y if a.bottom_up else first_y]
+            # drop the views before handing the pages back
+            del rows_a, rows_b
+            a.release(r0, r1)
+            b.release(r0, r1)
+            result['mismatches'] += mismatches
+            result['max_delta'] = max(result['max_delta'], max_delta)
+            rows = [a.height - r1, a.height - r0] if a.bottom_up else [r0, r1]
+            result['chunks'].append({'rows': rows, 'mismatches': mismatches,
+                                     'max_delta': max_delta})
+            if strict and mismatches:
+                break
+        if x1 >= 0:
+            result['bbox'] = [x0, y0, x1, y1]
+    return result
+
+
+def use_mapped(golden, output, mode):
+    '''按mode决定是否用内存映射比较：'mmap'总是，'full'从不，'auto'在两张图都是
+    足够大的未压缩24位BMP时'''
+    if mode != 'auto':
+        return mode == 'mmap'
+    try:
+        bmp_layout(golden)
+        bmp_layout(output)
+    except (OSError, ValueError):
+        return False
+    return max(os.path.getsize(golden), os.path.getsize(output)) >= MMAP_MIN_BYTES
+
+
+def compare_file(golden, output, diff_path=None, mode='auto', strict=False,
+                 chunk_bytes=CHUNK_BYTES):
+    '''比较一张输出图与其参考图
+
+    :param golden: 参考图路径
+    :param output: 输出图路径
+    :param diff_path: 有差异时差异图的保存路径，None表示不保存（内存映射比较时不生成）
+    :param mode: (string) 'full'整张解码后比较，'mmap'内存映射按行块比较，'auto'按文件大小选择
+    :param strict: (bool) 内存映射比较时在第一个有差异的行块处停止
+    :param chunk_bytes: (int) 内存映射比较时每个行块的字节数
+    :return: dict golden/output/status/mismatches/pixels/bbox/max_delta/diff/error，
+             status为'ok'、'mismatch'、'size'、'missing'、'extra'或'error'；
+             内存映射比较时另有first与chunks，见compare_mapped
+    '''
+    result = {'golden': golden, 'output': output, 'status': 'ok', 'mismatches': 0,
+              'pixels': 0, 'bbox': None, 'max_delta': 0, 'diff': None, 'error': None}
+    if not os.path.exists(output):
+        result['status'] = 'missing'
+        return result
+    if not os.path.exists(golden):
+        result['status'] = 'extra'
+        return result
+    try:
+        if use_mapped(golden, output, mode):
+            mapped = compare_mapped(golden, output, strict, chunk_bytes)
+            size = mapped.pop('size')
+            result.update(mapped)
+            if size:
+                result.update(status='size', error=size)
+            elif result['mismatches']:
+                result['status'] = 'mismatch'
+            return result
+        a = load_rgb(golden)
+        b = load_rgb(output)
+        result['pixels'] = a.shape[0] * a.shape[1]
+        if a.shape != b.shape:
+            result['status'] = 'size'
+            result['error'] = f'size {b.shape[1]}x{b.shape[0]}, expected {a.shape[1]}x{a.shape[0]}'
+            return result
+        mask, mismatches, bbox, max_delta = pixel_diff(a, b)
+        if mismatches:
+            result.update(status='mismatch', mismatches=mismatches,
+                          bbox=bbox, max_delta=max_delta)
+            if diff_path:
+                os.makedirs(os.path.dirname(diff_path) or '.', exist_ok=True)
+                diff_image(a, b, mask).save(diff_path)
+                result['diff'] = diff_path
+    except Exception:
+        result['status'] = 'error'
+        result['error'] = traceback.format_exc()
+    return result
+
+
+def list_images(root, ext='.bmp'):
+    '''
+    :return: list of str root下所有以ext结尾的文件的相对路径，已排序
+    '''
+    names = []
+    for folder, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(ext):
+                names.append(os.path.relpath(os.path.join(folder, name), root))
+    return sorted(names)
+
+
+def pair_images(golden_dir, output_dir, diff_dir=None, ext='.bmp'):
+    '''按相对路径配对参考图与输出图，只在一边存在的也列出
+
+    :return: list of (golden, output, diff_path)
+    '''
+    names = sorted(set(list_images(golden_dir, ext)) | set(list_images(output_dir, ext)))
+    return [(os.path.join(golden_dir, name), os.path.join(output_dir, name),
+             os.path.join(diff_dir, os.path.splitext(name)[0] + '.diff.png') if diff_dir else None)
+            for name in names]
+
+
+def compare_pairs(pairs, jobs=1, **options):
+    '''在进程池中比较所有图像对
+
+    :param pairs: list of (golden, output, diff_path)
+    :param jobs: (int) 进程数，为1时在当前进程中依次比较
+    :param options: 传给compare_file的mode/strict/chunk_bytes
+    :return: list of dict compare_file的结果，与pairs顺序一致
+    '''
+    compare = partial(compare_file, **options)
+    if jobs <= 1 or len(pairs) <= 1:
+        return [compare(*pair) for pair in pairs]
+    with ProcessPoolExecutor(min(jobs, len(pairs))) as pool:
+        return list(pool.map(compare, *zip(*pairs), chunksize=4))
+
+
+def import_batch():
+    '''cg_batch位于source目录，按需导入，只做图像比较时不依赖它'''
+    if SOURCE_DIR not in sys.path:
+        sys.path.insert(0, SOURCE_DIR)
+    import cg_batch
+    return cg_batch
+
+
+def render_corpus(scripts, output_root, jobs=1):
+    '''用cg_batch把每个指令文件渲染到output_root下的同名子目录
+
+    :return: (list of str, list of dict) 各脚本的输出目录与cg_batch的运行结果
+    '''
+    cg_batch = import_batch()
+    dirs = cg_batch.output_dirs(scripts, output_root)
+    return dirs, cg_batch.run_batch(scripts, dirs, jobs)
+
+
+def print_results(results, chunk_stats=False, file=None):
+    '''打印有问题的图像，返回有问题的个数
+
+    :param chunk_stats: (bool) 是否打印内存映射比较的各行块统计
+    :param file: 输出位置，缺省为调用时的sys.stdout
+    '''
+    file = file or sys.stdout
+    bad = [r for r in results if r['status'] != 'ok']
+    for r in bad:
+        detail = ''
+        if r['status'] == 'mismatch':
+            detail = (f'{r["mismatches"]} of {r["pixels"]} pixels differ '
+                      f'({r["mismatches"] / r["pixels"]:.4%}), bbox {r["bbox"]}, '
+                      f'max delta {r["max_delta"]}' + (f', diff {r["diff"]}' if r['diff'] else ''))
+            if r.get('first'):
+                detail += f', first at {r["first"]}'
+        elif r['error']:
+            detail = r['error'].rstrip().splitlines()[-1]
+        print(f'{r["status"].upper():8s} {r["output"]}  {detail}', file=file)
+    if chunk_stats:
+        for r in results:
+            for chunk in r.get('chunks', ()):
+                print(f'{r["output"]} rows {chunk["rows"][0]}-{chunk["rows"][1] - 1}: '
+                      f'{chunk["mismatches"]} differ, max delta {chunk["max_delta"]}', file=file)
+    print(f'{len(results)} images compared, {len(results) - len(bad)} identical, '
+          f'{len(bad)} differ or are missing', file=file)
+    return len(bad)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='逐像素比较输出图像与参考图像')
+    sub = parser.add_subparsers(dest='command')
+
+    cmp = sub.add_parser('compare', help='比较两个目录（或两张图）中同名的图像')
+    cmp.add_argument('golden', nargs='?', default='output2', help='参考图像目录或文件')
+    cmp.add_argument('output', nargs='?', default='output', help='输出图像目录或文件')
+
+    reg = sub.add_parser('regress', help='渲染一组指令文件并与参考图像比较')
+    reg.add_argument('scripts', nargs='*', help='指令文件或包含指令文件的目录')
+    reg.add_argument('-m', '--manifest', help='清单文件，每行一个指令文件')
+    reg.add_argument('-g', '--golden', required=True,
+                     help='参考图像根目录，每个指令文件对应其下同名子目录')
+    reg.add_argument('-o', '--output-root', default='regress_output', help='渲染输出根目录')
+    reg.add_argument('--update', action='store_true',
+                     help='把本次渲染结果写为参考图像，不做比较')
+
+    for p in (cmp, reg):
+        p.add_argument('-d', '--diff-dir', help='差异图的输出目录')
+        p.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                       help='进程数，默认为CPU核数')
+        p.add_argument('--mode', choices=('auto', 'full', 'mmap'), default='auto',
+                       help='full整张解码，mmap内存映射按行块比较（只支持未压缩24位BMP），'
+                       f'auto在BMP不小于{MMAP_MIN_BYTES >> 20}MB时用mmap')
+        p.add_argument('--strict', action='store_true',
+                       help='内存映射比较时在第一个有差异的行块处停止')
+        p.add_argument('--chunk-mb', type=float, default=CHUNK_BYTES / 2**20,
+                       help='内存映射比较时每个行块的大小（MB）')
+        p.add_argument('--chunk-stats', action='store_true', help='打印各行块的统计')
+    args = parser.parse_args(argv)
+    if args.command is None:
+        # the old behaviour: compare output2/*.bmp against output/*.bmp
+        args = parser.parse_args(['compare'])
+    options = dict(mode=args.mode, strict=args.strict,
+                   chunk_bytes=max(1, int(args.chunk_mb * 2**20)))
+
+    if args.command == 'regress':
+        scripts = import_batch().collect_scripts(args.scripts, args.manifest)
+        if not scripts:
+            reg.error('no input scripts')
+        root = args.golden if args.update else args.output_root
+        dirs, runs = render_corpus(scripts, root, args.jobs)
+        failed = [r for r in runs if not r['ok']]
+        for r in failed:
+            print(f'FAILED   {r["script"]}\n{r["error"].rstrip()}')
+        if args.update:
+            print(f'{len(scripts) - len(failed)} scripts rendered into {args.golden}')
+            return 1 if failed else 0
+        pairs = []
+        for output_dir in dirs:
+            name = os.path.basename(output_dir)
+            pairs.extend(pair_images(os.path.join(args.golden, name), output_dir,
+                                     args.diff_dir and os.path.join(args.diff_dir, name)))
+        results = compare_pairs(pairs, args.jobs, **options)
+        return 1 if print_results(results, args.chunk_stats) or failed else 0
+
+    if os.path.isdir(args.golden):
+        pairs = pair_images(args.golden, args.output, args.diff_dir)
+    else:
+        pairs = [(args.golden, args.output, args.diff_dir and os.path.join(
+            args.diff_dir, os.path.splitext(os.path.basename(args.output))[0] + '.diff.png'))]
+    results = compare_pairs(pairs, args.jobs, **options)
+    return 1 if print_results(results, args.chunk_stats) else 0
+
+
 if __name__ == "__main__":
-    srcfolder = 'output2'
-    dstfolder = 'output'
-    for i in range(1, 6):
-        src = f'{srcfolder}/{i}.bmp'
-        dst = f'{dstfolder}/{i}.bmp'
-        print(image_contrast(src, dst))
+    sys.exit(main())
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms 的微基准：各光栅化、裁剪与变换函数在不同规模（约10到10000像素/顶点）下的单次耗时，
+# 以及 cg_algorithms_np 中 cg_cli 实际使用的批量路径在不同批量（1到4096个图元）下的单次耗时
+# 结果可存为基线（JSON），之后的运行与基线比较，变慢超过阈值时以非0状态退出
+# 不需要图形界面
+import sys
+import os
+import argparse
+import json
+import math
+import platform
+import re
+import time
+import numpy as np
+import cg_algorithms as alg
+import cg_algorithms_np as npalg
+
+# size class -> approximate pixels drawn (vertices for the transforms)
+SIZES = {'tiny': 10, 'small': 100, 'medium': 1000, 'large': 10000}
+# size class -> primitives per call of the npalg batch paths
+BATCHES = {'tiny': 1, 'small': 16, 'medium': 256, 'large': 4096}
+# pixels per segment of the npalg batches
+SEGMENT = 32
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'bench_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+
+
+def regular_polygon(n, radius, cx=0, cy=0):
+    '''
+    :param n: (int) 顶点数
+    :param radius: (float) 外接圆半径
+    :return: list of list of int 顶点坐标
+    '''
+    return [[round(cx + radius * math.cos(2 * math.pi * i / n)),
+             round(cy + radius * math.sin(2 * math.pi * i / n))] for i in range(n)]
+
+
+def star_segments(n, length, through=False):
+    '''n条方向均匀分布的线段，覆盖所有八分象限
+
+    :param n: (int) 线段数
+    :param length: (int) 线段长度
+    :param through: (bool) 为True时线段以原点为中点，否则以原点为起点
+    :return: ndarray of int64, shape (n, 2, 2)
+    '''
+    ends = np.array(regular_polygon(n, length), dtype=np.int64)
+    starts = -ends if through else np.zeros_like(ends)
+    return np.stack([starts, ends], axis=1)
+
+
+def make_cases(sizes=SIZES):
+    '''生成所有基准用例，规模由画出的像素数（变换为顶点数）决定，
+    npalg/ 开头的批量用例由同一规模名对应的批量（BATCHES）决定
+
+    :param sizes: dict 规模名 -> 像素数
+    :return: list of (name, func, args)
+    '''
+    cases = []
+    for size, pixels in sizes.items():
+        # a 2:1 slope so DDA and Bresenham both step along x
+        line = [[0, 0], [pixels, pixels // 2]]
+        for algorithm in ('DDA', 'Bresenham'):
+            cases.append((f'draw_line/{algorithm}/{size}', alg.draw_line, (line, algorithm)))
+        polygon = regular_polygon(8, max(pixels / (8 * 2 * math.sin(math.pi / 8)), 2))
+        for algorithm in ('DDA', 'Bresenham'):
+            cases.append((f'draw_polygon/{algorithm}/{size}', alg.draw_polygon,
+                          (polygon, algorithm)))
+        # perimeter of a 2:1 ellipse is about 4.84 * b
+        b = max(round(pixels / 9.7), 1)
+        cases.append((f'draw_ellipse/{size}', alg.draw_ellipse,
+                      ([[-2 * b, -b], [2 * b, b]], None)))
+        control = regular_polygon(6, max(pixels / 5, 2))
+        for algorithm in ('Bezier', 'B-spline'):
+            cases.append((f'draw_curve/{algorithm}/{size}', alg.draw_curve,
+                          (control, algorithm)))
+        # both ends outside the window, so every clipping step is taken
+        half = max(pixels // 2, 2)
+        segment = [[-half, -half // 3], [half, half // 3]]
+        window = (-half // 2, -half // 2, half // 2, half // 2)
+        for algorithm in ('Cohen-Sutherland', 'Liang-Barsky'):
+            cases.append((f'clip/{algorithm}/{size}', alg.clip,
+                          (segment, *window, algorithm)))
+        points = regular_polygon(pixels, pixels)
+        cases.append((f'translate/{size}', alg.translate, (points, 3, -7)))
+        cases.append((f'rotate/{size}', alg.rotate, (points, 5, 5, 30)))
+        cases.append((f'scale/{size}', alg.scale, (points, 5, 5, 0.5)))
+
+        # the batch paths cg_cli takes, one call per batch of primitives
+        batch = BATCHES.get(size, max(pixels // 10, 1))
+        segments = star_segments(batch, SEGMENT)
+        for algorithm in ('DDA', 'Bresenham'):
+            cases.append((f'npalg/draw_lines/{algorithm}/{size}', npalg.draw_lines,
+                          (segments, algorithm)))
+            cases.append((f'npalg/draw_lines_spans/{algorithm}/{size}', npalg.draw_lines_spans,
+                          (segments, algorithm)))
+        cases.append((f'npalg/draw_ellipse_spans/{size}', npalg.draw_ellipse_spans,
+                      ([[-2 * b, -b], [2 * b, b]], None)))
+        # as above, both ends of every segment outside the window
+        crossing = star_segments(batch, SEGMENT, through=True)
+        for algorithm in ('Cohen-Sutherland', 'Liang-Barsky'):
+            cases.append((f'npalg/clip_lines/{algorithm}/{size}', npalg.clip_lines,
+                          (crossing, -SEGMENT // 2, -SEGMENT // 2, SEGMENT // 2, SEGMENT // 2,
+                           algorithm)))
+        polygons = [regular_polygon(8, SEGMENT, 4 * i, 2 * i) for i in range(batch)]
+        matrix = npalg.compose(npalg.rotate_matrix(5, 5, 30), npalg.scale_matrix(5, 5, 0.5))
+        cases.append((f'npalg/affine_many/{size}', npalg.affine_many, (matrix, polygons)))
+    return cases
+
+
+def time_case(func, args, repeat=5, min_time=0.02):
+    '''测量一次调用的耗时：先加倍调用次数直到一轮不少于min_time，再取repeat轮中最快的一轮
+
+    :param func: 被测函数
+    :param args: tuple 参数
+    :param repeat: (int) 轮数
+    :param min_time: (float) 每轮的最短时间（秒）
+    :return: (float) 单次调用的秒数
+    '''
+    clock = time.perf_counter
+    number = 1
+    while True:
+        start = clock()
+        for _ in range(number):
+            func(*args)
+        elapsed = clock() - start
+        if elapsed >= min_time:
+            break
+        number *= 2 if elapsed <= 0 else min(max(2, int(min_time / elapsed * 1.2)), 100)
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        start = clock()
+        for _ in range(number):
+            func(*args)
+        best = min(best, (clock() - start) / number)
+    return best
+
+
+def run(cases, repeat=5, min_time=0.02, progress=None):
+    '''
+    :param cases: make_cases的返回值
+    :param progress: callable(name, seconds) | None 每个用例结束时调用
+    :return: dict name -> 单次调用的秒数
+    '''
+    results = {}
+    for name, func, args in cases:
+        results[name] = time_case(func, args, repeat, min_time)
+        if progress:
+            progress(name, results[name])
+    return results
+
+
+def load_baseline(path):
+    with open(path, 'r') as fp:
+        return json.load(fp)
+
+
+def save_baseline(path, results):
+    baseline = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'results': results,
+    }
+    with open(path, 'w') as fp:
+        json.dump(baseline, fp, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    '''与基线比较
+
+    :param results: dict name -> 秒数
+    :param baseline: dict name -> 秒数
+    :param threshold: (float) 允许的相对变慢比例，0.25表示慢25%以内不算回退
+    :return: list of (name, seconds, baseline_seconds | None, ratio | None, regressed)
+    '''
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        if base:
+            ratio = seconds / base
+            rows.append((name, seconds, base, ratio, ratio > 1 + threshold))
+        else:
+            rows.append((name, seconds, None, None, False))
+    return rows
+
+
+def format_rows(rows):
+    width = max([len(row[0]) for row in rows] + [4])
+    lines = [f'{"name":<{width}} {"time(us)":>12} {"base(us)":>12} {"ratio":>7}']
+    for name, seconds, base, ratio, regressed in rows:
+        base_s = f'{base * 1e6:12.2f}' if base else f'{"-":>12}'
+        ratio_s = f'{ratio:7.2f}' if ratio else f'{"-":>7}'
+        lines.append(f'{name:<{width}} {seconds * 1e6:12.2f} {base_s} {ratio_s}'
+                     + ('  REGRESSED' if regressed else ''))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='cg_algorithms与cg_algorithms_np微基准：测量各算法在不同规模下的耗时并与基线比较')
+    parser.add_argument('-b', '--baseline', default=DEFAULT_BASELINE,
+                        help='基线文件（JSON），默认为脚本所在目录下的bench_baseline.json')
+    parser.add_argument('--save', action='store_true',
+                        help='把本次结果写为基线（只更新本次运行的用例）')
+    parser.add_argument('-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='允许的相对变慢比例，超过即判为回退，默认0.25')
+    parser.add_argument('-k', '--filter', default=None,
+                        help='只运行名称匹配该正则表达式的用例，如npalg/只运行批量用例')
+    parser.add_argument('-s', '--sizes', default=','.join(SIZES),
+                        help=f'逗号分隔的规模，可选{",".join(SIZES)}')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='每个用例测量的轮数')
+    parser.add_argument('--min-time', type=float, default=0.02,
+                        help='每轮的最短时间（秒）')
+    parser.add_argument('--json', help='把本次结果另存为JSON文件')
+    args = parser.parse_args(argv)
+
+    unknown = [s for s in args.sizes.split(',') if s not in SIZES]
+    if unknown:
+        parser.error(f'unknown size class: {",".join(unknown)}')
+    cases = make_cases({s: SIZES[s] for s in args.sizes.split(',')})
+    if args.filter:
+        cases = [case for case in cases if re.search(args.filter, case[0])]
+    if not cases:
+        parser.error('no benchmark matches')
+
+    results = run(cases, args.repeat, args.min_time,
+                  progress=lambda name, s: print(f'{name:<44} {s * 1e6:12.2f} us',
+                                                 file=sys.stderr))
+    if args.json:
+        with open(args.json, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        baseline = load_baseline(args.baseline)['results']
+    rows = compare(results, baseline, args.threshold)
+    print(format_rows(rows))
+    regressed = [row[0] for row in rows if row[4]]
+
+    if args.save:
+        save_baseline(args.baseline, {**baseline, **results})
+        print(f'baseline saved to {args.baseline}')
+        return 0
+    if not baseline:
+        print(f'no baseline at {args.baseline}, run with --save to create one')
+        return 0
+    if regressed:
+        print(f'{len(regressed)} of {len(rows)} benchmarks regressed by more than '
+              f'{args.threshold:.0%}: {", ".join(regressed)}')
+        return 1
+    print(f'{len(rows)} benchmarks within {args.threshold:.0%} of the baseline')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
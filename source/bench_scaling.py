@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli 端到端扩展性测试：用 gen_workload 生成不同图元数、画布大小的脚本，
+# 每个脚本在独立的子进程中完整运行，记录墙钟时间与峰值内存（RSS），
+# 输出表格与 JSON/CSV；装有 matplotlib 时另画出耗时与内存随场景规模变化的曲线
+import sys
+import os
+import argparse
+import csv
+import json
+import shlex
+import subprocess
+import tempfile
+import time
+import gen_workload
+
+CG_CLI = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cg_cli.py')
+
+
+def parse_list(text, type=int):
+    return [type(s) for s in text.split(',') if s]
+
+
+def parse_canvas(text):
+    '''"800x600" -> (800, 600)'''
+    w, _, h = text.lower().partition('x')
+    return int(w), int(h or w)
+
+
+def run_cli(script, output_dir, cli_args=()):
+    '''在子进程中运行一个cg_cli脚本
+
+    :param script: str 指令文件
+    :param output_dir: str 输出目录
+    :param cli_args: list of str 额外传给cg_cli的参数
+    :return: (float, int, int) 墙钟时间（秒）、峰值RSS（字节）、退出码
+    '''
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, CG_CLI, script, output_dir, *cli_args],
+                            stdout=subprocess.DEVNULL)
+    # wait4 gives the rusage of this child alone, unlike RUSAGE_CHILDREN
+    _, status, usage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in kilobytes on Linux
+    return wall, usage.ru_maxrss * 1024, proc.returncode
+
+
+def run_scaling(item_counts, canvases, workdir, repeat=1, cli_args=(), progress=None,
+                **workload):
+    '''对每个(画布, 图元数)组合生成脚本并运行
+
+    :param item_counts: list of int 图元数
+    :param canvases: list of (int, int) 画布大小
+    :param workdir: str 存放脚本与输出的目录
+    :param repeat: (int) 每个组合运行的次数，取最快的一次
+    :param cli_args: list of str 额外传给cg_cli的参数
+    :param progress: callable(dict) | None 每个组合结束时调用
+    :param workload: 传给gen_workload.generate的其余参数
+    :return: list of dict
+    '''
+    results = []
+    for width, height in canvases:
+        for items in item_counts:
+            name = f'{width}x{height}_{items}'
+            script = os.path.join(workdir, name + '.txt')
+            with open(script, 'w') as fp:
+                lines = gen_workload.generate(fp, items=items, width=width, height=height,
+                                              **workload)
+            output_dir = os.path.join(workdir, name)
+            os.makedirs(output_dir, exist_ok=True)
+            runs = [run_cli(script, output_dir, cli_args) for _ in range(repeat)]
+            wall = min(r[0] for r in runs)
+            result = {'width': width, 'height': height, 'items': items, 'lines': lines,
+                      'wall': wall, 'peak_rss': max(r[1] for r in runs),
+                      'items_per_sec': items / wall if wall else 0.,
+                      'ok': all(r[2] == 0 for r in runs)}
+            results.append(result)
+            if progress:
+                progress(result)
+    return results
+
+
+def format_result(r):
+    return (f'{r["width"]:>6}x{r["height"]:<6} {r["items"]:>8} {r["lines"]:>9} '
+            f'{r["wall"]:>9.3f} {r["peak_rss"] / 2**20:>10.1f} {r["items_per_sec"]:>11.0f}'
+            + ('' if r['ok'] else '  FAILED'))
+
+
+HEADER = (f'{"canvas":>13} {"items":>8} {"commands":>9} {"wall(s)":>9} '
+          f'{"rss(MB)":>10} {"items/s":>11}')
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='') as fp:
+        writer = csv.DictWriter(fp, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def plot(path, results):
+    '''画出耗时与峰值内存随图元数的变化，每种画布大小一条曲线
+
+    :return: (bool) 是否画出（没有matplotlib时为False）
+    '''
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        return False
+    fig, (ax_time, ax_rss) = plt.subplots(1, 2, figsize=(12, 5))
+    for canvas in dict.fromkeys((r['width'], r['height']) for r in results):
+        rows = [r for r in results if (r['width'], r['height']) == canvas]
+        label = f'{canvas[0]}x{canvas[1]}'
+        ax_time.plot([r['items'] for r in rows], [r['wall'] for r in rows], 'o-', label=label)
+        ax_rss.plot([r['items'] for r in rows], [r['peak_rss'] / 2**20 for r in rows],
+                    'o-', label=label)
+    for ax, ylabel in ((ax_time, 'wall time (s)'), (ax_rss, 'peak RSS (MB)')):
+        ax.set_xscale('log')
+        ax.set_xlabel('items')
+        ax.set_ylabel(ylabel)
+        ax.grid(True, which='both', alpha=0.3)
+        ax.legend()
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='cg_cli端到端扩展性测试：耗时与峰值内存随场景规模的变化')
+    parser.add_argument('--sizes', type=parse_list, default=[100, 1000, 10000],
+                        help='逗号分隔的图元数，如100,1000,10000')
+    parser.add_argument('--canvases', type=lambda s: parse_list(s, parse_canvas),
+                        default=[(800, 600)], help='逗号分隔的画布大小，如800x600,4000x3000')
+    parser.add_argument('-r', '--repeat', type=int, default=1,
+                        help='每个组合运行的次数，取最快的一次')
+    parser.add_argument('--cli-args', type=shlex.split, default=[],
+                        help='额外传给cg_cli的参数，如"-j 4"')
+    parser.add_argument('-o', '--output', default='scaling',
+                        help='结果文件名前缀，写出.json、.csv与.png')
+    parser.add_argument('--workdir', help='存放生成的脚本与输出图像的目录，缺省时用临时目录')
+    gen_workload.add_arguments(parser.add_argument_group(
+        'workload', '生成脚本的参数，见gen_workload.py'), scene=False)
+    args = parser.parse_args(argv)
+    workload = gen_workload.workload_kwargs(args)
+
+    print(HEADER)
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = args.workdir or tmp
+        os.makedirs(workdir, exist_ok=True)
+        results = run_scaling(args.sizes, args.canvases, workdir, args.repeat,
+                              args.cli_args, progress=lambda r: print(format_result(r)),
+                              **workload)
+
+    with open(args.output + '.json', 'w') as fp:
+        json.dump(results, fp, indent=2)
+    write_csv(args.output + '.csv', results)
+    if plot(args.output + '.png', results):
+        print(f'plot written to {args.output}.png')
+    else:
+        print('matplotlib is not installed, skipped the plot '
+              f'(results are in {args.output}.json and {args.output}.csv)')
+    return 0 if all(r['ok'] for r in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -4,6 +4,9 @@
 # 本文件只允许依赖math库
 import math
 
+# Bezier曲线自适应细分时，弦与曲线允许的最大偏差（像素）
+FLATNESS = 0.5
+
 
 def draw_line(p_list, algorithm):
     """绘制线段
@@ -108,103 +111,265 @@ def draw_fold_line(p_list, algorithm):
     return result
 
 
-def draw_ellipse(p_list, algorithm=None):
-    """绘制椭圆（采用中点圆生成算法）
+def circle_quadrant(r):
+    """中点圆生成算法，只计算第一象限中 x <= y 的八分之一圆弧，其余部分沿 y = x 对称得到
+
+    :param r: (int) 半径
+    :return: (list of (int, int)) 相对圆心的第一象限点列表 [(x, 2y), ...]，与ellipse_quadrant的结果逐点一致
+    """
+    x, y = 0, r
+    octant = [(0, 2 * r)]
+    p = 1 - r
+    while x < y:
+        x += 1
+        if p < 0:
+            p += 2*x + 1
+        else:
+            y -= 1
+            p += 2*(x - y) + 1
+        if x > y:
+            break
+        octant.append((x, 2 * y))
+    # a point on the diagonal is its own mirror
+    return octant + [(y2 // 2, 2 * x) for x, y2 in reversed(octant) if 2 * x != y2]
+
+
+def ellipse_quadrant(p_list):
+    """中点椭圆生成算法（纯整数运算），只计算第一象限
+
+    半轴长可能是半整数，因此y坐标以2y保存；判别式取浮点版本的16倍，全部为整数运算，结果与浮点版本完全一致。
+    直径为偶数的圆只计算八分之一圆弧（circle_quadrant）；直径为奇数时x与2y的取样网格错开半个像素，
+    不再关于 y = x 对称，仍按椭圆递推，判别式整体除以ry**2
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框对角顶点坐标
-    :param algorithm: (None) 统一接口形式占位用
-    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+    :return: (list of (int, int), int, int) 相对椭圆中心的第一象限点列表 [(x, 2y), ...]，以及 x0 + x1 和 y0 + y1
     """
     x0, y0 = p_list[0]
     x1, y1 = p_list[1]
-    result = []
-    if x0 > x1:
-        x0, x1 = x1, x0
-    if y0 > y1:
-        y0, y1 = y1, y0
-    rx = (x1 - x0) / 2
-    ry = (y1 - y0) / 2
-    x, y = 0, ry
-    quadrant = [(x, y)]
-
-    p = ry**2 - rx**2*ry + rx**2/4
-    while ry**2*x < rx**2*y:
+    w = abs(x1 - x0)
+    h = abs(y1 - y0)
+    if w == h and not w % 2:
+        return circle_quadrant(w // 2), x0 + x1, y0 + y1
+    # a, b stand for ry**2, rx**2; circles can drop the common factor
+    a, b = (1, 1) if w == h else (h * h, w * w)
+    x, y2 = 0, h
+    quadrant = [(x, y2)]
+
+    p = 4*a - 2*b*h + b
+    while 2*a*x < b*y2:
         if p < 0:
-            p += 2*ry**2*x + 3*ry**2
+            p += 8*a*x + 12*a
         else:
-            p += 2*ry**2*x + 3*ry**2 + 2*rx**2*(1 - y)
-            y -= 1
+            p += 8*a*x + 12*a + 4*b*(2 - y2)
+            y2 -= 2
         x += 1
-        quadrant.append((x, y))
+        quadrant.append((x, y2))
 
-    p = ry**2*(x + 0.5)**2 + rx**2*(y - 1)**2 - rx**2*ry**2
-    while y > 0:
+    p = a*(2*x + 1)**2 + b*(y2 - 2)**2 - b*h*h
+    while y2 > 0:
         if p <= 0:
-            p += (-2)*rx**2*y + 3*rx**2 + 2*ry**2*(1 + x)
+            p += 4*b*(3 - y2) + 8*a*(1 + x)
             x += 1
         else:
-            p += (-2)*rx**2*y + 3*rx**2
-        y -= 1
-        quadrant.append((x, y))
-
-    xm = (x0 + x1) / 2
-    ym = (y0 + y1) / 2
-    # when x0 + x1 is odd, round() will continuously get some int with 0.5,
-    # if not subtracted by a small value, we'll get round(0.5), round(1.5), round(2.5), ...
-    # they'll be rounded to 0, 2, 2, ...,
-    # which will cause a discrete effect as shown in example.
-    # FROM https://docs.python.org/3.8/library/functions.html?highlight=round#round :
-    # The behavior of round() for floats can be surprising:
-    # for example, round(2.675, 2) gives 2.67 instead of the expected 2.68.
-    # This is not a bug: it’s a result of the fact that
-    # most decimal fractions can’t be represented exactly as a float.
-    result = [(round(nx * x + xm - 0.001), round(ny * y + ym - 0.001))
-              for x, y in quadrant for nx in (-1, 1) for ny in (-1, 1)]
+            p += 4*b*(3 - y2)
+        y2 -= 2
+        quadrant.append((x, y2))
+    return quadrant, x0 + x1, y0 + y1
+
+
+def draw_ellipse(p_list, algorithm=None):
+    """绘制椭圆（采用中点圆生成算法）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框对角顶点坐标
+    :param algorithm: (None) 统一接口形式占位用
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+    """
+    quadrant, sx, sy = ellipse_quadrant(p_list)
+    # when x0 + x1 is odd, the center lies on a half pixel, and rounding
+    # x + 0.5 half to even would give a discrete effect as shown in example.
+    # always rounding half pixels down keeps the outline smooth,
+    # and it is exactly what (2 * x + x0 + x1) // 2 does.
+    if len(quadrant) > 1 and quadrant[-1][1] == -1 \
+            and quadrant[-2] == (quadrant[-1][0], 1):
+        # y = -0.5 mirrors onto the y = 0.5 row already drawn
+        quadrant.pop()
+    result = []
+    for x, y2 in quadrant:
+        # points on the axes are their own reflections
+        for nx in ((-1, 1) if x else (1,)):
+            for ny in ((-1, 1) if y2 else (1,)):
+                result.append(((2*nx*x + sx) // 2, (ny*y2 + sy) // 2))
     return result
 
 
-def draw_curve(p_list, algorithm, p_cnt=300):
-    """绘制曲线
+def bezier_point(p_list, u):
+    """Bezier曲线求值（Bernstein基的Horner形式，O(n)）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param u: (float) 参数，0 <= u <= 1
+    :return: ((float, float)) 曲线上的点
+    """
+    n = len(p_list) - 1
+    s = 1 - u
+    coef = 1  # C(n, i) * u^i
+    x, y = p_list[0][0] * s, p_list[0][1] * s
+    for i in range(1, n):
+        coef = coef * u * (n - i + 1) / i
+        x = (x + coef * p_list[i][0]) * s
+        y = (y + coef * p_list[i][1]) * s
+    coef = coef * u / n if n else u
+    return x + coef * p_list[n][0], y + coef * p_list[n][1]
+
+
+def flatten_bezier(p_list, tolerance=FLATNESS, max_depth=16):
+    """自适应细分Bezier曲线，直到每段弦与曲线的偏差不超过tolerance像素
+
+    取样点数随曲线在屏幕上的长度与弯曲程度变化，而不是固定值
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param tolerance: (float) 允许的弦偏差（像素）
+    :param max_depth: (int) 每个初始区间的最大细分层数
+    :return: (list of (int, int)) 取样点坐标列表，相邻重复点已合并
+    """
+    # a degree n curve may turn back n - 1 times, split it at least that often
+    # so that the midpoint test can't be fooled by a symmetric S shape
+    n0 = max(1, len(p_list) - 1)
+    knots = [(i / n0, bezier_point(p_list, i / n0)) for i in range(n0 + 1)]
+    stack = [(*knots[i], *knots[i + 1], 0) for i in reversed(range(n0))]
+    result = [(round(knots[0][1][0]), round(knots[0][1][1]))]
+    while stack:
+        u0, p0, u1, p1, depth = stack.pop()
+        um = (u0 + u1) / 2
+        pm = bezier_point(p_list, um)
+        deviation = max(abs(pm[0] - (p0[0] + p1[0]) / 2),
+                        abs(pm[1] - (p0[1] + p1[1]) / 2))
+        if deviation > tolerance and depth < max_depth:
+            stack.append((um, pm, u1, p1, depth + 1))
+            stack.append((u0, p0, um, pm, depth + 1))
+            continue
+        point = (round(p1[0]), round(p1[1]))
+        if point != result[-1]:
+            result.append(point)
+    if len(result) == 1:
+        result.append(result[0])
+    return result
+
+
+# 每段取样数 -> 均匀三次B样条基函数取值表
+_bspline_basis = {}
+
+
+def bspline_basis(seg_cnt):
+    """均匀三次B样条基函数在 t = i / seg_cnt (i = 0, 1, ..., seg_cnt) 处的取值表
+
+    表只与每段取样数有关，按取样数缓存，所有曲线、所有调用共用
+
+    :param seg_cnt: (int) 每段取样数
+    :return: (list of (float, float, float, float)) 每个取样点上四个控制点的权重
+    """
+    table = _bspline_basis.get(seg_cnt)
+    if table is None:
+        table = []
+        for i in range(seg_cnt + 1):
+            t = i / seg_cnt
+            t2, t3 = t * t, t * t * t
+            table.append(((1 - t)**3 / 6,
+                          (3*t3 - 6*t2 + 4) / 6,
+                          (-3*t3 + 3*t2 + 3*t + 1) / 6,
+                          t3 / 6))
+        _bspline_basis[seg_cnt] = table
+    return table
+
+
+def bspline_segment(p_list, seg_cnt):
+    """均匀三次B样条的一段（矩阵形式，只涉及4个控制点）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], [x3, y3]]) 该段的4个控制点
+    :param seg_cnt: (int) 每段取样数
+    :return: (list of (int, int)) 该段两端在内的 seg_cnt + 1 个取样点
+    """
+    (x0, y0), (x1, y1), (x2, y2), (x3, y3) = p_list
+    return [(round(b0*x0 + b1*x1 + b2*x2 + b3*x3),
+             round(b0*y0 + b1*y1 + b2*y2 + b3*y3))
+            for b0, b1, b2, b3 in bspline_basis(seg_cnt)]
+
+
+def bspline_seg_cnt(n, p_cnt=300):
+    """B样条每段的取样数：p_cnt个取样点均匀分布在n个节点区间上
+
+    :param n: (int) 控制点个数
+    :param p_cnt: (int) 取样点总数
+    :return: (int) 每段取样数
+    """
+    return max(1, math.ceil(p_cnt / max(1, n)))
+
+
+def curve_points(p_list, algorithm, p_cnt=300, tolerance=FLATNESS):
+    """曲线取样
 
     :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
     :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'（三次均匀B样条曲线，曲线不必经过首末控制点）
-    :param p_cnt: (int) 曲线取样点个数
-    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+    :param p_cnt: (int) B样条曲线取样点个数
+    :param tolerance: (float) Bezier曲线自适应细分的弦偏差上限（像素）
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 取样点坐标列表，依次连接即为曲线
     """
     result = []
     if algorithm == 'Bezier':
-        for u in range(p_cnt):
-            u = u / p_cnt
-            plist = [(x, y) for x, y in p_list]
-            for r in range(len(plist)):
-                for i in range(len(plist)-1-r):
-                    x0, y0 = plist[i]
-                    x1, y1 = plist[i+1]
-                    x = (1-u) * x0 + u * x1
-                    y = (1-u) * y0 + u * y1
-                    plist[i] = (x, y)
-            x, y = plist[0]
-            result.append((round(x), round(y)))
+        if p_list:
+            result = flatten_bezier(p_list, tolerance)
     elif algorithm == 'B-spline':
-        def base_func(i, k, u):
-            if k == 1:
-                return i <= u < i + 1
-            return (u - i)/(k - 1)*base_func(i, k-1, u) + (i + k - u)/(k - 1)*base_func(i+1, k-1, u)
-
-        k = 4
-        for u in range(p_cnt):
-            u = u / p_cnt * len(p_list)
-            if u < k - 1:
-                continue
-            x, y = 0, 0
-            for i in range(len(p_list)):
-                b = base_func(i, k, u)
-                x += p_list[i][0] * b
-                y += p_list[i][1] * b
-            result.append((round(x), round(y)))
+        seg_cnt = bspline_seg_cnt(len(p_list), p_cnt)
+        for i in range(len(p_list) - 3):
+            for point in bspline_segment(p_list[i:i + 4], seg_cnt):
+                if not result or point != result[-1]:
+                    result.append(point)
+        if len(result) == 1:
+            # the whole curve rounds to one pixel, still draw it
+            result.append(result[0])
+    return result
+
 
+def draw_curve(p_list, algorithm, p_cnt=300, tolerance=FLATNESS):
+    """绘制曲线
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'（三次均匀B样条曲线，曲线不必经过首末控制点）
+    :param p_cnt: (int) B样条曲线取样点个数
+    :param tolerance: (float) Bezier曲线自适应细分的弦偏差上限（像素）
+    :return: (list of list of int: [[x_0, y_0], [x_1, y_1], [x_2, y_2], ...]) 绘制结果的像素点坐标列表
+    """
     # use this func to connect the discrete points
-    return draw_fold_line(result, 'DDA')
+    return draw_fold_line(curve_points(p_list, algorithm, p_cnt, tolerance), 'DDA')
+
+
+def translation_exact(item_type, algorithm):
+    """图元的光栅化结果是否严格随整数平移而平移
+
+    Bresenham与椭圆只做整数运算，结果只依赖顶点间的差；
+    DDA和曲线对浮点坐标取整（四舍六入五成双），平移后可能落到另一侧
+
+    :param item_type: (string) 'line'、'polygon'、'ellipse'、'curve'等
+    :param algorithm: (string) 绘制使用的算法
+    :return: (bool)
+    """
+    if item_type == 'ellipse':
+        return True
+    return item_type in ('line', 'polygon') and algorithm == 'Bresenham'
+
+
+def canonical(p_list, item_type, algorithm):
+    """把图元平移到以第一个顶点为原点，平移后结果相同的图元得到相同的参数
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 图元参数
+    :param item_type: (string) 'line'、'polygon'、'ellipse'、'curve'等
+    :param algorithm: (string) 绘制使用的算法
+    :return: (list of list of int, tuple of int: (dx, dy)) 规范化的图元参数与平移量，
+             原图元的光栅结果等于规范化图元的结果平移(dx, dy)；不满足平移不变时平移量为(0, 0)
+    """
+    if not p_list or not translation_exact(item_type, algorithm):
+        return p_list, (0, 0)
+    dx, dy = p_list[0]
+    return translate(p_list, -dx, -dy), (dx, dy)
 
 
 def translate(p_list, dx, dy):
@@ -0,0 +1,591 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms 的 NumPy 向量化版本，结果与 cg_algorithms 中对应函数逐像素一致
+# cg_algorithms 本身只允许依赖 math 库，因此批量接口单独放在本文件中
+# 所有 draw_* 均返回连续的 (N, 2) int32 数组（每行为 x, y），
+# 可直接用于 canvas[pixels[:, 1], pixels[:, 0]] = color，不再构造逐点的 tuple
+import math
+import cg_algorithms as alg
+import numpy as np
+
+# below this size (w + h) the scalar integer ellipse engine is cheaper than array setup
+ELLIPSE_VEC_MIN = 1024
+# above this w * h the int64 midpoint decision values could overflow
+ELLIPSE_VEC_MAX = 1 << 30
+# rows the vectorized ellipse solver may re-synchronize before giving up
+ELLIPSE_VEC_RETRY = 32
+
+
+def draw_lines(segments, algorithm):
+    """批量绘制线段
+
+    :param segments: (array-like of int, shape (N, 2, 2)) N条线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (M, 2), ndarray of int64, shape (N+1,))
+             所有线段的像素点坐标，以及每条线段在其中的起止下标，
+             第i条线段的像素为 pixels[offsets[i]:offsets[i+1]]
+    """
+    seg = np.asarray(segments, dtype=np.int64).reshape(-1, 2, 2)
+    if algorithm not in ('Naive', 'DDA', 'Bresenham'):
+        return np.empty((0, 2), np.int32), np.zeros(len(seg) + 1, np.int64)
+    x0, y0 = seg[:, 0, 0].copy(), seg[:, 0, 1].copy()
+    x1, y1 = seg[:, 1, 0].copy(), seg[:, 1, 1].copy()
+    dx = x1 - x0
+    dy = y1 - y0
+
+    # vertical segments are walked along y like the steep ones
+    if algorithm == 'Naive':
+        x_major = dx != 0
+        swap = x_major & (x0 > x1)
+    else:
+        x_major = (dx != 0) & (np.abs(dy) <= np.abs(dx))
+        swap = np.where(x_major, x0 > x1, y0 > y1)
+    x0, x1 = np.where(swap, x1, x0), np.where(swap, x0, x1)
+    y0, y1 = np.where(swap, y1, y0), np.where(swap, y0, y1)
+
+    # Naive doesn't swap vertical segments, which yields no pixel if y0 > y1
+    length = np.where(x_major, x1 - x0, y1 - y0) + 1
+    length = np.maximum(length, 0)
+    offsets = np.zeros(len(seg) + 1, np.int64)
+    np.cumsum(length, out=offsets[1:])
+    seg_id = np.repeat(np.arange(len(seg)), length)
+    step = np.arange(offsets[-1], dtype=np.int64) - offsets[seg_id]
+
+    # k is evaluated exactly as the scalar version does, so rounding matches
+    k = np.divide(dy, dx, out=np.zeros(len(seg)), where=dx != 0)
+    if algorithm == 'Naive':
+        minor = np.trunc(y0[seg_id] + k[seg_id] * step).astype(np.int64)
+        minor = np.where(x_major[seg_id], minor, x0[seg_id])
+    elif algorithm == 'DDA':
+        inv_k = np.divide(1, k, out=np.zeros(len(seg)), where=k != 0)
+        slope = np.where(x_major, k, inv_k)
+        base = np.where(x_major, y0, x0)
+        # y0 + k * i is rounded as a whole, x0 + round(i / k) is not
+        minor = np.where(x_major[seg_id],
+                         np.rint(base[seg_id] + slope[seg_id] * step),
+                         base[seg_id] + np.rint(slope[seg_id] * step))
+        minor = minor.astype(np.int64)
+    else:
+        # closed form of the decision parameter: after i + 1 steps the
+        # minor axis has moved ceil((2 * d_minor * (i + 1) - d_major) / (2 * d_major)) times
+        d_major = np.where(x_major, np.abs(dx), np.abs(dy))
+        d_minor = np.where(x_major, np.abs(dy), np.abs(dx))
+        inc = np.where(k > 0, 1, -1)
+        num = 2 * d_minor[seg_id] * (step + 1) - d_major[seg_id]
+        den = 2 * np.maximum(d_major[seg_id], 1)
+        moved = np.maximum((num + den - 1) // den, 0)
+        base = np.where(x_major, y0, x0)
+        minor = base[seg_id] + inc[seg_id] * moved
+
+    major = np.where(x_major, x0, y0)[seg_id] + step
+    pixels = np.empty((len(step), 2), np.int32)
+    pixels[:, 0] = np.where(x_major[seg_id], major, minor)
+    pixels[:, 1] = np.where(x_major[seg_id], minor, major)
+    return pixels, offsets
+
+
+def polygon_edges(p_list, closed=True):
+    """顶点列表 -> 边的线段数组，可直接交给draw_lines
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 顶点坐标列表
+    :param closed: (bool) 是否首尾相连（多边形为True，折线为False）
+    :return: (ndarray of int64, shape (N, 2, 2)) 各边的起点和终点坐标
+    """
+    pts = np.asarray(p_list, dtype=np.int64).reshape(-1, 2)
+    if closed:
+        return np.stack([np.roll(pts, 1, axis=0), pts], axis=1)
+    return np.stack([pts[:-1], pts[1:]], axis=1)
+
+
+def draw_line(p_list, algorithm):
+    """绘制线段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标
+    """
+    return draw_lines([p_list[:2]], algorithm)[0]
+
+
+def draw_polygon(p_list, algorithm):
+    """绘制多边形
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标
+    """
+    return draw_lines(polygon_edges(p_list, True), algorithm)[0]
+
+
+def draw_fold_line(p_list, algorithm):
+    """绘制折线段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 折线的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标
+    """
+    return draw_lines(polygon_edges(p_list, False), algorithm)[0]
+
+
+def _ellipse_g(w2, h2, x2, y2):
+    """16 * (ry**2 * x**2 + rx**2 * y**2 - rx**2 * ry**2)，其中 x2 = 2x, y2 = 2y"""
+    return h2 * x2 * x2 + w2 * y2 * y2 - w2 * h2
+
+
+def ellipse_quadrant(p_list):
+    """中点椭圆生成算法的向量化求解，只计算第一象限，与alg.ellipse_quadrant逐点一致
+
+    区域1逐列、区域2逐行直接解出递推会选中的像素（浮点估计后用精确的整数判别式修正），
+    再校验相邻两步只差一个像素；小椭圆或不满足校验时退回逐点递推。
+    直径为偶数的圆只解到八分之一圆弧为止，其余沿 y = x 对称得到
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框对角顶点坐标
+    :return: (ndarray of int64, shape (N, 2), int, int) 相对椭圆中心的第一象限点 (x, 2y)，以及 x0 + x1 和 y0 + y1
+    """
+    x0, y0 = p_list[0]
+    x1, y1 = p_list[1]
+    w = abs(x1 - x0)
+    h = abs(y1 - y0)
+    if w + h < ELLIPSE_VEC_MIN or not w or not h or w * h > ELLIPSE_VEC_MAX:
+        quadrant, sx, sy = alg.ellipse_quadrant(p_list)
+        return np.array(quadrant, np.int64).reshape(-1, 2), sx, sy
+    w2, h2 = np.int64(w * w), np.int64(h * h)
+
+    # region 1, one column per x: v is the 2y whose lower midpoint is
+    # inside and upper midpoint outside
+    circle = w == h and not w % 2
+    # a circle leaves region 1 at x = r / sqrt(2), the columns after it are never needed
+    columns = min(w // 2, math.ceil(w / (2 * math.sqrt(2))) + 2) if circle else w // 2
+    xs = np.arange(columns + 1, dtype=np.int64)
+    y_true = h * np.sqrt(np.maximum(0, 1 - (2 * xs / w)**2))
+    v = h - 2 * np.floor((h - y_true + 1) / 2).astype(np.int64)
+    v[0] = h
+    for _ in range(2):
+        v += 2 * (_ellipse_g(w2, h2, 2 * xs, v + 1) < 0)
+        v -= 2 * (_ellipse_g(w2, h2, 2 * xs, v - 1) >= 0)
+    # one step of the recurrence from each column to the next; the solved
+    # columns are the real states as long as they agree with it
+    step = v.copy()
+    step[1:] = v[:-1] - 2 * (_ellipse_g(w2, h2, 2 * xs[1:], v[:-1] - 1) >= 0)
+    stop = np.flatnonzero(2 * h2 * xs >= w2 * step)
+    if not len(stop) or (step[:stop[0]] != v[:stop[0]]).any():
+        return ellipse_quadrant_fallback(p_list)
+    xs, v = xs[:stop[0] + 1], step[:stop[0] + 1]
+    if circle:
+        # circles centred on a pixel: mirror the first octant about y = x, as alg.circle_quadrant
+        octant = np.stack([xs, v], axis=1)[2 * xs <= v]
+        rest = octant[::-1]
+        rest = rest[2 * rest[:, 0] != rest[:, 1]]
+        mirror = np.stack([rest[:, 1] // 2, 2 * rest[:, 0]], axis=1)
+        return np.concatenate([octant, mirror]), x0 + x1, y0 + y1
+
+    # region 2, one row per 2y: u is the number of x whose right midpoint is inside
+    rows = v[-1] - 2 * np.arange(1, max(0, (v[-1] + 1) // 2) + 1, dtype=np.int64)
+    x_true = w * np.sqrt(np.maximum(0, 1 - (rows / h)**2))
+    u = np.floor((x_true + 1) / 2).astype(np.int64)
+    for _ in range(2):
+        u -= (u > 0) & (_ellipse_g(w2, h2, 2 * u - 1, rows) > 0)
+        u += _ellipse_g(w2, h2, 2 * u + 1, rows) <= 0
+    # right after region 1 the recurrence may lag behind the solved rows for
+    # a while; step it from the last known state until it catches up again
+    state, start = xs[-1], 0
+    for _ in range(ELLIPSE_VEC_RETRY):
+        if start >= len(rows):
+            break
+        prev = np.concatenate([[state], u[start:-1]])
+        step = prev + (_ellipse_g(w2, h2, 2 * prev + 1, rows[start:]) <= 0)
+        wrong = np.flatnonzero(step[:-1] != u[start:-1])
+        known = wrong[0] + 1 if len(wrong) else len(step)
+        u[start:start + known] = step[:known]
+        state, start = step[known - 1], start + known
+    else:
+        if start < len(rows):
+            return ellipse_quadrant_fallback(p_list)
+
+    quadrant = np.empty((len(xs) + len(rows), 2), np.int64)
+    quadrant[:len(xs), 0], quadrant[:len(xs), 1] = xs, v
+    quadrant[len(xs):, 0], quadrant[len(xs):, 1] = u, rows
+    return quadrant, x0 + x1, y0 + y1
+
+
+def ellipse_quadrant_fallback(p_list):
+    """逐点递推求第一象限，返回值形式同ellipse_quadrant"""
+    quadrant, sx, sy = alg.ellipse_quadrant(p_list)
+    return np.array(quadrant, np.int64).reshape(-1, 2), sx, sy
+
+
+def _ellipse_trim(quadrant):
+    """去掉与 2y = 1 行重合的 2y = -1 末点（同alg.draw_ellipse）"""
+    if len(quadrant) > 1 and quadrant[-1, 1] == -1 \
+            and quadrant[-2, 1] == 1 and quadrant[-2, 0] == quadrant[-1, 0]:
+        return quadrant[:-1]
+    return quadrant
+
+
+def draw_ellipse(p_list, algorithm=None):
+    """绘制椭圆（采用中点圆生成算法）
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框对角顶点坐标
+    :param algorithm: (None) 统一接口形式占位用
+    :return: (ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标，无重复点
+    """
+    quadrant, sx, sy = ellipse_quadrant(p_list)
+    quadrant = _ellipse_trim(quadrant)
+    x, y2 = quadrant[:, :1], quadrant[:, 1:]
+    # same reflection order as cg_algorithms.draw_ellipse
+    nx = np.array([-1, -1, 1, 1])
+    ny = np.array([-1, 1, -1, 1])
+    pixels = np.empty((len(quadrant), 4, 2), np.int32)
+    pixels[..., 0] = (2 * nx * x + sx) // 2
+    pixels[..., 1] = (ny * y2 + sy) // 2
+    # points on the axes are their own reflections
+    keep = ((nx == 1) | (x != 0)) & ((ny == 1) | (y2 != 0))
+    return pixels[keep]
+
+
+def draw_curve(p_list, algorithm, p_cnt=300, tolerance=alg.FLATNESS):
+    """绘制曲线
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 曲线的控制点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'Bezier'和'B-spline'
+    :param p_cnt: (int) B样条曲线取样点个数
+    :param tolerance: (float) Bezier曲线自适应细分的弦偏差上限（像素）
+    :return: (ndarray of int32, shape (N, 2)) 绘制结果的像素点坐标
+    """
+    points = alg.curve_points(p_list, algorithm, p_cnt, tolerance)
+    return draw_fold_line(points, 'DDA')
+
+
+def shift_raster(raster, dx, dy):
+    """平移光栅结果
+
+    :param raster: (ndarray, shape (N, 2) 像素坐标 | shape (M, 3) 水平段)
+    :param dx: (int) 水平方向平移量
+    :param dy: (int) 垂直方向平移量
+    :return: (ndarray) 平移后的新数组，dtype与raster相同
+    """
+    if not dx and not dy:
+        return raster
+    if raster.shape[1] == 3:
+        return raster + np.array([dy, dx, dx], raster.dtype)
+    return raster + np.array([dx, dy], raster.dtype)
+
+
+def pixels_to_spans(pixels, offsets=None):
+    """像素坐标 -> 水平连续段 (y, x_start, x_end)
+
+    同一行上x相邻的连续像素合并为一段，段之间不跨越offsets给出的分组边界
+
+    :param pixels: (ndarray of int, shape (N, 2)) 像素点坐标
+    :param offsets: (ndarray of int, shape (K+1,)) 分组起止下标，如draw_lines返回的offsets，默认为一组
+    :return: (ndarray of int32, shape (M, 3), ndarray of int64, shape (K+1,))
+             所有水平段（x_start <= x_end，两端均包含），以及每组在其中的起止下标
+    """
+    pixels = np.asarray(pixels).reshape(-1, 2)
+    if offsets is None:
+        offsets = np.array([0, len(pixels)], np.int64)
+    offsets = np.asarray(offsets, np.int64)
+    if not len(pixels):
+        return np.empty((0, 3), np.int32), np.zeros(len(offsets), np.int64)
+    x, y = pixels[:, 0], pixels[:, 1]
+    # a run goes on while the row stays the same and x moves by one pixel
+    head = np.ones(len(pixels), bool)
+    head[1:] = (y[1:] != y[:-1]) | (np.abs(np.diff(x)) != 1)
+    head[offsets[:-1][offsets[:-1] < len(pixels)]] = True
+    starts = np.flatnonzero(head)
+    spans = np.empty((len(starts), 3), np.int32)
+    spans[:, 0] = y[starts]
+    spans[:, 1] = np.minimum.reduceat(x, starts)
+    spans[:, 2] = np.maximum.reduceat(x, starts)
+    span_offsets = np.searchsorted(starts, offsets)
+    return spans, span_offsets
+
+
+def spans_to_pixels(spans):
+    """水平段 -> 像素坐标，pixels_to_spans的逆过程（每段内x递增）
+
+    :param spans: (ndarray of int, shape (M, 3)) 水平段 (y, x_start, x_end)
+    :return: (ndarray of int32, shape (N, 2)) 像素点坐标
+    """
+    spans = np.asarray(spans).reshape(-1, 3)
+    length = spans[:, 2].astype(np.int64) - spans[:, 1] + 1
+    span_id = np.repeat(np.arange(len(spans)), length)
+    starts = np.cumsum(length) - length
+    pixels = np.empty((len(span_id), 2), np.int32)
+    pixels[:, 0] = spans[span_id, 1] + (np.arange(len(span_id)) - starts[span_id])
+    pixels[:, 1] = spans[span_id, 0]
+    return pixels
+
+
+def fill_spans(canvas, spans, color):
+    """逐段填充画布，每个水平段只做一次切片赋值
+
+    :param canvas: (ndarray, shape (H, W, ...)) 画布
+    :param spans: (ndarray of int, shape (M, 3)) 水平段 (y, x_start, x_end)
+    :param color: 填充颜色
+    """
+    for y, x_start, x_end in spans.tolist():
+        canvas[y, x_start:x_end + 1] = color
+
+
+def crop_pixels(pixels, width, height):
+    """丢弃画布外的像素
+
+    :param pixels: (ndarray of int, shape (N, 2)) 像素点坐标
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :return: (ndarray, shape (K, 2)) 落在 [0, width) x [0, height) 内的像素，全部在内时返回原数组
+    """
+    x, y = pixels[:, 0], pixels[:, 1]
+    inside = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+    return pixels if inside.all() else pixels[inside]
+
+
+def crop_spans(spans, width, height):
+    """把水平段裁剪到画布内，完全在画布外的段被丢弃
+
+    :param spans: (ndarray of int, shape (M, 3)) 水平段 (y, x_start, x_end)
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :return: (ndarray, shape (K, 3)) 裁剪后的水平段，全部在内时返回原数组
+    """
+    y, x_start, x_end = spans[:, 0], spans[:, 1], spans[:, 2]
+    if y.min(initial=0) >= 0 and y.max(initial=0) < height \
+            and x_start.min(initial=0) >= 0 and x_end.max(initial=0) < width:
+        return spans
+    spans = spans[(y >= 0) & (y < height) & (x_end >= 0) & (x_start < width)]
+    spans[:, 1] = np.maximum(spans[:, 1], 0)
+    spans[:, 2] = np.minimum(spans[:, 2], width - 1)
+    return spans
+
+
+def draw_lines_spans(segments, algorithm):
+    """批量绘制线段，输出水平段
+
+    :param segments: (array-like of int, shape (N, 2, 2)) N条线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'Naive'、'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (M, 3), ndarray of int64, shape (N+1,))
+             所有线段的水平段，以及每条线段在其中的起止下标
+    """
+    return pixels_to_spans(*draw_lines(segments, algorithm))
+
+
+def draw_line_spans(p_list, algorithm):
+    """绘制线段，输出水平段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 线段的起点和终点坐标
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (M, 3)) 水平段 (y, x_start, x_end)
+    """
+    return draw_lines_spans([p_list[:2]], algorithm)[0]
+
+
+def draw_polygon_spans(p_list, algorithm):
+    """绘制多边形，输出水平段
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], [x2, y2], ...]) 多边形的顶点坐标列表
+    :param algorithm: (string) 绘制使用的算法，包括'DDA'和'Bresenham'
+    :return: (ndarray of int32, shape (M, 3)) 水平段 (y, x_start, x_end)
+    """
+    return draw_lines_spans(polygon_edges(p_list, True), algorithm)[0]
+
+
+def draw_ellipse_spans(p_list, algorithm=None):
+    """绘制椭圆，输出水平段
+
+    在第一象限内合并水平段后再做四向对称，平坦部分不会逐点展开，各段互不重叠
+
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1]]) 椭圆的矩形包围框对角顶点坐标
+    :param algorithm: (None) 统一接口形式占位用
+    :return: (ndarray of int32, shape (M, 3)) 水平段 (y, x_start, x_end)
+    """
+    quadrant, sx, sy = ellipse_quadrant(p_list)
+    quadrant = _ellipse_trim(quadrant)
+    # quadrant points step by one in x within region 1, so runs are exact
+    y2 = quadrant[:, 1]
+    head = np.ones(len(quadrant), bool)
+    head[1:] = y2[1:] != y2[:-1]
+    starts = np.flatnonzero(head)
+    ends = np.append(starts[1:], len(quadrant)) - 1
+    xa, xb, y2 = quadrant[starts, 0], quadrant[ends, 0], y2[starts]
+    spans = np.empty((len(starts), 2, 2, 3), np.int32)
+    for i, ny in enumerate((-1, 1)):
+        spans[:, i, :, 0] = ((ny * y2 + sy) // 2)[:, None]
+        spans[:, i, 0, 1] = (-2 * xb + sx) // 2
+        spans[:, i, 0, 2] = (-2 * xa + sx) // 2
+        spans[:, i, 1, 1] = (2 * xa + sx) // 2
+        spans[:, i, 1, 2] = (2 * xb + sx) // 2
+    # a run touching the y axis is one span across both halves
+    spans[:, :, 0, 2] = np.where((xa == 0)[:, None], spans[:, :, 1, 2], spans[:, :, 0, 2])
+    keep = np.ones((len(starts), 2, 2), bool)
+    keep[:, :, 1] &= (xa != 0)[:, None]
+    keep[:, 0, :] &= (y2 != 0)[:, None]
+    return spans[keep]
+
+
+def clip_lines(segments, x_min, y_min, x_max, y_max, algorithm):
+    """批量线段裁剪，逐条结果与alg.clip一致
+
+    所有线段共用同一个裁剪窗口，Liang-Barsky一次算出全部参数，
+    Cohen-Sutherland每轮同时推进所有尚未结束的线段
+
+    :param segments: (array-like of int, shape (N, 2, 2)) N条线段的起点和终点坐标
+    :param x_min: 裁剪窗口左上角x坐标
+    :param y_min: 裁剪窗口左上角y坐标
+    :param x_max: 裁剪窗口右下角x坐标
+    :param y_max: 裁剪窗口右下角y坐标
+    :param algorithm: (string) 使用的裁剪算法，包括'Cohen-Sutherland'和'Liang-Barsky'
+    :return: (ndarray of int64, shape (K, 2, 2), ndarray of bool, shape (N,))
+             保留下来的线段裁剪后的坐标，以及每条线段是否保留
+    """
+    seg = np.asarray(segments, dtype=np.int64).reshape(-1, 2, 2)
+    x_min, x_max = min(x_min, x_max), max(x_min, x_max)
+    y_min, y_max = min(y_min, y_max), max(y_min, y_max)
+    x0, y0 = seg[:, 0, 0].copy(), seg[:, 0, 1].copy()
+    x1, y1 = seg[:, 1, 0].copy(), seg[:, 1, 1].copy()
+    keep = np.ones(len(seg), bool)
+    if algorithm == 'Cohen-Sutherland':
+        x0, y0, x1, y1, keep = _clip_cohen_sutherland(
+            x0, y0, x1, y1, x_min, y_min, x_max, y_max)
+    elif algorithm == 'Liang-Barsky':
+        ps = np.stack([x0 - x1, x1 - x0, y0 - y1, y1 - y0])
+        qs = np.stack([x0 - x_min, x_max - x0, y0 - y_min, y_max - y0])
+        ratio = np.divide(qs, ps, out=np.zeros(ps.shape), where=ps != 0)
+        # u_min only grows and u_max only shrinks, so checking u_min > u_max
+        # once at the end rejects exactly what the scalar early exits reject
+        u_min = np.where(ps < 0, ratio, 0).max(axis=0, initial=0)
+        u_max = np.where(ps > 0, ratio, 1).min(axis=0, initial=1)
+        keep = ~((ps == 0) & (qs < 0)).any(axis=0) & (u_min <= u_max)
+        dx, dy = x1 - x0, y1 - y0
+        end = u_max < 1
+        x1 = np.where(end, np.rint(x0 + u_max * dx), x1).astype(np.int64)
+        y1 = np.where(end, np.rint(y0 + u_max * dy), y1).astype(np.int64)
+        start = u_min > 0
+        x0 = np.where(start, np.rint(x0 + u_min * dx), x0).astype(np.int64)
+        y0 = np.where(start, np.rint(y0 + u_min * dy), y0).astype(np.int64)
+    clipped = np.stack([np.stack([x0, y0], axis=1),
+                        np.stack([x1, y1], axis=1)], axis=1)
+    return clipped[keep], keep
+
+
+def _clip_cohen_sutherland(x0, y0, x1, y1, x_min, y_min, x_max, y_max):
+    """Cohen-Sutherland的批量迭代，返回 (x0, y0, x1, y1, keep)"""
+    LEFT, RIGHT, UP, DOWN = 8, 4, 2, 1
+
+    def encode(x, y):
+        return (LEFT * (x < x_min) | RIGHT * (x > x_max) |
+                UP * (y < y_min) | DOWN * (y > y_max))
+
+    code0, code1 = encode(x0, y0), encode(x1, y1)
+    keep = (code0 & code1) == 0
+    active = keep & ((code0 | code1) != 0)
+    while active.any():
+        idx = np.flatnonzero(active)
+        a0, b0, a1, b1 = x0[idx], y0[idx], x1[idx], y1[idx]
+        c0 = code0[idx]
+        # the scalar loop always moves the outside endpoint into (x0, y0)
+        swap = c0 == 0
+        a0, a1 = np.where(swap, a1, a0), np.where(swap, a0, a1)
+        b0, b1 = np.where(swap, b1, b0), np.where(swap, b0, b1)
+        flag = np.where(swap, code1[idx], c0)
+        horizontal = (flag & (LEFT | RIGHT)) != 0
+        vertical = ~horizontal & ((flag & (UP | DOWN)) != 0)
+
+        bx = np.where(flag & LEFT, x_min, x_max)
+        ky = np.divide(b0 - b1, a0 - a1, out=np.zeros(len(idx)),
+                       where=a0 != a1)
+        ny = np.where(a0 != a1, np.rint(ky * (bx - a1) + b1), b0)
+        by = np.where(flag & UP, y_min, y_max)
+        kx = np.divide(a0 - a1, b0 - b1, out=np.zeros(len(idx)),
+                       where=b0 != b1)
+        nx = np.where(b0 != b1, np.rint(kx * (by - b1) + a1), a0)
+        a0, b0 = (np.where(horizontal, bx, np.where(vertical, nx, a0)),
+                  np.where(horizontal, ny, np.where(vertical, by, b0)))
+
+        x0[idx], y0[idx] = a0, b0
+        x1[idx], y1[idx] = a1, b1
+        code0[idx], code1[idx] = encode(a0, b0), encode(a1, b1)
+        keep[idx] = (code0[idx] & code1[idx]) == 0
+        active[idx] = keep[idx] & ((code0[idx] | code1[idx]) != 0)
+    return x0, y0, x1, y1, keep
+
+
+def translate_matrix(dx, dy):
+    """平移变换的齐次矩阵
+
+    :param dx: (int) 水平方向平移量
+    :param dy: (int) 垂直方向平移量
+    :return: (ndarray of float64, shape (3, 3)) 作用于列向量 (x, y, 1) 的变换矩阵
+    """
+    return np.array([[1., 0., dx], [0., 1., dy], [0., 0., 1.]])
+
+
+def rotate_matrix(x, y, r):
+    """旋转变换的齐次矩阵，方向与alg.rotate一致
+
+    :param x: (int) 旋转中心x坐标
+    :param y: (int) 旋转中心y坐标
+    :param r: (int) 逆时针旋转角度（°）
+    :return: (ndarray of float64, shape (3, 3)) 作用于列向量 (x, y, 1) 的变换矩阵
+    """
+    arc = np.radians(r)
+    cos, sin = np.cos(arc), np.sin(arc)
+    return np.array([[cos, -sin, x - x * cos + y * sin],
+                     [sin, cos, y - x * sin - y * cos],
+                     [0., 0., 1.]])
+
+
+def scale_matrix(x, y, sx, sy=None):
+    """缩放变换的齐次矩阵，参数含义与alg.scale一致
+
+    :param x: (int) 缩放中心x坐标
+    :param y: (int) 缩放中心y坐标
+    :param sx: (float) x方向缩放倍数
+    :param sy: (float) y方向缩放倍数，缺省时等于sx
+    :return: (ndarray of float64, shape (3, 3)) 作用于列向量 (x, y, 1) 的变换矩阵
+    """
+    sy = sx if not sy else sy
+    return np.array([[sx, 0., x - x * sx], [0., sy, y - y * sy], [0., 0., 1.]])
+
+
+def compose(*matrices):
+    """把若干变换按先后顺序合成为一个矩阵
+
+    :param matrices: (ndarray, shape (3, 3)) 依次施加的变换，第一个最先作用
+    :return: (ndarray of float64, shape (3, 3)) 合成后的变换矩阵
+    """
+    result = np.eye(3)
+    for matrix in matrices:
+        result = matrix @ result
+    return result
+
+
+def affine_points(matrix, p_list, rounding=True):
+    """对一组顶点施加仿射变换
+
+    :param matrix: (ndarray, shape (3, 3)) 变换矩阵
+    :param p_list: (list of list of int: [[x0, y0], [x1, y1], ...]) 顶点坐标列表
+    :param rounding: (bool) 是否取整，只应在光栅化前取整一次
+    :return: (ndarray of int64 | float64, shape (N, 2)) 变换后的顶点坐标
+    """
+    pts = np.asarray(p_list, dtype=np.float64).reshape(-1, 2)
+    out = pts @ matrix[:2, :2].T + matrix[:2, 2]
+    return np.rint(out).astype(np.int64) if rounding else out
+
+
+def affine_many(matrix, p_lists, rounding=True):
+    """用一次矩阵乘法对多组顶点施加同一个仿射变换
+
+    :param matrix: (ndarray, shape (3, 3)) 变换矩阵
+    :param p_lists: (list of p_list) 各图元的顶点坐标列表
+    :param rounding: (bool) 是否取整
+    :return: (list of ndarray, shape (Ni, 2)) 与p_lists一一对应的变换结果
+    """
+    sizes = [len(p_list) for p_list in p_lists]
+    if not sizes:
+        return []
+    pts = np.concatenate([np.asarray(p_list, dtype=np.float64).reshape(-1, 2)
+                          for p_list in p_lists])
+    out = affine_points(matrix, pts, rounding)
+    return np.split(out, np.cumsum(sizes)[:-1])
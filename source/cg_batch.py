@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 批量执行 cg_cli 指令文件：所有脚本在同一组长期存活的进程中运行，
+# 只付一次 numpy/PIL 的导入与进程启动开销；单个脚本出错不影响其余脚本
+import sys
+import os
+import argparse
+import json
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from cg_cli import Session, iter_commands
+
+
+def collect_scripts(inputs, manifest=None, pattern='.txt'):
+    '''命令行给出的路径 -> 指令文件列表
+
+    :param inputs: list of str 指令文件或目录，目录下按文件名排序取所有以pattern结尾的文件
+    :param manifest: str | None 清单文件，每行一个指令文件路径（相对清单所在目录），#开头为注释
+    :param pattern: str 目录中指令文件的后缀
+    :return: list of str 去重后的指令文件路径，保持给出的顺序
+    '''
+    scripts = []
+    for path in inputs:
+        if os.path.isdir(path):
+            scripts.extend(os.path.join(path, name) for name in sorted(os.listdir(path))
+                           if name.endswith(pattern))
+        else:
+            scripts.append(path)
+    if manifest:
+        root = os.path.dirname(manifest)
+        with open(manifest, 'r') as fp:
+            for line in fp:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    scripts.append(os.path.join(root, line))
+    return list(dict.fromkeys(scripts))
+
+
+def output_dirs(scripts, output_root):
+    '''每个指令文件的输出目录：output_root/文件名（去掉后缀），重名时加序号，
+    序号一直递增到与所有文件名及已分配的目录名都不重复为止
+
+    :param scripts: list of str
+    :param output_root: str
+    :return: list of str 与scripts一一对应
+    '''
+    names = [os.path.splitext(os.path.basename(script))[0] for script in scripts]
+    # every script keeps its own name where it can, so a renamed duplicate must avoid them all
+    taken = set(names)
+    seen = set()
+    result = []
+    for name in names:
+        if name in seen:
+            count = 2
+            while f'{name}_{count}' in taken:
+                count += 1
+            name = f'{name}_{count}'
+            taken.add(name)
+        seen.add(name)
+        result.append(os.path.join(output_root, name))
+    return result
+
+
+def run_script(script, output_dir):
+    '''在当前进程中执行一个指令文件，异常被捕获并记录在结果里
+
+    :param script: str 指令文件路径
+    :param output_dir: str 输出目录
+    :return: dict script/output_dir/ok/saves/wall/error
+    '''
+    start = time.perf_counter()
+    result = {'script': script, 'output_dir': output_dir,
+              'ok': True, 'saves': 0, 'error': None}
+    session = None
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        # leaving the with block waits for the writer, so write errors land here too
+        with Session(output_dir) as session, open(script, 'r') as fp:
+            session.run(iter_commands(fp))
+    except Exception:
+        result['ok'] = False
+        result['error'] = traceback.format_exc()
+    if session is not None:
+        result['saves'] = session.saves
+    result['wall'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(scripts, dirs, jobs=1, progress=None):
+    '''在进程池中执行所有指令文件
+
+    :param scripts: list of str 指令文件
+    :param dirs: list of str 对应的输出目录
+    :param jobs: (int) 进程数，为1时在当前进程中依次执行
+    :param progress: callable(result) | None 每个脚本结束时调用
+    :return: list of dict run_script的结果，与scripts顺序一致
+    '''
+    results = [None] * len(scripts)
+    if jobs <= 1:
+        for i, (script, output_dir) in enumerate(zip(scripts, dirs)):
+            results[i] = run_script(script, output_dir)
+            if progress:
+                progress(results[i])
+        return results
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = {pool.submit(run_script, script, output_dir): i
+                   for i, (script, output_dir) in enumerate(zip(scripts, dirs))}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception:
+                # the worker itself died (e.g. killed), not just the script
+                results[i] = {'script': scripts[i], 'output_dir': dirs[i],
+                              'ok': False, 'saves': 0, 'wall': 0.,
+                              'error': traceback.format_exc()}
+            if progress:
+                progress(results[i])
+    return results
+
+
+def summarize(results, wall):
+    '''
+    :param results: run_batch的返回值
+    :param wall: (float) 整个批次的墙钟时间（秒）
+    :return: dict 汇总信息
+    '''
+    times = sorted(r['wall'] for r in results)
+    failed = [r for r in results if not r['ok']]
+    return {
+        'scripts': len(results),
+        'ok': len(results) - len(failed),
+        'failed': len(failed),
+        'saves': sum(r['saves'] for r in results),
+        'wall': wall,
+        'scripts_per_sec': len(results) / wall if wall else 0.,
+        'script_wall_total': sum(times),
+        'script_wall_median': times[len(times) // 2] if times else 0.,
+        'script_wall_max': times[-1] if times else 0.,
+        'results': results,
+    }
+
+
+def print_summary(summary, file=None):
+    # looked up per call, so a redirected sys.stdout is honoured
+    file = file or sys.stdout
+    for r in summary['results']:
+        status = 'ok' if r['ok'] else 'FAILED'
+        print(f'{r["wall"]:9.3f}s  {r["saves"]:4d} saves  {status:6s}  {r["script"]}',
+              file=file)
+    for r in summary['results']:
+        if not r['ok']:
+            print(f'\n{r["script"]}:\n{r["error"].rstrip()}', file=file)
+    print(f'\n{summary["scripts"]} scripts ({summary["ok"]} ok, {summary["failed"]} failed), '
+          f'{summary["saves"]} canvases in {summary["wall"]:.3f}s: '
+          f'{summary["scripts_per_sec"]:.2f} scripts/s, '
+          f'per script median {summary["script_wall_median"]:.3f}s '
+          f'max {summary["script_wall_max"]:.3f}s', file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='在一组长期存活的进程中批量执行cg_cli指令文件')
+    parser.add_argument('inputs', nargs='*', help='指令文件或包含指令文件的目录')
+    parser.add_argument('-m', '--manifest', help='清单文件，每行一个指令文件')
+    parser.add_argument('-o', '--output-root', default='output',
+                        help='输出根目录，每个指令文件输出到其下同名子目录')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='进程数，默认为CPU核数')
+    parser.add_argument('--summary', help='把汇总信息另存为JSON文件')
+    args = parser.parse_args(argv)
+
+    scripts = collect_scripts(args.inputs, args.manifest)
+    if not scripts:
+        parser.error('no input scripts')
+    dirs = output_dirs(scripts, args.output_root)
+
+    start = time.perf_counter()
+    results = run_batch(scripts, dirs, args.jobs)
+    summary = summarize(results, time.perf_counter() - start)
+    print_summary(summary)
+    if args.summary:
+        with open(args.summary, 'w') as fp:
+            json.dump(summary, fp, indent=2)
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -3,16 +3,45 @@
 
 import sys
 import os
+import argparse
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 import cg_algorithms as alg
+import cg_algorithms_np as npalg
 import numpy as np
-from PIL import Image
+import raster_cache
+import image_writer
+import profiler as profiling
 
 
 DRAW = ['Line', 'Polygon', 'Ellipse', 'Curve']
 DRAW_FUNC = {shape.lower(): vars(
-    alg)[f'draw_{shape.lower()}'] for shape in DRAW}
+    npalg)[f'draw_{shape.lower()}'] for shape in DRAW}
 TRANSFORM = ['translate', 'rotate', 'scale', 'clip']
 TRANSFORM_FUNC = {trans: vars(alg)[trans] for trans in TRANSFORM}
+# how many arguments each deferred transform takes, not counting p_list
+TRANSFORM_ARGS = {'translate': (2, 2), 'rotate': (3, 3), 'scale': (3, 4)}
+# an item with this many deferred transforms has them applied right away,
+# so a long chain of rotations holds a bounded number of pending entries
+PENDING_MAX = 64
+# filling a span with one slice beats fancy indexing once runs get this long
+SPAN_RUN = 16
+# --jobs: fewer uncached items than this are not worth shipping to the pool
+PARALLEL_MIN = 32
+# each worker gets about this many chunks, but a chunk holds at least CHUNK_MIN items
+CHUNKS_PER_JOB = 4
+CHUNK_MIN = 8
+# canvases larger than this are rendered in bands of about TILE_BYTES
+TILE_AUTO_BYTES = 512 << 20
+TILE_BYTES = 16 << 20
+# repaint the whole retained canvas once this share of its items changed
+DIRTY_FULL = 0.5
+# damage is tracked in square cells of this many pixels; once this share of the
+# cells is damaged a full repaint is cheaper than the masked one
+DAMAGE_CELL = 32
+DAMAGE_FULL = 0.25
+WHITE = np.full(3, 255, np.uint8)
 
 
 def parse_num(num: str):
@@ -28,41 +57,416 @@ def parse_num(num: str):
     return num
 
 
-if __name__ == '__main__':
-    input_file = sys.argv[1] if len(sys.argv) > 1 else None
-    output_dir = sys.argv[2] if len(sys.argv) > 2 else input('output_dir: ')
-    os.makedirs(output_dir, exist_ok=True)
+def check_transform(trans, args):
+    '''检查变换参数的个数与类型，不合法时抛出TypeError，与立即执行该变换时一致
+
+    :param trans: str 'translate' | 'rotate' | 'scale'
+    :param args: list 变换参数（不含p_list），已经过parse_num
+    '''
+    low, high = TRANSFORM_ARGS[trans]
+    if not low <= len(args) <= high:
+        raise TypeError(f'{trans} takes {low} to {high} arguments, got {len(args)}'
+                        if low < high else
+                        f'{trans} takes {low} arguments, got {len(args)}')
+    for arg in args:
+        if not isinstance(arg, (int, float)):
+            raise TypeError(f'{trans}: bad argument {arg!r}')
+
+
+def raster_size(raster):
+    '''光栅结果包含的像素数
+
+    :param raster: ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    :return: int
+    '''
+    if raster.shape[1] == 3:
+        return int((raster[:, 2] - raster[:, 1] + 1).sum())
+    return len(raster)
+
+
+def rasterize_uncached(items, profiler=None):
+    '''不查缓存直接光栅化，同类型同算法的线段与多边形合并，只调用一次npalg.draw_lines_spans
+
+    :param items: list of [item_type, p_list, algorithm, color]，均为可绘制的图元
+    :param profiler: profiler.Profiler | None 按'raster:图元类型/算法'记录耗时与像素数
+    :return: list of ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    '''
+    result = [None] * len(items)
+    batches = {}
+    for i, (item_type, p_list, algorithm, _) in enumerate(items):
+        if item_type in ('line', 'polygon'):
+            edges = npalg.polygon_edges(
+                p_list[:2] if item_type == 'line' else p_list,
+                closed=(item_type == 'polygon'))
+            batches.setdefault((item_type, algorithm), []).append((i, edges))
+            continue
+        start = time.perf_counter()
+        if item_type == 'ellipse':
+            result[i] = npalg.draw_ellipse_spans(p_list, algorithm)
+        else:
+            result[i] = DRAW_FUNC[item_type](p_list, algorithm)
+        if profiler:
+            profiler.since(f'raster:{item_type}/{algorithm}', start,
+                           raster_size(result[i]))
+    for (item_type, algorithm), batch in batches.items():
+        start = time.perf_counter()
+        segments = np.concatenate([edges for _, edges in batch])
+        spans, span_offsets = npalg.draw_lines_spans(segments, algorithm)
+        start_edge = 0
+        for i, edges in batch:
+            end = start_edge + len(edges)
+            # copied so a cached entry doesn't pin the whole batch
+            result[i] = spans[span_offsets[start_edge]:span_offsets[end]].copy()
+            start_edge = end
+        if profiler:
+            profiler.since(f'raster:{item_type}/{algorithm}', start,
+                           raster_size(spans))
+    return result
+
+
+def pool_context():
+    '''--jobs进程池的启动方式
+
+    ImageWriter的后台线程先于工作进程启动，fork出的工作进程可能继承一把被该线程持有的锁而死锁；
+    支持时改用forkserver，工作进程都从一个没有其他线程的服务进程fork出来，否则用spawn
+
+    :return: multiprocessing的context
+    '''
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        # numpy and the algorithms are imported once in the server, not per worker
+        context.set_forkserver_preload(['cg_cli'])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+def rasterize_chunk(items):
+    '''进程池中执行的任务：光栅化一组图元，并返回所用的CPU时间
+
+    用CPU时间而不是墙钟时间，进程数多于核数时各块的耗时才不会重复计入
+
+    :param items: list of [item_type, p_list, algorithm, color]
+    :return: (list of ndarray, float) 光栅结果与CPU耗时（秒）
+    '''
+    start = time.process_time()
+    result = rasterize_uncached(items)
+    return result, time.process_time() - start
+
+
+def rasterize_parallel(items, pool, jobs):
+    '''把图元分块交给进程池光栅化，结果按原顺序拼回
+
+    :param items: list of [item_type, p_list, algorithm, color]
+    :param pool: concurrent.futures.ProcessPoolExecutor
+    :param jobs: (int) 进程数，每个进程大约分到CHUNKS_PER_JOB块
+    :return: (list of ndarray, float) 光栅结果与各块耗时之和（即串行所需时间的估计）
+    '''
+    size = max(CHUNK_MIN, -(-len(items) // (jobs * CHUNKS_PER_JOB)))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    result, work = [], 0.
+    # map yields in submission order, so the composite order never depends on timing
+    for rasters, elapsed in pool.map(rasterize_chunk, chunks):
+        result.extend(rasters)
+        work += elapsed
+    return result, work
+
+
+def rasterize(items, cache=raster_cache.shared, pool=None, jobs=1, timing=None,
+              profiler=None):
+    '''图元列表 -> 各图元的光栅结果
+
+    只差整数平移的图元共用一份规范化的光栅结果（见alg.canonical），先查缓存，
+    未命中的图元交给rasterize_uncached，给出进程池时分块并行；
+    线段、多边形和椭圆输出水平段，曲线输出像素坐标
+
+    :param items: list of [item_type, p_list, algorithm, color]
+    :param cache: raster_cache.RasterCache | None
+    :param pool: concurrent.futures.ProcessPoolExecutor | None
+    :param jobs: (int) pool中的进程数
+    :param timing: dict | None 若给出，写入本次实际光栅化的图元数'items'、
+                   耗时'wall'与串行耗时的估计'work'（秒）
+    :param profiler: profiler.Profiler | None 另以'raster:lookup'记录查缓存的耗时，
+                     以及由缓存或同形图元直接得到的像素数
+    :return: list of ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    '''
+    lookup = time.perf_counter()
+    result = [None] * len(items)
+    offsets = [(0, 0)] * len(items)
+    # key -> indices of the items sharing that canonical raster
+    pending = {}
+    for i, (item_type, p_list, algorithm, _) in enumerate(items):
+        if item_type not in DRAW_FUNC:
+            continue
+        base, offsets[i] = alg.canonical(p_list, item_type, algorithm)
+        # curves are rasterized to pixels, everything else to spans
+        kind = 'pixels' if item_type == 'curve' else 'spans'
+        key = raster_cache.make_key(kind, item_type, base, algorithm)
+        if key in pending:
+            pending[key].append(i)
+            continue
+        raster = cache.get(key) if cache is not None else None
+        if raster is not None:
+            result[i] = npalg.shift_raster(raster, *offsets[i])
+        else:
+            pending[key] = [i]
+
+    todo = [items[i] for i, *_ in pending.values()]
+    start = time.perf_counter()
+    lookup = start - lookup
+    if pool is not None and len(todo) >= PARALLEL_MIN:
+        computed, work = rasterize_parallel(todo, pool, jobs)
+        if profiler:
+            profiler.since('raster:pool', start,
+                           sum(raster_size(raster) for raster in computed))
+    else:
+        computed = rasterize_uncached(todo, profiler)
+        work = None
+    wall = time.perf_counter() - start
+    if timing is not None:
+        timing.update(items=len(todo), wall=wall,
+                      work=wall if work is None else work)
+
+    for (key, (first, *rest)), raster in zip(pending.items(), computed):
+        dx, dy = offsets[first]
+        result[first] = raster
+        raster = npalg.shift_raster(raster, -dx, -dy)
+        if cache is not None:
+            raster = cache.put(key, raster)
+        for i in rest:
+            result[i] = npalg.shift_raster(raster, *offsets[i])
+    if profiler:
+        computed = {first for first, *_ in pending.values()}
+        profiler.record('raster:lookup', lookup, sum(
+            raster_size(raster) for i, raster in enumerate(result)
+            if raster is not None and i not in computed))
+    return result
+
+
+def paint(canvas, raster, color, mask=None):
+    '''把一个图元的光栅结果画到画布上，画布外的部分直接丢弃
+
+    水平段平均足够长时逐段切片赋值，否则展开成像素坐标，
+    按展平后的下标做一次花式索引赋值
+
+    :param canvas: ndarray (H, W, 3)
+    :param raster: ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    :param color: ndarray (3,)
+    :param mask: ndarray (H, W) bool | None 只画mask为True的像素
+    '''
+    height, width = canvas.shape[:2]
+    if raster.shape[1] == 3:
+        raster = npalg.crop_spans(raster, width, height)
+        length = (raster[:, 2] - raster[:, 1] + 1).sum()
+        if mask is None and length >= SPAN_RUN * len(raster):
+            npalg.fill_spans(canvas, raster, color)
+            return
+        raster = npalg.spans_to_pixels(raster)
+    else:
+        raster = npalg.crop_pixels(raster, width, height)
+    flat = raster[:, 1].astype(np.intp) * width + raster[:, 0]
+    if mask is not None:
+        flat = flat[mask.reshape(-1)[flat]]
+    canvas.reshape(-1, canvas.shape[2])[flat] = color
+
+
+def raster_bbox(raster):
+    '''光栅结果的包围盒
+
+    :param raster: ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    :return: (x_min, y_min, x_max, y_max) | None（没有像素时）
+    '''
+    if not len(raster):
+        return None
+    if raster.shape[1] == 3:
+        return (int(raster[:, 1].min()), int(raster[:, 0].min()),
+                int(raster[:, 2].max()), int(raster[:, 0].max()))
+    (x0, y0), (x1, y1) = raster.min(axis=0), raster.max(axis=0)
+    return int(x0), int(y0), int(x1), int(y1)
+
+
+def sort_rows(raster):
+    '''按行排序光栅结果，便于用二分查找取出落在某个行带内的部分
+
+    :param raster: ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    :return: (ndarray, ndarray) 排好序的光栅结果与对应的行号
+    '''
+    ys = raster[:, 0] if raster.shape[1] == 3 else raster[:, 1]
+    if len(ys) > 1 and (ys[1:] < ys[:-1]).any():
+        raster = raster[np.argsort(ys, kind='stable')]
+        ys = raster[:, 0] if raster.shape[1] == 3 else raster[:, 1]
+    return raster, ys
+
+
+def damage_cells(rasters, width, height):
+    '''改动图元的光栅结果 -> 按DAMAGE_CELL大小的格子汇总的受损情况
+
+    :param rasters: list of ndarray (M, 3) 水平段 | ndarray (N, 2) 像素坐标
+    :param width: (int) 画布宽度
+    :param height: (int) 画布高度
+    :return: ndarray (ceil(H / DAMAGE_CELL), ceil(W / DAMAGE_CELL)) bool
+    '''
+    rows, cols = -(-height // DAMAGE_CELL), -(-width // DAMAGE_CELL)
+    # +1 at the first cell of each run and -1 past its last, summed along the row
+    runs = np.zeros([rows, cols + 1], np.int64)
+    for raster in rasters:
+        if raster.shape[1] == 3:
+            spans = npalg.crop_spans(raster, width, height) // DAMAGE_CELL
+            y, c0, c1 = spans[:, 0], spans[:, 1], spans[:, 2] + 1
+        else:
+            cells = npalg.crop_pixels(raster, width, height) // DAMAGE_CELL
+            y, c0 = cells[:, 1], cells[:, 0]
+            c1 = c0 + 1
+        np.add.at(runs, (y, c0), 1)
+        np.add.at(runs, (y, c1), -1)
+    return runs.cumsum(axis=1)[:, :cols] > 0
 
-    item_dict = {}
-    pen_color = np.zeros(3, np.uint8)
-    width = 0
-    height = 0
 
-    fp = open(input_file, 'r') if input_file else sys.stdin
-    for line in fp.readlines():
+def damaged(cells, bboxes):
+    '''哪些包围盒内有受损的格子（用二维前缀和，每个包围盒O(1)）
+
+    :param cells: damage_cells的返回值
+    :param bboxes: ndarray (N, 4) int (x_min, y_min, x_max, y_max)，可超出画布
+    :return: ndarray (N,) bool
+    '''
+    rows, cols = cells.shape
+    table = np.zeros([rows + 1, cols + 1], np.int64)
+    table[1:, 1:] = cells.cumsum(axis=0).cumsum(axis=1)
+    x0 = np.clip(bboxes[:, 0] // DAMAGE_CELL, 0, cols)
+    y0 = np.clip(bboxes[:, 1] // DAMAGE_CELL, 0, rows)
+    x1 = np.clip(bboxes[:, 2] // DAMAGE_CELL + 1, 0, cols)
+    y1 = np.clip(bboxes[:, 3] // DAMAGE_CELL + 1, 0, rows)
+    return table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0] > 0
+
+
+def clip_items(item_dict, item_ids, x_min, y_min, x_max, y_max, algorithm):
+    '''用同一个裁剪窗口裁剪多条线段，只调用一次npalg.clip_lines
+
+    完全被裁掉的图元从item_dict中删除
+
+    :param item_dict: dict of item_id -> [item_type, p_list, algorithm, color]
+    :param item_ids: list of str 待裁剪的图元id，互不重复
+    :param algorithm: (string) 'Cohen-Sutherland' | 'Liang-Barsky'
+    '''
+    segments = [item_dict[item_id][1][:2] for item_id in item_ids]
+    clipped, keep = npalg.clip_lines(
+        segments, x_min, y_min, x_max, y_max, algorithm)
+    clipped = iter(clipped.tolist())
+    for item_id, kept in zip(item_ids, keep):
+        if kept:
+            item_dict[item_id][1] = next(clipped)
+        else:
+            item_dict.pop(item_id)
+
+
+def iter_commands(fp):
+    '''逐行读取指令，读到一行就产出一行，不会把整个输入读进内存
+
+    :param fp: 文本文件对象（包括sys.stdin）
+    :return: generator of list of str 每条指令按空格切分后的记号，跳过空行与注释
+    '''
+    for line in fp:
         line = line.strip()
         if line.startswith('#') or not line:
             continue
-        line = line.split(' ')
+        yield line.split(' ')
+
+
+class Session:
+    '''
+    一次cg_cli运行的状态（画布大小、图元、画笔颜色），指令逐条到达逐条执行
+    '''
+
+    def __init__(self, output_dir, cache=raster_cache.shared, jobs=1,
+                 write_queue=image_writer.DEFAULT_QUEUE_SIZE, tile_rows=None,
+                 profiler=None):
+        '''
+
+        :param output_dir: saveCanvas的输出目录
+        :param cache: raster_cache.RasterCache | None
+        :param jobs: (int) 光栅化使用的进程数，大于1时每次保存后向stderr报告加速比
+        :param write_queue: (int) 后台写出队列的长度，0表示同步写出
+        :param tile_rows: (int | None) 分块渲染每个行带的行数，0表示不分块，
+                          None表示画布超过TILE_AUTO_BYTES时自动分块
+        :param profiler: profiler.Profiler | None 记录各类指令与各阶段的耗时
+        '''
+        self.output_dir = output_dir
+        self.cache = cache
+        self.jobs = jobs
+        self.pool = ProcessPoolExecutor(jobs, mp_context=pool_context()) if jobs > 1 else None
+        self.profiler = profiler
+        self.writer = image_writer.ImageWriter(write_queue, profiler=profiler)
+        self.tile_rows = tile_rows
+        self.timing = {}
+        self.saves = 0
+        self.paths = []  # every image saved so far, in order
+        self.item_dict = {}
+        self.pending = {}  # item_id -> transforms not applied yet
+        self.pen_color = np.zeros(3, np.uint8)
+        self.width = 0
+        self.height = 0
+        # consecutive clips with the same window are collected and run as one batch
+        self.clip_args = None
+        self.clip_ids = []
+        # retained canvas: what the last save painted, and what changed since
+        self.canvas = None
+        self.canvas_shared = False  # handed to the writer, copy before painting
+        self.rasters = {}  # item_id -> (raster, bbox) currently on the canvas
+        self.dirty = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        '''结束进程池，等待所有图像写完；写出失败时在这里抛出异常'''
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        self.writer.close()
+
+    def run(self, commands):
+        '''执行指令流
+
+        :param commands: iterable of list of str，通常是iter_commands的返回值
+        '''
+        prof = self.profiler
+        if prof is None:
+            for line in commands:
+                self.execute(line)
+        else:
+            # time between commands is reading and tokenizing the next one
+            start = profiling.clock()
+            for line in commands:
+                prof.since('parse', start)
+                # a batch of clips flushed by this command is timed as 'clip', not as it
+                self.flush_stale_clips(line)
+                start = profiling.clock()
+                self.execute(line)
+                start = prof.since('cmd:' + line[0], start)
+        self.flush_clips()
+
+    def execute(self, line):
+        '''执行一条指令
+
+        :param line: list of str 指令记号
+        '''
+        self.flush_stale_clips(line)
         if line[0] == 'resetCanvas':
-            width = int(line[1])
-            height = int(line[2])
-            item_dict = {}
+            self.width = int(line[1])
+            self.height = int(line[2])
+            self.item_dict = {}
+            self.pending = {}
+            self.canvas = None
+            self.rasters = {}
+            self.dirty = set()
         elif line[0] == 'saveCanvas':
-            save_name = line[1]
-            canvas = np.zeros([height, width, 3], np.uint8)
-            canvas.fill(255)
-            for item_type, p_list, algorithm, color in item_dict.values():
-                if item_type in DRAW_FUNC:
-                    pixels = DRAW_FUNC[item_type](p_list, algorithm)
-                    for x, y in pixels:
-                        canvas[y, x] = color
-            Image.fromarray(canvas).save(os.path.join(
-                output_dir, save_name + '.bmp'), 'bmp')
+            self.save_canvas(line[1])
         elif line[0] == 'setColor':
-            pen_color[0] = int(line[1])
-            pen_color[1] = int(line[2])
-            pen_color[2] = int(line[3])
+            self.pen_color[0] = int(line[1])
+            self.pen_color[1] = int(line[2])
+            self.pen_color[2] = int(line[3])
         elif line[0][:4] == 'draw' and line[0][4:] in DRAW:
             item_type = line[0][4:].lower()
             item_id = line[1]
@@ -71,22 +475,261 @@ if __name__ == '__main__':
             d2 = [d for i, d in enumerate(digits) if i % 2 == 1]
             p_list = list(zip(d1, d2))
             algorithm = line[-1] if item_type != 'ellipse' else None
-            item_dict[item_id] = [item_type, p_list,
-                                  algorithm, np.array(pen_color)]
+            self.item_dict[item_id] = [item_type, p_list,
+                                       algorithm, np.array(self.pen_color)]
+            # transforms of the overwritten item are never needed
+            self.pending.pop(item_id, None)
+            self.dirty.add(item_id)
+        elif line[0] == 'clip':
+            self.item_dict[line[1]]  # unknown ids fail here, as they did unbatched
+            self.clip_args = [parse_num(s) for s in line[2:]]
+            self.clip_ids.append(line[1])
         elif line[0] in TRANSFORM:
             item_id = line[1]
-            if line[0] == 'rotate' and item_dict[item_id][0] == 'ellipse':
+            # unknown ids fail here, as they did before transforms were deferred
+            item_type = self.item_dict[item_id][0]
+            if line[0] == 'rotate' and item_type == 'ellipse':
                 # unable to rotate ellipse
                 pass
             else:
                 args = [parse_num(s) for s in line[2:]]
-                original_p_list = item_dict[item_id][1]
-                args.insert(0, original_p_list)
-                p_list = TRANSFORM_FUNC[line[0]](*args)
-                if not p_list:  # line-clip
-                    item_dict.pop(item_id)
-                else:
-                    item_dict[item_id][1] = p_list
-
-    if fp != sys.stdin:
-        fp.close()
+                # bad or missing arguments raise here too, not at the next save
+                check_transform(line[0], args)
+                self.defer(item_id, line[0], args)
+                self.dirty.add(item_id)
+
+    def defer(self, item_id, trans, args):
+        '''记下一个变换，等到保存时真正需要该图元再执行
+
+        相邻的整数平移合并为一次；旋转与缩放每步都要取整，不能合成一个矩阵，
+        只能依次执行，积攒到PENDING_MAX个时就先执行掉
+
+        :param item_id: str
+        :param trans: str 'translate' | 'rotate' | 'scale'
+        :param args: list 变换参数（不含p_list）
+        '''
+        ops = self.pending.setdefault(item_id, [])
+        if trans == 'translate' and ops and ops[-1][0] == 'translate' \
+                and all(isinstance(a, int) for a in ops[-1][1] + args):
+            (dx, dy), (ex, ey) = ops[-1][1], args
+            ops[-1] = (trans, [dx + ex, dy + ey])
+        else:
+            ops.append((trans, args))
+            if len(ops) >= PENDING_MAX:
+                self.materialize([item_id])
+
+    def materialize(self, item_ids):
+        '''执行图元积攒下的变换，结果与逐条执行完全相同
+
+        :param item_ids: iterable of str
+        '''
+        for item_id in item_ids:
+            ops = self.pending.pop(item_id, None)
+            if ops:
+                item = self.item_dict[item_id]
+                for trans, args in ops:
+                    item[1] = TRANSFORM_FUNC[trans](item[1], *args)
+
+    def flush_stale_clips(self, line):
+        '''下一条指令不能并入正在收集的裁剪时，先执行已收集的裁剪
+
+        :param line: list of str 下一条指令的记号
+        '''
+        if self.clip_ids and (line[0] != 'clip' or line[1] in self.clip_ids or
+                              [parse_num(s) for s in line[2:]] != self.clip_args):
+            self.flush_clips()
+
+    def flush_clips(self):
+        if self.clip_ids:
+            start = profiling.clock()
+            self.materialize(self.clip_ids)
+            if self.profiler:
+                start = self.profiler.since('transform', start)
+            clip_items(self.item_dict, self.clip_ids, *self.clip_args)
+            if self.profiler:
+                self.profiler.since('clip', start)
+            self.dirty.update(self.clip_ids)
+            self.clip_ids = []
+
+    def update_rasters(self):
+        '''重新光栅化自上次保存以来改动过的图元
+
+        :return: (dict, list, list) 当前可绘制的图元（按插入顺序），
+                 改动图元旧的与新的(光栅结果, 包围盒)
+        '''
+        items = {item_id: item for item_id, item in self.item_dict.items()
+                 if item[0] in DRAW_FUNC}
+        dirty = [item_id for item_id in self.dirty if item_id in items]
+        start = profiling.clock()
+        self.materialize(dirty)
+        if self.profiler:
+            self.profiler.since('transform', start)
+        rasters = rasterize([items[item_id] for item_id in dirty], self.cache,
+                            self.pool, self.jobs, self.timing, self.profiler)
+        old = [self.rasters.pop(item_id) for item_id in self.dirty
+               if item_id in self.rasters]
+        new = [(raster, raster_bbox(raster)) for raster in rasters]
+        self.rasters.update(zip(dirty, new))
+        self.dirty = set()
+        return items, old, new
+
+    def render(self):
+        '''把自上次保存以来的改动合成到保留的画布上
+
+        只重新光栅化新增或变换过的图元；改动不多时只重画它们新旧像素覆盖到的位置，
+        其余图元的像素原样保留，重画时仍按item_dict的插入顺序叠放
+
+        :return: ndarray (H, W, 3) uint8 当前画布
+        '''
+        changed = len(self.dirty)
+        items, old, new = self.update_rasters()
+        full = self.canvas is None or changed >= DIRTY_FULL * len(items)
+        start = profiling.clock()
+        canvas = self.composite(items, old, new, full)
+        if self.profiler:
+            self.profiler.since('composite', start)
+        return canvas
+
+    def composite(self, items, old, new, full):
+        '''
+        改动较少时，把新旧像素覆盖的位置记为受损，按DAMAGE_CELL大小的格子汇总，
+        只有包围盒内有受损格子的图元才在受损位置上重画；受损格子或要重画的图元过多时整张重画
+
+        :param items: dict 当前可绘制的图元（按插入顺序）
+        :param old: list 改动图元旧的(光栅结果, 包围盒)
+        :param new: list 改动图元新的(光栅结果, 包围盒)
+        :param full: (bool) 是否重画整张画布
+        :return: ndarray (H, W, 3) uint8 当前画布
+        '''
+        ids = [item_id for item_id in items if self.rasters[item_id][1]]
+        if not full:
+            changes = [raster for raster, bbox in old + new if bbox is not None]
+            cells = damage_cells(changes, self.width, self.height)
+            if not cells.any():
+                return self.canvas
+            bboxes = np.array([self.rasters[item_id][1] for item_id in ids],
+                              np.int64).reshape(-1, 4)
+            hits = np.flatnonzero(damaged(cells, bboxes))
+            # masked repaints cost more per item than plain ones
+            full = cells.mean() >= DAMAGE_FULL or len(hits) >= DIRTY_FULL * len(ids)
+        if full:
+            self.canvas = np.zeros([self.height, self.width, 3], np.uint8)
+            self.canvas.fill(255)
+            self.canvas_shared = False
+            for item_id, item in items.items():
+                paint(self.canvas, self.rasters[item_id][0], item[3])
+            return self.canvas
+
+        if self.canvas_shared:
+            self.canvas = self.canvas.copy()
+            self.canvas_shared = False
+        mask = np.zeros([self.height, self.width], bool)
+        for raster in changes:
+            paint(mask[:, :, None], raster, True)
+            paint(self.canvas, raster, WHITE)
+        for k in hits:
+            paint(self.canvas, self.rasters[ids[k]][0], items[ids[k]][3], mask)
+        return self.canvas
+
+    def tile_height(self):
+        '''
+        :return: (int) 分块渲染时每个行带的行数，0表示整张画布一次渲染
+        '''
+        row_bytes = self.width * 3
+        if self.tile_rows is None:
+            if self.height * row_bytes <= TILE_AUTO_BYTES:
+                return 0
+            return max(1, TILE_BYTES // max(1, row_bytes))
+        return self.tile_rows
+
+    def save_tiled(self, path, rows):
+        '''逐个行带渲染并直接写入BMP文件，不分配整张画布
+
+        每个行带只绘制包围盒与之相交的图元，仍按插入顺序叠放
+
+        :param path: 输出路径
+        :param rows: (int) 每个行带的行数
+        '''
+        items, _, _ = self.update_rasters()
+        # no retained canvas is kept in this mode
+        self.canvas = None
+        ids = [item_id for item_id in items if self.rasters[item_id][1]]
+        bboxes = np.array([self.rasters[item_id][1] for item_id in ids],
+                          np.int64).reshape(-1, 4)
+        # item -> its raster sorted by row and those rows, kept while bands still reach it
+        active = {}
+        with image_writer.BmpStream(path, self.width, self.height) as bmp:
+            for y0 in range(0, self.height, rows):
+                y1 = min(self.height, y0 + rows)
+                start = profiling.clock()
+                band = np.full([y1 - y0, self.width, 3], 255, np.uint8)
+                for k in np.flatnonzero((bboxes[:, 1] < y1) & (bboxes[:, 3] >= y0)):
+                    if k not in active:
+                        active[k] = sort_rows(self.rasters[ids[k]][0])
+                    raster, ys = active[k]
+                    i0, i1 = np.searchsorted(ys, (y0, y1))
+                    paint(band, npalg.shift_raster(raster[i0:i1], 0, -y0), items[ids[k]][3])
+                    if bboxes[k, 3] < y1:
+                        del active[k]
+                if self.profiler:
+                    start = self.profiler.since('composite', start)
+                bmp.write_rows(y0, band)
+                if self.profiler:
+                    self.profiler.since('encode', start, band.size // 3)
+
+    def save_canvas(self, save_name):
+        self.timing.clear()
+        path = os.path.join(self.output_dir, save_name + '.bmp')
+        rows = self.tile_height()
+        if rows:
+            self.save_tiled(path, rows)
+        else:
+            canvas = self.render()
+            # the retained canvas is copied on its next change instead of now
+            self.canvas_shared = True
+            self.writer.submit(canvas, path)
+        self.saves += 1
+        self.paths.append(path)
+        if self.pool is not None and self.timing.get('items'):
+            wall, work = self.timing['wall'], self.timing['work']
+            print(f'{save_name}: {self.timing["items"]} items rasterized in '
+                  f'{wall:.3f}s with {self.jobs} jobs, '
+                  f'speedup {work / wall if wall else 1:.2f}x',
+                  file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='按指令文件绘制图元并保存画布，指令逐行读取、逐行执行')
+    parser.add_argument('input_file', nargs='?',
+                        help='指令文件，缺省或为-时从标准输入读取')
+    parser.add_argument('output_dir', nargs='?', help='输出目录')
+    parser.add_argument('-j', '--jobs', type=int, default=1,
+                        help='光栅化使用的进程数，默认为1（不开进程池）')
+    parser.add_argument('--write-queue', type=int,
+                        default=image_writer.DEFAULT_QUEUE_SIZE,
+                        help='后台写出队列的长度，0表示同步写出')
+    parser.add_argument('--profile', metavar='REPORT.json',
+                        help='记录各类指令与变换、裁剪、光栅化、合成、编码各阶段的次数与耗时，'
+                        '写成JSON报告并在stderr输出表格；saveCanvas的耗时包含它触发的各阶段')
+    parser.add_argument('--tile-rows', type=int, default=None,
+                        help='分块渲染每个行带的行数，画布不再整张放在内存中；'
+                        '0表示不分块，缺省时画布超过512MB自动分块')
+    args = parser.parse_args(argv)
+    output_dir = args.output_dir or input('output_dir: ')
+    os.makedirs(output_dir, exist_ok=True)
+
+    prof = profiling.Profiler() if args.profile else None
+    with Session(output_dir, jobs=args.jobs, write_queue=args.write_queue,
+                 tile_rows=args.tile_rows, profiler=prof) as session:
+        if args.input_file and args.input_file != '-':
+            with open(args.input_file, 'r') as fp:
+                session.run(iter_commands(fp))
+        else:
+            session.run(iter_commands(sys.stdin))
+    if prof is not None:
+        print(prof.table(prof.dump(args.profile)), file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
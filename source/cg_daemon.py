@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli 常驻服务：解释器、numpy/PIL 与光栅化缓存常驻在一组工作进程中，
+# 通过 Unix socket 或标准输入接收 JSON 行格式的任务，每个任务在独立的 Session（画布）中执行，
+# 返回保存的图像路径或图像内容，以及每个任务的耗时
+#
+# 请求（一行一个JSON对象）：
+#   {"id": 1, "script": "resetCanvas 100 100\n...", "return": "paths"}
+#   指令可以用 "script"（整段文本）、"commands"（每条一个字符串的列表）或 "path"（指令文件）给出；
+#   "output_dir" 指定输出目录，缺省时在 --output-root 下为每个任务新建一个不重名的目录；
+#   "return": "images" 时以 base64 返回 BMP 内容，未指定 output_dir 则不留下文件
+#   {"op": "ping"} / {"op": "stats"} / {"op": "shutdown"}
+# 响应（一行一个JSON对象，按完成顺序，用 id 对应请求）：
+#   {"id": 1, "ok": true, "saves": [{"name": "1", "path": ".../1.bmp"}],
+#    "latency": {"total": ..., "queue": ..., "run": ...}, "stages": {...}}
+import sys
+import os
+import argparse
+import asyncio
+import base64
+import itertools
+import json
+import shutil
+import signal
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from cg_cli import Session, iter_commands, pool_context
+import profiler as profiling
+import raster_cache
+
+# longest request line accepted, a whole script travels in one line
+LINE_LIMIT = 64 << 20
+
+
+def render_job(job_id, kind, commands, output_dir, images=False):
+    '''在工作进程中执行一个任务
+
+    :param job_id: 任务编号，只用于结果
+    :param kind: (string) 'text'表示commands是整段指令文本，'path'表示commands是指令文件路径
+    :param commands: (string) 指令文本或指令文件路径
+    :param output_dir: (string | None) 输出目录，None时使用临时目录并在返回前删除
+    :param images: (bool) 是否在结果中附带base64编码的图像内容
+    :return: dict ok/saves/run/stages/cache/pid/error
+    '''
+    start = time.perf_counter()
+    result = {'id': job_id, 'ok': True, 'saves': [], 'error': None, 'pid': os.getpid()}
+    temp = output_dir is None
+    if temp:
+        output_dir = tempfile.mkdtemp(prefix='cg_daemon_')
+    prof = profiling.Profiler()
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        # synchronous writes: the images must be on disk before the reply goes out
+        with Session(output_dir, write_queue=0, profiler=prof) as session:
+            if kind == 'path':
+                with open(commands, 'r') as fp:
+                    session.run(iter_commands(fp))
+            else:
+                session.run(iter_commands(commands.splitlines()))
+        for path in session.paths:
+            save = {'name': os.path.splitext(os.path.basename(path))[0]}
+            if not temp:
+                save['path'] = os.path.abspath(path)
+            if images:
+                with open(path, 'rb') as fp:
+                    save['bmp'] = base64.b64encode(fp.read()).decode('ascii')
+            result['saves'].append(save)
+    except Exception:
+        result['ok'] = False
+        result['error'] = traceback.format_exc()
+    finally:
+        if temp:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    result['run'] = time.perf_counter() - start
+    result['stages'] = {name: s['total'] for name, s in prof.report()['stats'].items()}
+    result['cache'] = raster_cache.shared.stats()
+    return result
+
+
+def warm_up():
+    '''让工作进程在第一个任务之前启动'''
+    return os.getpid()
+
+
+class Daemon:
+    '''
+    把请求分派到进程池，统计每个任务的耗时
+    '''
+
+    def __init__(self, jobs=1, output_root='daemon_output'):
+        '''
+        :param jobs: (int) 工作进程数，0表示在服务进程的一个线程中执行
+        :param output_root: (string) 未指定output_dir的任务的输出根目录
+        '''
+        self.jobs = jobs
+        self.output_root = output_root
+        self.pool = self.make_pool()
+        self.ids = itertools.count(1)
+        self.profiler = profiling.Profiler()
+        self.done = 0
+        self.failed = 0
+        self.active = 0
+        self.stopped = asyncio.Event()
+
+    def make_pool(self):
+        # a replacement pool starts while the event loop and executor threads are running
+        if self.jobs > 0:
+            return ProcessPoolExecutor(self.jobs, mp_context=pool_context())
+        return ThreadPoolExecutor(1)
+
+    def replace_pool(self, pool):
+        '''一个工作进程异常退出后整个进程池不再可用，之后的任务换用新的进程池'''
+        if self.pool is pool:
+            self.pool = self.make_pool()
+            pool.shutdown(wait=False)
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*[loop.run_in_executor(self.pool, warm_up)
+                               for _ in range(max(self.jobs, 1))])
+
+    def close(self):
+        self.pool.shutdown()
+
+    def stats(self):
+        return {'ok': True, 'jobs': self.jobs, 'done': self.done, 'failed': self.failed,
+                'active': self.active, 'latency': self.profiler.report()}
+
+    async def handle(self, request):
+        '''处理一个请求
+
+        :param request: dict 解析后的请求
+        :return: dict 响应
+        '''
+        op = request.get('op', 'render')
+        if op == 'ping':
+            return {'id': request.get('id'), 'ok': True, 'pong': True}
+        if op == 'stats':
+            return {'id': request.get('id'), **self.stats()}
+        if op == 'shutdown':
+            self.stopped.set()
+            return {'id': request.get('id'), 'ok': True, 'shutdown': True}
+        if op != 'render':
+            return {'id': request.get('id'), 'ok': False, 'error': f'unknown op: {op}'}
+
+        job = next(self.ids)
+        if 'script' in request:
+            kind, commands = 'text', request['script']
+        elif 'commands' in request:
+            kind, commands = 'text', '\n'.join(request['commands'])
+        elif 'path' in request:
+            kind, commands = 'path', request['path']
+        else:
+            return {'id': request.get('id', job), 'ok': False,
+                    'error': 'request has no script, commands or path'}
+        images = request.get('return', 'paths') == 'images'
+        output_dir = request.get('output_dir')
+        if output_dir is None and not images:
+            # job numbers restart with the daemon, so the directory name alone must be unique
+            os.makedirs(self.output_root, exist_ok=True)
+            output_dir = tempfile.mkdtemp(prefix=f'job{job}_', dir=self.output_root)
+
+        start = profiling.clock()
+        self.active += 1
+        loop = asyncio.get_running_loop()
+        task = (render_job, request.get('id', job), kind, commands, output_dir, images)
+        pool = self.pool
+        try:
+            try:
+                future = loop.run_in_executor(pool, *task)
+            except BrokenProcessPool:
+                # a worker died while idle, nothing was lost: retry on a fresh pool
+                self.replace_pool(pool)
+                pool = self.pool
+                future = loop.run_in_executor(pool, *task)
+            result = await future
+        except Exception as e:
+            # the worker process died during the job, or the result could not be sent back
+            result = {'id': request.get('id', job), 'ok': False, 'saves': [], 'run': 0.,
+                      'error': traceback.format_exc()}
+            if isinstance(e, BrokenProcessPool):
+                self.replace_pool(pool)
+        finally:
+            self.active -= 1
+        total = profiling.clock() - start
+        run = result.pop('run')
+        result['latency'] = {'total': total, 'queue': max(total - run, 0.), 'run': run}
+        self.profiler.record('job', total)
+        self.profiler.record('run', run)
+        self.done += 1
+        self.failed += not result['ok']
+        return result
+
+    async def serve(self, reader, send):
+        '''读取请求行直到EOF或shutdown，每个请求一个任务，完成即回复
+
+        :param reader: asyncio.StreamReader
+        :param send: 协程函数，参数为响应dict
+        '''
+        tasks = set()
+
+        async def respond(line):
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError('request must be a JSON object')
+            except ValueError as e:
+                await send({'ok': False, 'error': f'bad request: {e}'})
+                return
+            await send(await self.handle(request))
+
+        stop = asyncio.create_task(self.stopped.wait())
+        while not self.stopped.is_set():
+            read = asyncio.create_task(reader.readline())
+            await asyncio.wait({read, stop}, return_when=asyncio.FIRST_COMPLETED)
+            if not read.done():
+                read.cancel()
+                break
+            try:
+                line = read.result()
+            except ValueError as e:
+                # longer than LINE_LIMIT, the rest of the stream cannot be resynced
+                await send({'ok': False, 'error': f'bad request: {e}'})
+                break
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.create_task(respond(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        stop.cancel()
+        if tasks:
+            await asyncio.gather(*tasks)
+
+
+def encode(response):
+    return (json.dumps(response) + '\n').encode('utf-8')
+
+
+async def serve_unix(daemon, path):
+    '''在Unix socket上服务，每个连接可以发多个请求，直到收到shutdown'''
+    async def client(reader, writer):
+        lock = asyncio.Lock()
+
+        async def send(response):
+            async with lock:
+                writer.write(encode(response))
+                await writer.drain()
+
+        try:
+            await daemon.serve(reader, send)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    if os.path.exists(path):
+        os.unlink(path)
+    server = await asyncio.start_unix_server(client, path, limit=LINE_LIMIT)
+    os.chmod(path, 0o600)
+    print(f'cg_daemon listening on {path} with {daemon.jobs} workers', file=sys.stderr)
+    async with server:
+        await daemon.stopped.wait()
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+async def serve_stdio(daemon):
+    '''从标准输入读请求，响应写到标准输出，标准输入结束后等待剩余任务完成再退出'''
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=LINE_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    out = sys.stdout.buffer
+
+    async def send(response):
+        out.write(encode(response))
+        out.flush()
+
+    await daemon.serve(reader, send)
+
+
+async def run(args):
+    daemon = Daemon(args.jobs, args.output_root)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, daemon.stopped.set)
+    try:
+        await daemon.start()
+        if args.socket:
+            await serve_unix(daemon, args.socket)
+        else:
+            await serve_stdio(daemon)
+    finally:
+        daemon.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='cg_cli常驻服务：通过Unix socket或标准输入接收JSON行格式的绘制任务')
+    parser.add_argument('-s', '--socket', help='Unix socket路径，缺省时从标准输入读取请求')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='工作进程数，默认为CPU核数；0表示在服务进程内执行')
+    parser.add_argument('-o', '--output-root', default='daemon_output',
+                        help='未指定output_dir的任务的输出根目录')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 生成 cg_cli 指令文件作为合成负载：直线/多边形/椭圆/曲线混合，成串的平移/旋转/缩放，
+# 对直线的裁剪，以及穿插其中的多次 saveCanvas；图元数、画布大小与顶点数均可调，相同种子生成相同脚本
+import sys
+import argparse
+import random
+
+# item kind -> relative frequency
+DEFAULT_MIX = {'line': 4, 'polygon': 2, 'ellipse': 2, 'curve': 2}
+
+
+def parse_range(text):
+    '''"3-8"或"5" -> (3, 8)或(5, 5)'''
+    lo, _, hi = text.partition('-')
+    return int(lo), int(hi or lo)
+
+
+def parse_mix(text):
+    '''"line=4,polygon=2" -> {'line': 4, 'polygon': 2}'''
+    mix = {}
+    for part in text.split(','):
+        kind, _, weight = part.partition('=')
+        if kind not in DEFAULT_MIX:
+            raise ValueError(f'unknown item kind: {kind}')
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class Workload:
+    '''
+    逐行生成指令，坐标均落在画布内（cg_cli的draw指令只接受非负整数）
+    '''
+
+    def __init__(self, width=800, height=600, vertices=(3, 8), curve_vertices=(4, 10),
+                 extent=0.3, mix=None, seed=0):
+        '''
+        :param width: (int) 画布宽度
+        :param height: (int) 画布高度
+        :param vertices: (int, int) 多边形顶点数范围
+        :param curve_vertices: (int, int) 曲线控制点数范围
+        :param extent: (float) 图元包围盒边长相对画布边长的上限
+        :param mix: dict 图元种类 -> 相对频率
+        :param seed: 随机数种子
+        '''
+        self.width = width
+        self.height = height
+        self.vertices = vertices
+        self.curve_vertices = curve_vertices
+        self.extent = extent
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+        self.items = []  # (item_id, kind) of the items later commands may refer to
+        self.count = 0
+        self.saves = 0
+
+    def box(self):
+        '''随机的包围盒 (x0, y0, x1, y1)'''
+        rng = self.rng
+        w = rng.randint(1, max(1, int(self.width * self.extent)))
+        h = rng.randint(1, max(1, int(self.height * self.extent)))
+        x0 = rng.randrange(max(1, self.width - w))
+        y0 = rng.randrange(max(1, self.height - h))
+        return x0, y0, x0 + w, y0 + h
+
+    def points(self, n):
+        x0, y0, x1, y1 = self.box()
+        return ' '.join(f'{self.rng.randint(x0, x1)} {self.rng.randint(y0, y1)}'
+                        for _ in range(n))
+
+    def draw(self):
+        rng = self.rng
+        kind = rng.choices(list(self.mix), list(self.mix.values()))[0]
+        item_id = f'{kind[0]}{self.count}'
+        self.count += 1
+        self.items.append((item_id, kind))
+        color = f'setColor {rng.randrange(256)} {rng.randrange(256)} {rng.randrange(256)}'
+        if kind == 'line':
+            cmd = f'drawLine {item_id} {self.points(2)} {rng.choice(("DDA", "Bresenham"))}'
+        elif kind == 'polygon':
+            cmd = (f'drawPolygon {item_id} {self.points(rng.randint(*self.vertices))} '
+                   f'{rng.choice(("DDA", "Bresenham"))}')
+        elif kind == 'ellipse':
+            x0, y0, x1, y1 = self.box()
+            cmd = f'drawEllipse {item_id} {x0} {y0} {x1} {y1}'
+        else:
+            algorithm = rng.choice(('Bezier', 'B-spline'))
+            lo, hi = self.curve_vertices
+            # a cubic B-spline needs at least 4 control points
+            n = rng.randint(max(lo, 4) if algorithm == 'B-spline' else lo, max(hi, 4))
+            cmd = f'drawCurve {item_id} {self.points(n)} {algorithm}'
+        return [color, cmd]
+
+    def transform(self):
+        '''对一个已有图元做一次小幅变换，大致保持在画布内'''
+        rng = self.rng
+        if not self.items:
+            return []
+        item_id, kind = rng.choice(self.items)
+        cx, cy = rng.randrange(self.width), rng.randrange(self.height)
+        op = rng.choice(('translate', 'translate', 'scale') if kind == 'ellipse'
+                        else ('translate', 'translate', 'rotate', 'scale'))
+        if op == 'translate':
+            return [f'translate {item_id} {rng.randint(-20, 20)} {rng.randint(-20, 20)}']
+        if op == 'rotate':
+            return [f'rotate {item_id} {cx} {cy} {rng.randint(1, 359)}']
+        return [f'scale {item_id} {cx} {cy} {rng.choice(("0.5", "0.8", "0.9", "1.1", "1.25"))}']
+
+    def clip(self):
+        lines = [item_id for item_id, kind in self.items if kind == 'line']
+        if not lines:
+            return []
+        item_id = self.rng.choice(lines)
+        # a clip may delete the line, so later commands no longer refer to it
+        self.items.remove((item_id, 'line'))
+        x0, y0, x1, y1 = self.box()
+        return [f'clip {item_id} {x0} {y0} {x1} {y1} '
+                f'{self.rng.choice(("Cohen-Sutherland", "Liang-Barsky"))}']
+
+    def save(self):
+        self.saves += 1
+        return f'saveCanvas {self.saves}'
+
+    def script(self, items=100, transforms=1.0, storm=0.2, clips=0.05, saves=10):
+        '''生成整个脚本
+
+        :param items: (int) 图元数
+        :param transforms: (float) 平均每个图元的变换次数
+        :param storm: (float) 变换集中成串（变换风暴）出现的比例，其余随图元均匀穿插
+        :param clips: (float) 平均每个图元的裁剪次数（只作用于直线）
+        :param saves: (int) saveCanvas次数，均匀分布，最后一次在脚本末尾
+        :return: generator of str 指令行
+        '''
+        rng = self.rng
+        yield f'resetCanvas {self.width} {self.height}'
+        save_at = {max(1, round(items * (k + 1) / saves)) for k in range(saves)} if saves else set()
+        for i in range(1, items + 1):
+            yield from self.draw()
+            if rng.random() < transforms * (1 - storm):
+                yield from self.transform()
+            if rng.random() < clips:
+                yield from self.clip()
+            if i in save_at:
+                if storm and transforms:
+                    # a burst of transforms right before the snapshot
+                    for _ in range(round(transforms * storm * items / max(saves, 1))):
+                        yield from self.transform()
+                yield self.save()
+
+
+def generate(fp, items=100, width=800, height=600, vertices=(3, 8), curve_vertices=(4, 10),
+             extent=0.3, transforms=1.0, storm=0.2, clips=0.05, saves=10, mix=None, seed=0):
+    '''把生成的脚本写入fp，参数见Workload与Workload.script
+
+    :return: (int) 写出的指令行数
+    '''
+    workload = Workload(width, height, vertices, curve_vertices, extent, mix, seed)
+    count = 0
+    for line in workload.script(items, transforms, storm, clips, saves):
+        fp.write(line + '\n')
+        count += 1
+    return count
+
+
+def add_arguments(parser, scene=True):
+    '''
+    :param parser: argparse的parser或参数组
+    :param scene: (bool) 是否包括图元数与画布大小（扩展性测试自己扫描这几项）
+    '''
+    if scene:
+        parser.add_argument('-n', '--items', type=int, default=100, help='图元数')
+        parser.add_argument('--width', type=int, default=800, help='画布宽度')
+        parser.add_argument('--height', type=int, default=600, help='画布高度')
+    parser.add_argument('--vertices', type=parse_range, default=(3, 8),
+                        help='多边形顶点数范围，如3-8')
+    parser.add_argument('--curve-vertices', type=parse_range, default=(4, 10),
+                        help='曲线控制点数范围，如4-10')
+    parser.add_argument('--extent', type=float, default=0.3,
+                        help='图元包围盒边长相对画布的上限')
+    parser.add_argument('--transforms', type=float, default=1.0,
+                        help='平均每个图元的变换次数')
+    parser.add_argument('--storm', type=float, default=0.2,
+                        help='变换集中在saveCanvas之前成串出现的比例')
+    parser.add_argument('--clips', type=float, default=0.05, help='平均每个图元的裁剪次数')
+    parser.add_argument('--saves', type=int, default=10, help='saveCanvas次数')
+    parser.add_argument('--mix', type=parse_mix, default=None,
+                        help='图元种类的相对频率，如line=4,polygon=2,ellipse=2,curve=2')
+    parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+
+
+def workload_kwargs(args):
+    '''add_arguments解析出的参数 -> generate的关键字参数（不含scene中的各项）'''
+    return dict(vertices=args.vertices, curve_vertices=args.curve_vertices,
+                extent=args.extent, transforms=args.transforms, storm=args.storm,
+                clips=args.clips, saves=args.saves, mix=args.mix, seed=args.seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='生成cg_cli的合成负载指令文件')
+    parser.add_argument('output', nargs='?', help='输出的指令文件，缺省时写到标准输出')
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    kwargs = dict(items=args.items, width=args.width, height=args.height,
+                  **workload_kwargs(args))
+    if args.output:
+        with open(args.output, 'w') as fp:
+            generate(fp, **kwargs)
+    else:
+        generate(sys.stdout, **kwargs)
+
+
+if __name__ == '__main__':
+    main()
@@ -471,8 +471,8 @@ class MyCanvas(QGraphicsView):
             isset = kwargs['set'] if 'set' in kwargs else False
             ret = []
             if t_type == 'translate':
-                ret = alg.translate(
-                    p_list.real, kwargs['dx'], kwargs['dy'])
+                ret = deepcopy(p_list)
+                ret.translate(kwargs['dx'], kwargs['dy'])
             elif t_type == 'rotate':
                 ret = deepcopy(p_list)
                 ret.rotate(center, kwargs['r']) if p_type != 'ellipse' else ret
@@ -1,16 +1,21 @@
 import cg_algorithms as alg
+import cg_algorithms_np as npalg
+import raster_cache
 from cg_algorithms_ext import Direc
 from my_plist import PList
 from copy import deepcopy
 from typing import Optional
+import numpy as np
 from PyQt5.QtWidgets import QGraphicsItem, QWidget, QStyleOptionGraphicsItem
-from PyQt5.QtGui import QPainter, QColor, QPen
+from PyQt5.QtGui import QPainter, QColor, QPen, QPolygonF
 from PyQt5.QtCore import QRectF, Qt, QMarginsF
 
 type_map = {'line': 0, 'polygon': 1, 'ellipse': 2, 'curve': 3}
 type_map_rev = {v: k for k, v in type_map.items()}
 alg_map = {'DDA': 0, 'Bresenham': 1, 'Bezier': 2, 'B-spline': 3, '': 4}
 alg_map_rev = {v: k for k, v in alg_map.items()}
+# draw horizontal runs as lines once they are this long on average
+SPAN_RUN = 4
 
 
 class MyItem(QGraphicsItem):
@@ -41,7 +46,10 @@ class MyItem(QGraphicsItem):
 
         self.dirty = True
         self.on_paint_clean = False
-        self.pixels = []
+        self.rasters = []           # [(pixels, spans), ...]
+        self.offset = (0, 0)        # rasters are painted shifted by this
+        self.chain_cache = ([], (np.empty((0, 2), np.int32), np.empty((0, 3), np.int32)))
+        self.segment_cache = {}     # B-spline segment -> its sample points
 
     def copy(self):
         ret = MyItem(self.id, self.item_type, deepcopy(
@@ -52,32 +60,109 @@ class MyItem(QGraphicsItem):
         return ret
 
     def update_pixel(self):
-        func_map = {'line':    [alg.draw_line]*2,
-                    'polygon': [alg.draw_polygon, alg.draw_fold_line],
-                    'ellipse': [alg.draw_ellipse]*2,
-                    'curve':   [alg.draw_curve]*2}
-        func_id = 1 if self.in_progress else 0
-        self.pixels = func_map[self.item_type][func_id](
-            self.p_list.real, self.algorithm)
+        if self.in_progress and (self.item_type == 'polygon' or self.algorithm == 'B-spline'):
+            self.rasters = self.chain_rasters()
+            self.offset = (0, 0)
+        else:
+            self.rasters = [self.full_raster()]
         if self.item_type == 'curve':
-            # xy[0] contains all x's, xy[1] contains all y's
-            xy = list(zip(*self.pixels))
-            if not xy:
+            parts = [pixels for pixels, _ in self.rasters if len(pixels)]
+            if not parts:
                 self.curve_border = [0] * 4
             else:
-                x, y = min(xy[0]), min(xy[1])
-                w, h = max(xy[0]) - x, max(xy[1]) - y
+                x, y = (np.min([p.min(axis=0) for p in parts], axis=0) + self.offset).tolist()
+                w, h = (np.max([p.max(axis=0) for p in parts], axis=0) + self.offset - (x, y)).tolist()
                 self.curve_border = [x, y, w, h]
 
+    def full_raster(self):
+        func_map = {'line':    [npalg.draw_line]*2,
+                    'polygon': [npalg.draw_polygon, npalg.draw_fold_line],
+                    'ellipse': [npalg.draw_ellipse]*2,
+                    'curve':   [npalg.draw_curve]*2}
+        func_id = 1 if self.in_progress else 0
+        func = func_map[self.item_type][func_id]
+        # translated copies share one raster, so dragging needs no redraw
+        p_list, self.offset = alg.canonical(
+            self.p_list.real, self.item_type, self.algorithm)
+
+        def compute():
+            pixels = func(p_list, self.algorithm)
+            return pixels, npalg.pixels_to_spans(pixels)[0]
+        key = raster_cache.make_key(
+            func.__name__, self.item_type, p_list, self.algorithm)
+        return raster_cache.shared.lookup(key, compute)
+
+    def chain_rasters(self):
+        """
+        绘制中的折线或B样条：鼠标移动只改变最后一个控制点，
+        不受其影响的部分沿用上次的结果，只重画随鼠标移动的最后一段
+        """
+        p_list = [tuple(p) for p in self.p_list.real]
+        if self.item_type == 'polygon':
+            algorithm = self.algorithm
+            stable, tail = p_list[:-1], p_list[-1:]
+        else:
+            algorithm = 'DDA'
+            stable, tail = self.bspline_chain(p_list)
+        done, (pixels, spans) = self.chain_cache
+        if stable != done:
+            if len(done) > 1 and stable[:len(done)] == done:
+                # new vertices were committed, only their edges are drawn
+                extra = npalg.draw_fold_line(stable[len(done) - 1:], algorithm)
+                pixels = np.concatenate([pixels, extra])
+                spans = np.concatenate([spans, npalg.pixels_to_spans(extra)[0]])
+            else:
+                pixels = npalg.draw_fold_line(stable, algorithm)
+                spans = npalg.pixels_to_spans(pixels)[0]
+            self.chain_cache = (stable, (pixels, spans))
+        tail = npalg.draw_fold_line(stable[-1:] + tail, algorithm)
+        return [(pixels, spans), (tail, npalg.pixels_to_spans(tail)[0])]
+
+    def bspline_chain(self, p_list):
+        """
+        B样条取样点 -> (不含最后一段的取样点, 最后一段的取样点)，依次连接与alg.curve_points一致
+        """
+        if len(p_list) < 4:
+            return [], []
+        seg_cnt = alg.bspline_seg_cnt(len(p_list))
+        segments = {}
+        stable = []
+        for i in range(len(p_list) - 3):
+            key = (tuple(p_list[i:i + 4]), seg_cnt)
+            points = self.segment_cache.get(key)
+            if points is None:
+                points = alg.bspline_segment(p_list[i:i + 4], seg_cnt)
+            segments[key] = points
+            if i < len(p_list) - 4:
+                for point in points:
+                    if not stable or point != stable[-1]:
+                        stable.append(point)
+        # segments whose control points are gone are dropped here
+        self.segment_cache = segments
+        tail = stable[-1:]
+        for point in points:
+            if not tail or point != tail[-1]:
+                tail.append(point)
+        tail = tail[1:] if stable else tail
+        if len(stable) + len(tail) == 1:
+            # the whole curve rounds to one pixel, drawn as in alg.curve_points
+            tail = tail * 2 if tail else stable[:]
+        return stable, tail
+
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Optional[QWidget] = ...) -> None:
         if self.dirty:
             self.update_pixel()
             if self.on_paint_clean:
                 self.dirty = False
                 self.on_paint_clean = False
-        for p in self.pixels:
-            painter.setPen(self.color)
-            painter.drawPoint(*p)
+        painter.setPen(self.color)
+        painter.translate(*self.offset)
+        for pixels, spans in self.rasters:
+            if len(spans) * SPAN_RUN <= len(pixels):
+                painter.drawLines(spans_to_lines(spans))
+            else:
+                painter.drawPoints(pixels_to_polygon(pixels))
+        painter.translate(-self.offset[0], -self.offset[1])
         # the following will draw the center of primitive
         # painter.setPen(QPen(self.color, 4))
         # painter.drawPoint(*self.rectCenter())
@@ -179,6 +264,28 @@ class MyItem(QGraphicsItem):
         return item
 
 
+def pixels_to_polygon(pixels) -> QPolygonF:
+    """(N, 2)像素坐标数组 -> QPolygonF，直接写入Qt的点缓冲区，不逐点构造QPointF"""
+    polygon = QPolygonF(len(pixels))
+    if len(pixels):
+        buffer = polygon.data()
+        buffer.setsize(len(pixels) * 2 * np.dtype(np.float64).itemsize)
+        np.frombuffer(buffer, np.float64).reshape(-1, 2)[:] = pixels
+    return polygon
+
+
+def spans_to_lines(spans) -> QPolygonF:
+    """(M, 3)水平段数组 -> 成对端点组成的QPolygonF，交给drawLines每段画一条线"""
+    polygon = QPolygonF(len(spans) * 2)
+    if len(spans):
+        buffer = polygon.data()
+        buffer.setsize(len(spans) * 4 * np.dtype(np.float64).itemsize)
+        lines = np.frombuffer(buffer, np.float64).reshape(-1, 4)
+        lines[:, [0, 2]] = spans[:, 1:]
+        lines[:, 1] = lines[:, 3] = spans[:, 0]
+    return polygon
+
+
 def plist_to_bytes(p_list) -> bytes:
     length = len(p_list)
     data = int.to_bytes(length, 4, 'big', signed=False)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 后台线程写图像：saveCanvas 把画布交给队列后立即返回，编码与写盘在后台进行
+# 队列有上限，写得比画得慢时 submit 会阻塞（反压）；后台的异常在下一次 submit、
+# flush 或 close 时抛出，不会被吞掉
+import queue
+import struct
+import threading
+import time
+import numpy as np
+from PIL import Image
+
+DEFAULT_QUEUE_SIZE = 4
+# the resolution PIL writes into a BMP when none is given: 96 dpi in pixels per meter
+BMP_PPM = int(96 * 39.3701 + 0.5)
+
+
+class ImageWriter:
+    """
+    单个后台线程按提交顺序保存图像
+    """
+
+    def __init__(self, max_pending=DEFAULT_QUEUE_SIZE, fmt='bmp', profiler=None):
+        """
+
+        :param max_pending: (int) 队列中最多等待写出的图像数，0表示在调用者线程中同步写出
+        :param fmt: (string) PIL的图像格式
+        :param profiler: profiler.Profiler | None 以'encode'记录每张图的编码与写盘耗时
+        """
+        self.fmt = fmt
+        self.profiler = profiler
+        self.error = None
+        self._queue = queue.Queue(max_pending) if max_pending > 0 else None
+        self._thread = None
+        if self._queue is not None:
+            self._thread = threading.Thread(
+                target=self._run, name='ImageWriter', daemon=True)
+            self._thread.start()
+
+    def submit(self, canvas, path):
+        """交出一张画布，之后调用者不得再修改canvas
+
+        :param canvas: ndarray (H, W, 3) uint8
+        :param path: 输出路径
+        """
+        self._raise()
+        if self._queue is None:
+            self.write(canvas, path)
+        else:
+            # blocks while max_pending images are still waiting
+            self._queue.put((canvas, path))
+
+    def write(self, canvas, path):
+        start = time.perf_counter()
+        Image.fromarray(canvas).save(path, self.fmt)
+        if self.profiler:
+            self.profiler.since('encode', start, canvas.shape[0] * canvas.shape[1])
+
+    def flush(self):
+        """等待已提交的图像全部写完，有写出失败时抛出异常"""
+        if self._queue is not None:
+            self._queue.join()
+        self._raise()
+
+    def close(self):
+        """写完剩余图像并结束后台线程，可重复调用"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise()
+
+    def _raise(self):
+        error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            try:
+                if task is None:
+                    return
+                # after a failure the rest is dropped, the error surfaces on the next call
+                if self.error is None:
+                    self.write(*task)
+            except BaseException as e:
+                self.error = e
+            finally:
+                self._queue.task_done()
+
+
+def bmp_header(width, height):
+    """24位BMP的文件头与信息头，与PIL保存RGB图像时写出的字节一致
+
+    :param width: (int) 图像宽度
+    :param height: (int) 图像高度
+    :return: (bytes, int) 头部字节与每行（含补齐）的字节数
+    """
+    stride = (width * 3 + 3) & ~3
+    offset = 14 + 40
+    file_size = offset + stride * height
+    if file_size > 2**32 - 1:
+        raise ValueError('File size is too large for the BMP format')
+    header = b'BM' + struct.pack('<III', file_size, 0, offset)
+    header += struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0,
+                          stride * height, BMP_PPM, BMP_PPM, 0, 0)
+    return header, stride
+
+
+class BmpStream:
+    """
+    按行带写24位BMP文件，文件大小预先确定，各行带可按任意顺序写入，
+    内存中只有调用者正在写的那一段
+    """
+
+    def __init__(self, path, width, height):
+        header, self.stride = bmp_header(width, height)
+        self.width = width
+        self.height = height
+        self.offset = len(header)
+        self._fp = open(path, 'wb')
+        self._fp.write(header)
+        self._fp.truncate(self.offset + self.stride * height)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write_rows(self, y, rows):
+        """写入从第y行开始的若干行
+
+        :param y: (int) 第一行在图像中的行号（自上而下）
+        :param rows: (ndarray of uint8, shape (h, width, 3)) RGB像素
+        """
+        h = len(rows)
+        data = np.zeros((h, self.stride), np.uint8)
+        # BMP stores BGR rows bottom-up
+        data[:, :self.width * 3] = rows[::-1, :, ::-1].reshape(h, self.width * 3)
+        self._fp.seek(self.offset + (self.height - y - h) * self.stride)
+        self._fp.write(data.tobytes())
+
+    def close(self):
+        if not self._fp.closed:
+            self._fp.close()
@@ -1,5 +1,6 @@
 from copy import deepcopy
-from cg_algorithms import rotate, scale
+import numpy as np
+import cg_algorithms_np as npalg
 from util import epsilon
 
 
@@ -7,64 +8,62 @@ def p_diff(p1, p2):
     return sum(abs(p1[i] - p2[i]) for i in range(2))
 
 
+def clamp_scale(s):
+    return s if abs(s) > epsilon else (epsilon if s >= 0 else -epsilon)
+
+
 class PList(list):
+    # list items are the untransformed points, matrix is every transform
+    # applied since then, composed; sx/sy/sc is the scale being dragged,
+    # kept apart so that scale_set can replace it instead of stacking
     def __init__(self, data=[]):
         super().__init__(data)
         self.__reset()
         if isinstance(data, PList):
-            self.r = data.r
-            self.rc = deepcopy(data.rc)
+            self.matrix = data.matrix.copy()
             self.sx = data.sx
             self.sy = data.sy
             self.sc = deepcopy(data.sc)
 
+    @property
+    def affine(self):
+        if not self.sc:
+            return self.matrix
+        return npalg.compose(self.matrix, npalg.scale_matrix(*self.sc, self.sx, self.sy))
+
     @property
     def real(self):
-        sx = self.sx
-        sy = self.sy
-        scaled = scale(self, *self.sc, sx, sy) if self.sc else self
-        rotated = rotate(scaled, *self.rc, self.r) if self.rc else scaled
-        return rotated
+        # the only place the points get rounded
+        return npalg.affine_points(self.affine, self).tolist()
+
+    def translate(self, dx, dy):
+        self.__fold()
+        self.matrix = npalg.compose(self.matrix, npalg.translate_matrix(dx, dy))
 
     def rotate(self, center, r):
-        if not self.rc:
-            self.r = r
-            self.rc = center
-        elif p_diff(center, self.rc) < 5 and not self.sc:
-            self.r += r
-        else:
-            self.update()
-            self.r = r
-            self.rc = center
+        self.__fold()
+        self.matrix = npalg.compose(self.matrix, npalg.rotate_matrix(*center, r))
 
     def scale(self, center, sx, sy):
-        if not self.sc:
-            self.sx = sx
-            self.sy = sy
-            self.sc = center
-        elif p_diff(center, self.sc) < 5 and not self.rc:
-            next_sx = self.sx * sx
-            next_sy = self.sy * sy
-            self.sx = next_sx if abs(next_sx) > epsilon else self.sx
-            self.sy = next_sy if abs(next_sy) > epsilon else self.sy
-        else:
-            self.update()
-            self.sx = sx
-            self.sy = sy
-            self.sc = center
+        self.__fold()
+        self.matrix = npalg.compose(self.matrix, npalg.scale_matrix(
+            *center, clamp_scale(sx), clamp_scale(sy)))
 
     def scale_set(self, center, sx, sy):
-        if self.rc or (self.sc and p_diff(center, self.sc) > 5):
-            self.update()
-        sx if abs(sx) > epsilon else (epsilon if sx > 0 else -epsilon)
-        sy if abs(sy) > epsilon else (epsilon if sy > 0 else -epsilon)
-        self.sx = sx
-        self.sy = sy
+        if self.sc and p_diff(center, self.sc) > 5:
+            self.__fold()
+        self.sx = clamp_scale(sx)
+        self.sy = clamp_scale(sy)
         self.sc = center
 
+    def __fold(self):
+        self.matrix = self.affine
+        self.sx = 1
+        self.sy = 1
+        self.sc = None
+
     def __reset(self):
-        self.r = 0
-        self.rc = None
+        self.matrix = np.eye(3)
         self.sx = 1
         self.sy = 1
         self.sc = None
@@ -75,8 +74,8 @@ class PList(list):
     def __repr__(self) -> str:
         content = super().__repr__()
         tail = ''
-        if self.rc:
-            tail += f'\n\trotate: {self.rc} {self.r}°'
+        if not np.array_equal(self.matrix, np.eye(3)):
+            tail += f'\n\tmatrix: {self.matrix[:2].tolist()}'
         if self.sc:
             tail += f'\n\tscale: {self.sc} {self.sx} {self.sy}'
         return content + tail
@@ -84,8 +83,7 @@ class PList(list):
 
 if __name__ == "__main__":
     p1 = PList([[50, 100], [100, 100], [100, 50], [50, 50]])
-    p1.r = 90
-    p1.rc = [50, 75]
+    p1.rotate([50, 75], 90)
     print(p1)
     p1.update()
     print(p1)
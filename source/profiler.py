@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli 的计时统计：按名称（指令类型、图元类型/算法、合成、编码等）记录每次耗时与像素数，
+# 汇总成计数、总耗时、平均、p99 等，输出 JSON 与文本表格
+# 每个统计项只保存计数、总和、最值与固定大小的对数直方图，内存不随运行时长增长，可以在正式运行时常开
+import json
+import math
+import threading
+import time
+from array import array
+
+clock = time.perf_counter
+
+# latencies are counted in log-spaced bins from 10ns to 10^4 s, so each name costs
+# a fixed few KB however long the run; percentiles come out within half a bin (~4%)
+BINS_PER_DECADE = 32
+LOG_MIN = -8
+LOG_MAX = 4
+BINS = (LOG_MAX - LOG_MIN) * BINS_PER_DECADE
+
+
+class _Series:
+    """
+    一个统计项：次数、总耗时、最值、像素数与耗时的对数直方图
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'pixels', 'bins')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.
+        self.min = math.inf
+        self.max = 0.
+        self.pixels = None  # stays None for names that never produce pixels
+        # bins[0] holds samples below 10^LOG_MIN, bins[-1] those above 10^LOG_MAX
+        self.bins = array('q', bytes(8 * (BINS + 2)))
+
+    def add(self, seconds, pixels):
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+        if pixels is not None:
+            self.pixels = (self.pixels or 0) + pixels
+        if seconds > 0:
+            k = int((math.log10(seconds) - LOG_MIN) * BINS_PER_DECADE) + 1
+            self.bins[min(max(k, 0), BINS + 1)] += 1
+        else:
+            self.bins[0] += 1
+
+    def percentile(self, q):
+        """
+        :param q: (float) 0到100之间
+        :return: (float) 第q百分位数的估计（所在区间的几何中点，限制在最值之间）
+        """
+        rank = max(1, math.ceil(self.count * q / 100))
+        seen = 0
+        for k, n in enumerate(self.bins):
+            seen += n
+            if seen >= rank:
+                break
+        if k == 0:
+            return self.min
+        if k == BINS + 1:
+            return self.max
+        mid = 10 ** (LOG_MIN + (k - 0.5) / BINS_PER_DECADE)
+        return min(max(mid, self.min), self.max)
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': self.total,
+            'mean': self.total / self.count,
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'pixels': self.pixels,
+        }
+
+
+class Profiler:
+    """
+    线程安全的耗时记录器
+    """
+
+    def __init__(self):
+        self._series = {}  # name -> _Series
+        self._lock = threading.Lock()
+        self.start = clock()
+
+    def record(self, name, seconds, pixels=None):
+        """记录一次耗时
+
+        :param name: (string) 统计项名称
+        :param seconds: (float) 耗时（秒）
+        :param pixels: (int | None) 这次产生的像素数，不产生像素的统计项为None
+        """
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = _Series()
+            series.add(seconds, pixels)
+
+    def since(self, name, start, pixels=None):
+        """记录从start（clock()的返回值）到现在的耗时
+
+        :return: (float) 当前时刻，便于连续计时
+        """
+        now = clock()
+        self.record(name, now - start, pixels)
+        return now
+
+    def report(self):
+        """
+        :return: (dict) name -> count/total/mean/p50/p99/max（秒）与pixels，以及整体墙钟时间
+        """
+        with self._lock:
+            stats = {name: series.summary() for name, series in sorted(self._series.items())}
+        return {'wall': clock() - self.start, 'stats': stats}
+
+    def table(self, report=None):
+        """
+        :param report: report()的返回值，缺省时现算
+        :return: (string) 按总耗时降序排列的文本表格
+        """
+        report = report or self.report()
+        rows = sorted(report['stats'].items(), key=lambda kv: -kv[1]['total'])
+        width = max([len(name) for name, _ in rows] + [4])
+        lines = [f'{"name":<{width}} {"count":>9} {"total(s)":>10} {"mean(ms)":>10} '
+                 f'{"p99(ms)":>10} {"max(ms)":>10} {"pixels":>12}']
+        for name, s in rows:
+            pixels = '-' if s['pixels'] is None else s['pixels']
+            lines.append(f'{name:<{width}} {s["count"]:>9d} {s["total"]:>10.3f} '
+                         f'{s["mean"] * 1e3:>10.3f} {s["p99"] * 1e3:>10.3f} '
+                         f'{s["max"] * 1e3:>10.3f} {pixels:>12}')
+        lines.append(f'wall {report["wall"]:.3f}s')
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """把report()写成JSON文件，并返回同一份报告"""
+        report = self.report()
+        with open(path, 'w') as fp:
+            json.dump(report, fp, indent=2)
+        return report
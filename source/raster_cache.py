@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 光栅化结果的 LRU 缓存，cg_cli 与 gui_item 共用
+# 键为 (结果种类, 图元类型, 算法, 取整后的顶点元组)，值为只读的 ndarray 或其元组，
+# 按占用字节数淘汰最久未使用的条目
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_MAX_BYTES = 64 << 20
+
+
+def make_key(kind, item_type, p_list, algorithm):
+    """图元 -> 缓存键
+
+    :param kind: (string) 结果种类，如'pixels'、'spans'，同一图元的不同输出互不干扰
+    :param item_type: (string) 'line'、'polygon'、'ellipse'、'curve'等
+    :param p_list: (list of list of int) 图元参数
+    :param algorithm: (string) 绘制算法
+    :return: (tuple) 可哈希的键
+    """
+    return (kind, item_type, algorithm,
+            tuple((int(x), int(y)) for x, y in p_list))
+
+
+def nbytes(value):
+    """缓存值占用的字节数
+
+    :param value: ndarray 或 ndarray 的 tuple/list
+    :return: (int)
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sum(nbytes(v) for v in value)
+
+
+def freeze(value):
+    """把缓存值设为只读，避免共享的结果被某个使用者改掉"""
+    if isinstance(value, np.ndarray):
+        value.setflags(write=False)
+    else:
+        for v in value:
+            freeze(v)
+    return value
+
+
+class RasterCache:
+    """
+    按字节数限制大小的LRU缓存
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        """
+
+        :param max_bytes: (int) 缓存内容的总字节数上限，0表示不缓存
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        # kind -> [entries, bytes]
+        self._kinds = {}
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        value = self._data.get(key)
+        if value is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._data.move_to_end(key)
+        return value[0]
+
+    def put(self, key, value):
+        """存入一个结果，超过上限时从最久未使用的条目开始淘汰
+
+        :return: 只读化后的value
+        """
+        value = freeze(value)
+        size = nbytes(value)
+        if key in self._data:
+            self._account(key, -1, -self._data.pop(key)[1])
+        if size > self.max_bytes:
+            return value
+        while self.nbytes + size > self.max_bytes:
+            self._evict()
+        self._data[key] = (value, size)
+        self._account(key, 1, size)
+        return value
+
+    def lookup(self, key, compute):
+        """取缓存结果，未命中时调用compute()计算并存入
+
+        :param key: make_key的返回值
+        :param compute: 无参函数，返回要缓存的值
+        """
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def resize(self, max_bytes):
+        self.max_bytes = max_bytes
+        while self.nbytes > self.max_bytes:
+            self._evict()
+
+    def clear(self):
+        self._data.clear()
+        self._kinds.clear()
+        self.nbytes = 0
+
+    def _evict(self):
+        """淘汰最久未使用的条目"""
+        key, (_, size) = self._data.popitem(last=False)
+        self._account(key, -1, -size)
+
+    def _account(self, key, entries, size):
+        """条目存入（entries = 1）或移除（entries = -1）后更新总字节数与按种类的统计"""
+        self.nbytes += size
+        kind = key[0] if isinstance(key, tuple) else None
+        entry = self._kinds.setdefault(kind, [0, 0])
+        entry[0] += entries
+        entry[1] += size
+        if not entry[0]:
+            del self._kinds[kind]
+
+    def stats(self):
+        """
+        :return: (dict) 命中/未命中次数、条目数与占用字节数，以及按结果种类（键的第一项）分开的条目数与字节数
+        """
+        total = self.hits + self.misses
+        return {'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / total if total else 0.,
+                'entries': len(self._data), 'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'kinds': {kind: {'entries': entries, 'bytes': size}
+                          for kind, (entries, size) in self._kinds.items()}}
+
+
+# the instance cg_cli and MyItem share
+shared = RasterCache()
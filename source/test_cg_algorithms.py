@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms 中曲线取样与绘制的测试
+# 在 source 目录下运行：python -m pytest -q
+import math
+import pytest
+import cg_algorithms as alg
+
+CURVES = [[[0, 0], [50, 120], [160, -40], [200, 80]],
+          [[10, 10], [300, 10], [10, 300], [300, 300], [150, 0]],
+          [[0, 0], [40, 0], [80, 0]],
+          [[-20, 5], [60, 90]]]
+
+
+def distance_to_polyline(point, polyline):
+    px, py = point
+    best = math.inf
+    for (x0, y0), (x1, y1) in zip(polyline, polyline[1:]):
+        dx, dy = x1 - x0, y1 - y0
+        length2 = dx * dx + dy * dy
+        u = 0 if not length2 else min(max(((px - x0) * dx + (py - y0) * dy) / length2, 0), 1)
+        best = min(best, math.hypot(px - x0 - u * dx, py - y0 - u * dy))
+    return best
+
+
+@pytest.mark.parametrize('p_list', CURVES)
+@pytest.mark.parametrize('tolerance', [0.25, alg.FLATNESS, 2])
+def test_flatten_bezier_within_tolerance(p_list, tolerance):
+    points = alg.flatten_bezier(p_list, tolerance)
+    assert points[0] == tuple(p_list[0]) and points[-1] == tuple(p_list[-1])
+    assert all(a != b for a, b in zip(points, points[1:]))
+    # the chord error plus half a pixel of rounding at each end
+    for i in range(501):
+        point = alg.bezier_point(p_list, i / 500)
+        assert distance_to_polyline(point, points) <= tolerance + 1.5
+
+
+def test_flatten_bezier_adapts_to_the_curve():
+    curve = CURVES[0]
+    coarse = alg.flatten_bezier(curve, 2)
+    fine = alg.flatten_bezier(curve, 0.1)
+    assert len(coarse) < len(fine) < 300
+    # a straight curve needs no subdivision beyond its degree
+    assert len(alg.flatten_bezier(CURVES[2])) <= 3
+    small = [[p[0] // 20, p[1] // 20] for p in curve]
+    assert len(alg.flatten_bezier(small)) < len(alg.flatten_bezier(curve))
+
+
+def test_degenerate_bezier_draws_one_pixel():
+    assert alg.curve_points([[5, 5]], 'Bezier') == [(5, 5), (5, 5)]
+    assert alg.draw_curve([[5, 5]], 'Bezier') == [(5, 5)]
+    assert alg.draw_curve([[5, 5], [5, 5], [5, 5]], 'Bezier') == [(5, 5)]
+    assert alg.curve_points([], 'Bezier') == []
+
+
+def test_draw_curve_passes_through_samples():
+    pixels = {tuple(p) for p in alg.draw_curve(CURVES[1], 'Bezier')}
+    assert set(alg.curve_points(CURVES[1], 'Bezier')) <= pixels
+
+
+def bspline_reference(p_list, seg_cnt):
+    '''逐点按定义计算的均匀三次B样条取样点，不去重'''
+    points = []
+    for i in range(len(p_list) - 3):
+        for j in range(seg_cnt + 1):
+            t = j / seg_cnt
+            weights = ((1 - t)**3 / 6, (3*t**3 - 6*t**2 + 4) / 6,
+                       (-3*t**3 + 3*t**2 + 3*t + 1) / 6, t**3 / 6)
+            points.append(tuple(round(sum(w * p[k] for w, p in zip(weights, p_list[i:i + 4])))
+                                for k in range(2)))
+    return points
+
+
+@pytest.mark.parametrize('p_list', CURVES[:2] + [[[0, 0], [10, 40], [30, -5], [60, 20], [80, 80],
+                                                  [100, 0], [140, 30]]])
+def test_bspline_matches_reference(p_list):
+    points = bspline_reference(p_list, alg.bspline_seg_cnt(len(p_list)))
+    expected = [p for k, p in enumerate(points) if not k or p != points[k - 1]]
+    assert alg.curve_points(p_list, 'B-spline') == expected
+
+
+def test_bspline_basis_is_cached():
+    table = alg.bspline_basis(7)
+    assert alg.bspline_basis(7) is table
+    assert len(table) == 8
+    for weights in table:
+        assert sum(weights) == pytest.approx(1)
+
+
+@pytest.mark.parametrize('p_list, pixel', [([[8, 7], [9, 4], [10, 4], [3, 7]], (9, 4)),
+                                           ([[5, 5]] * 4, (5, 5)),
+                                           ([[5, 5]] * 6, (5, 5))])
+def test_degenerate_bspline_draws_one_pixel(p_list, pixel):
+    # every sample rounds to the same pixel, which must still be drawn
+    assert alg.curve_points(p_list, 'B-spline') == [pixel, pixel]
+    assert alg.draw_curve(p_list, 'B-spline') == [pixel]
+
+
+def test_short_bspline_draws_nothing():
+    assert alg.curve_points([[0, 0], [5, 5], [9, 1]], 'B-spline') == []
+    assert alg.draw_curve([[0, 0], [5, 5], [9, 1]], 'B-spline') == []
+
+
+def ellipse_reference(p_list):
+    '''原先的浮点中点椭圆算法，四个方向的对称点都输出（轴上的点有重复）'''
+    x0, x1 = sorted([p_list[0][0], p_list[1][0]])
+    y0, y1 = sorted([p_list[0][1], p_list[1][1]])
+    rx, ry = (x1 - x0) / 2, (y1 - y0) / 2
+    x, y = 0, ry
+    quadrant = [(x, y)]
+    p = ry**2 - rx**2*ry + rx**2/4
+    while ry**2*x < rx**2*y:
+        if p < 0:
+            p += 2*ry**2*x + 3*ry**2
+        else:
+            p += 2*ry**2*x + 3*ry**2 + 2*rx**2*(1 - y)
+            y -= 1
+        x += 1
+        quadrant.append((x, y))
+    p = ry**2*(x + 0.5)**2 + rx**2*(y - 1)**2 - rx**2*ry**2
+    while y > 0:
+        if p <= 0:
+            p += (-2)*rx**2*y + 3*rx**2 + 2*ry**2*(1 + x)
+            x += 1
+        else:
+            p += (-2)*rx**2*y + 3*rx**2
+        y -= 1
+        quadrant.append((x, y))
+    xm, ym = (x0 + x1) / 2, (y0 + y1) / 2
+    return {(round(nx * x + xm - 0.001), round(ny * y + ym - 0.001))
+            for x, y in quadrant for nx in (-1, 1) for ny in (-1, 1)}
+
+
+@pytest.mark.parametrize('w, h', [(0, 0), (1, 0), (0, 3), (1, 1), (2, 2), (7, 3), (4, 9), (50, 10),
+                                  (9, 120), (201, 100), (64, 64), (65, 65), (300, 300), (301, 301)])
+def test_draw_ellipse_matches_reference(w, h):
+    p_list = [[w + 3, -4], [3, h - 4]]
+    pixels = alg.draw_ellipse(p_list)
+    assert len(set(pixels)) == len(pixels)
+    assert set(pixels) == ellipse_reference(p_list)
+
+
+def test_circle_quadrant_is_octant_symmetric():
+    for d in range(0, 400, 2):
+        quadrant, _, _ = alg.ellipse_quadrant([[0, 0], [d, d]])
+        assert quadrant == alg.circle_quadrant(d // 2)
+        points = {(x, y2 // 2) for x, y2 in quadrant}
+        assert points == {(y, x) for x, y in points}
+        # x grows and y falls along the arc
+        assert all(a[0] <= b[0] and a[1] >= b[1] for a, b in zip(quadrant, quadrant[1:]))
+    for d in range(0, 200):
+        p_list = [[0, 0], [d, d]]
+        assert set(alg.draw_ellipse(p_list)) == ellipse_reference(p_list)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_algorithms_np 与 cg_algorithms 的一致性测试
+# 在 source 目录下运行：python -m pytest -q
+import random
+import numpy as np
+import pytest
+import cg_algorithms as alg
+import cg_algorithms_np as npalg
+
+
+def random_segments(n, low=-60, high=60, seed=0):
+    '''随机线段，另加水平、竖直、对角与退化为一点的线段'''
+    rng = random.Random(seed)
+    segments = [[[rng.randint(low, high), rng.randint(low, high)],
+                 [rng.randint(low, high), rng.randint(low, high)]] for _ in range(n)]
+    segments += [[[0, 0], [0, 0]], [[-5, 3], [7, 3]], [[4, -6], [4, 9]],
+                 [[-8, -8], [8, 8]], [[8, -8], [-8, 8]], [[3, 1], [-9, 1]], [[2, 9], [2, -4]]]
+    return segments
+
+
+@pytest.mark.parametrize('algorithm', ['DDA', 'Bresenham'])
+def test_draw_lines_matches_scalar(algorithm):
+    segments = random_segments(300)
+    pixels, offsets = npalg.draw_lines(segments, algorithm)
+    assert len(offsets) == len(segments) + 1
+    for i, segment in enumerate(segments):
+        expected = [list(p) for p in alg.draw_line(segment, algorithm)]
+        assert pixels[offsets[i]:offsets[i + 1]].tolist() == expected, segment
+
+
+def test_draw_lines_empty_and_unknown():
+    pixels, offsets = npalg.draw_lines(np.empty((0, 2, 2), np.int64), 'DDA')
+    assert pixels.shape == (0, 2) and offsets.tolist() == [0]
+    segments = random_segments(3)
+    pixels, offsets = npalg.draw_lines(segments, 'Midpoint')
+    assert pixels.shape == (0, 2) and offsets.tolist() == [0] * (len(segments) + 1)
+
+
+def pixel_set(pixels):
+    return {tuple(p) for p in np.asarray(pixels).tolist()}
+
+
+def test_pixels_spans_round_trip():
+    segments = random_segments(200)
+    pixels, offsets = npalg.draw_lines(segments, 'Bresenham')
+    spans, span_offsets = npalg.pixels_to_spans(pixels, offsets)
+    assert len(span_offsets) == len(offsets)
+    assert (spans[:, 1] <= spans[:, 2]).all()
+    for i in range(len(segments)):
+        group = npalg.spans_to_pixels(spans[span_offsets[i]:span_offsets[i + 1]])
+        # a span lists x upwards, whichever way the line ran
+        expected = pixels[offsets[i]:offsets[i + 1]]
+        assert sorted(map(tuple, group.tolist())) == sorted(map(tuple, expected.tolist()))
+    assert npalg.spans_to_pixels(spans).shape == pixels.shape
+
+    # spans of already merged rows come back unchanged
+    spans = np.array([[0, -3, 4], [1, 2, 2], [1, 5, 9], [-2, 0, 1]], np.int32)
+    again, _ = npalg.pixels_to_spans(npalg.spans_to_pixels(spans))
+    assert again.tolist() == spans.tolist()
+
+    empty, empty_offsets = npalg.pixels_to_spans(np.empty((0, 2), np.int32))
+    assert empty.shape == (0, 3) and empty_offsets.tolist() == [0, 0]
+    assert npalg.spans_to_pixels(empty).shape == (0, 2)
+
+
+@pytest.mark.parametrize('algorithm', ['DDA', 'Bresenham'])
+def test_line_and_polygon_spans(algorithm):
+    for segment in random_segments(50):
+        spans = npalg.draw_line_spans(segment, algorithm)
+        assert pixel_set(npalg.spans_to_pixels(spans)) == pixel_set(alg.draw_line(segment, algorithm))
+    polygon = [[0, 0], [40, 5], [35, 30], [-10, 22]]
+    spans = npalg.draw_polygon_spans(polygon, algorithm)
+    assert pixel_set(npalg.spans_to_pixels(spans)) == pixel_set(alg.draw_polygon(polygon, algorithm))
+
+
+def test_fill_and_crop_spans():
+    spans = np.array([[0, -3, 2], [2, 4, 12], [5, 1, 3], [-1, 0, 4], [3, 10, 20]], np.int32)
+    width, height = 8, 4
+    canvas = np.zeros((height, width), np.uint8)
+    npalg.fill_spans(canvas, npalg.crop_spans(spans.copy(), width, height), 1)
+    expected = np.zeros_like(canvas)
+    for x, y in npalg.crop_pixels(npalg.spans_to_pixels(spans), width, height).tolist():
+        expected[y, x] = 1
+    assert (canvas == expected).all()
+    inside = np.array([[0, 0, 7], [3, 2, 2]], np.int32)
+    assert npalg.crop_spans(inside, width, height) is inside
+
+
+@pytest.mark.parametrize('algorithm', ['Bezier', 'B-spline'])
+@pytest.mark.parametrize('p_list', [[[8, 7], [9, 4], [10, 4], [3, 7]], [[5, 5]] * 4,
+                                    [[0, 0], [50, 120], [160, -40], [200, 80], [90, 10]]])
+def test_draw_curve_matches_scalar(p_list, algorithm):
+    pixels = npalg.draw_curve(p_list, algorithm)
+    assert len(pixels)
+    assert pixel_set(pixels) == pixel_set(alg.draw_curve(p_list, algorithm))
+
+
+ELLIPSES = [[[0, 0], [0, 0]], [[0, 0], [1, 0]], [[0, 0], [1, 1]], [[-3, -2], [4, 2]],
+            [[10, 20], [60, 30]], [[5, 5], [6, 40]], [[-40, -25], [40, 25]],
+            [[30, 10], [0, 0]], [[0, 0], [201, 100]], [[0, 0], [3, 120]],
+            [[0, 0], [40, 40]], [[0, 0], [41, 41]],
+            # large enough for the vectorized solver
+            [[0, 0], [900, 700]], [[-7, 3], [1993, 1003]], [[0, 0], [3000, 3000]],
+            [[5, 5], [2006, 2006]]]
+
+
+@pytest.mark.parametrize('p_list', ELLIPSES)
+def test_draw_ellipse_matches_scalar(p_list):
+    expected = pixel_set(alg.draw_ellipse(p_list))
+    quadrant, _, _ = npalg.ellipse_quadrant(p_list)
+    assert quadrant.tolist() == [list(p) for p in alg.ellipse_quadrant(p_list)[0]]
+    pixels = npalg.draw_ellipse(p_list)
+    assert len(np.unique(pixels, axis=0)) == len(pixels)
+    assert pixel_set(pixels) == expected
+
+    spans = npalg.draw_ellipse_spans(p_list)
+    assert (spans[:, 1] <= spans[:, 2]).all()
+    from_spans = npalg.spans_to_pixels(spans)
+    # the spans do not overlap either
+    assert len(np.unique(from_spans, axis=0)) == len(from_spans)
+    assert pixel_set(from_spans) == expected
+
+
+@pytest.mark.parametrize('algorithm', ['Cohen-Sutherland', 'Liang-Barsky'])
+@pytest.mark.parametrize('window', [(-20, -15, 25, 30), (25, 30, -20, -15), (0, 0, 0, 0),
+                                    (-100, -100, 100, 100)])
+def test_clip_lines_matches_scalar(algorithm, window):
+    segments = random_segments(300)
+    clipped, keep = npalg.clip_lines(segments, *window, algorithm)
+    assert len(keep) == len(segments)
+    assert len(clipped) == keep.sum()
+    kept = iter(clipped.tolist())
+    for segment, kept_flag in zip(segments, keep):
+        expected = [list(p) for p in alg.clip(segment, *window, algorithm)]
+        assert (next(kept) if kept_flag else []) == expected, segment
+
+
+def test_clip_lines_empty():
+    clipped, keep = npalg.clip_lines(np.empty((0, 2, 2)), 0, 0, 10, 10, 'Liang-Barsky')
+    assert clipped.shape == (0, 2, 2) and keep.shape == (0,)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 批量执行驱动 cg_batch 的测试
+# 在 source 目录下运行：python -m pytest -q
+import os
+import json
+import pytest
+import cg_batch
+
+GOOD = 'resetCanvas 40 30\nsetColor 255 0 0\ndrawLine a 0 0 39 29 Bresenham\nsaveCanvas one\n' \
+       'drawEllipse b 5 5 30 20\nsaveCanvas two\n'
+BAD = 'resetCanvas 40 30\ndrawLine a 0 0 10 10 DDA\ntranslate nobody 1 1\nsaveCanvas never\n'
+
+
+def names(dirs, root):
+    return [os.path.relpath(d, root) for d in dirs]
+
+
+@pytest.mark.parametrize('scripts, expected', [
+    (['a.txt', 'x/a.txt', 'a.txt.bak/a.txt'], ['a', 'a_2', 'a_3']),
+    # a script really called a_2 keeps its name, the duplicate moves on
+    (['a.txt', 'x/a.txt', 'a_2.txt'], ['a', 'a_3', 'a_2']),
+    (['a_2.txt', 'a.txt', 'y/a.txt', 'z/a.txt', 'w/a_2.txt'], ['a_2', 'a', 'a_3', 'a_4', 'a_2_2']),
+    (['a.txt', 'b/a.txt', 'a_2.txt', 'c/a_2.txt', 'a_3.txt'], ['a', 'a_4', 'a_2', 'a_2_2', 'a_3']),
+])
+def test_output_dirs_are_unique(scripts, expected):
+    dirs = cg_batch.output_dirs(scripts, 'out')
+    assert names(dirs, 'out') == expected
+    assert len(set(dirs)) == len(dirs)
+
+
+def test_collect_scripts(tmp_path):
+    for name in ('b.txt', 'a.txt', 'notes.md'):
+        (tmp_path / name).write_text(GOOD)
+    sub = tmp_path / 'sub'
+    sub.mkdir()
+    (sub / 'c.txt').write_text(GOOD)
+    manifest = tmp_path / 'list'
+    manifest.write_text('# comment\nsub/c.txt\n\na.txt\n')
+    scripts = cg_batch.collect_scripts([str(tmp_path)], str(manifest))
+    assert [os.path.relpath(s, tmp_path) for s in scripts] == ['a.txt', 'b.txt', 'sub/c.txt']
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_run_batch_isolates_failures(tmp_path, jobs):
+    scripts = []
+    for name, text in (('good1', GOOD), ('bad', BAD), ('good2', GOOD)):
+        scripts.append(str(tmp_path / f'{name}.txt'))
+        with open(scripts[-1], 'w') as fp:
+            fp.write(text)
+    scripts.append(str(tmp_path / 'missing.txt'))
+    dirs = cg_batch.output_dirs(scripts, str(tmp_path / 'out'))
+    seen = []
+    results = cg_batch.run_batch(scripts, dirs, jobs, progress=seen.append)
+    assert [r['script'] for r in results] == scripts
+    assert sorted(r['script'] for r in seen) == sorted(scripts)
+    assert [r['ok'] for r in results] == [True, False, True, False]
+    assert results[0]['saves'] == 2 and results[1]['saves'] == 0
+    assert 'KeyError' in results[1]['error']
+    assert sorted(os.listdir(dirs[0])) == ['one.bmp', 'two.bmp']
+    with open(os.path.join(dirs[0], 'two.bmp'), 'rb') as a, \
+            open(os.path.join(dirs[2], 'two.bmp'), 'rb') as b:
+        assert a.read() == b.read()
+
+    summary = cg_batch.summarize(results, 1.)
+    assert (summary['scripts'], summary['ok'], summary['failed'], summary['saves']) == (4, 2, 2, 4)
+
+
+def test_main_exit_status(tmp_path, capsys):
+    good = tmp_path / 'good.txt'
+    good.write_text(GOOD)
+    summary = tmp_path / 'summary.json'
+    assert cg_batch.main([str(good), '-o', str(tmp_path / 'out'), '-j', '1',
+                          '--summary', str(summary)]) == 0
+    assert json.loads(summary.read_text())['saves'] == 2
+    bad = tmp_path / 'bad.txt'
+    bad.write_text(BAD)
+    assert cg_batch.main([str(good), str(bad), '-o', str(tmp_path / 'out'), '-j', '1']) == 1
+    assert 'FAILED' in capsys.readouterr().out
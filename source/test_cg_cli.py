@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_cli 的测试：各执行方式（进程池、后台写出、分块渲染）输出的图像逐字节一致，以及指令的执行
+# 在 source 目录下运行：python -m pytest -q
+import os
+import json
+import random
+import pytest
+import cg_cli
+import gen_workload
+import raster_cache
+
+
+@pytest.fixture(scope='module')
+def workload(tmp_path_factory):
+    '''一个足以启用进程池（超过PARALLEL_MIN个图元）、含变换与裁剪的脚本'''
+    path = tmp_path_factory.mktemp('workload') / 'input.txt'
+    with open(path, 'w') as fp:
+        gen_workload.generate(fp, items=160, width=240, height=180, transforms=1.5,
+                              clips=0.2, saves=4, seed=7)
+    return str(path)
+
+
+def run_cli(script, output_dir, *args):
+    '''运行cg_cli.main，返回 文件名 -> 图像内容'''
+    # a warm cache from an earlier run would leave nothing for the pool to draw
+    raster_cache.shared.clear()
+    cg_cli.main([script, str(output_dir), *args])
+    result = {}
+    for name in sorted(os.listdir(output_dir)):
+        with open(os.path.join(output_dir, name), 'rb') as fp:
+            result[name] = fp.read()
+    return result
+
+
+@pytest.fixture(scope='module')
+def serial(workload, tmp_path_factory):
+    '''不开进程池、同步写出、不分块时的输出，作为其他执行方式的参照'''
+    result = run_cli(workload, tmp_path_factory.mktemp('serial'),
+                     '--write-queue', '0', '--tile-rows', '0')
+    assert len(result) == 4
+    return result
+
+
+def test_jobs_output_identical(workload, serial, tmp_path):
+    report = tmp_path / 'profile.json'
+    output = run_cli(workload, tmp_path / 'out', '-j', '2', '--write-queue', '0',
+                     '--tile-rows', '0', '--profile', str(report))
+    assert output == serial
+    with open(report) as fp:
+        assert 'raster:pool' in json.load(fp)['stats']
+
+
+def test_pool_is_not_forked_from_a_threaded_process():
+    # the ImageWriter thread is already running when the pool starts its workers
+    assert cg_cli.pool_context().get_start_method() != 'fork'
+
+
+@pytest.mark.parametrize('queue', ['1', '4'])
+def test_background_writes_identical(workload, serial, tmp_path, queue):
+    assert run_cli(workload, tmp_path / 'out', '--write-queue', queue, '--tile-rows', '0') == serial
+
+
+def test_write_error_surfaces(tmp_path):
+    session = cg_cli.Session(str(tmp_path / 'missing'))
+    with pytest.raises(OSError):
+        with session:
+            session.run(cg_cli.iter_commands(['resetCanvas 10 10', 'saveCanvas a']))
+
+
+@pytest.mark.parametrize('args', [['--tile-rows', '16'], ['--tile-rows', '7'],
+                                  ['-j', '2', '--tile-rows', '7', '--write-queue', '0']])
+def test_tiled_output_identical(workload, serial, tmp_path, args):
+    assert run_cli(workload, tmp_path / 'out', *args) == serial
+
+
+def test_deferred_transforms_match_eager(tmp_path):
+    rng = random.Random(19)
+    lines = ['resetCanvas 100 100', 'drawPolygon p 10 10 60 15 80 70 20 50 DDA']
+    expected = [[10, 10], [60, 15], [80, 70], [20, 50]]
+    for _ in range(3 * cg_cli.PENDING_MAX + 5):
+        trans = rng.choice(['translate', 'translate', 'rotate', 'scale'])
+        if trans == 'translate':
+            args = [rng.randint(-5, 5), rng.randint(-5, 5)]
+        elif trans == 'rotate':
+            args = [rng.randint(0, 99), rng.randint(0, 99), rng.randint(1, 359)]
+        else:
+            args = [rng.randint(0, 99), rng.randint(0, 99), rng.choice([0.5, 1.5, 2])]
+        lines.append(' '.join([trans, 'p', *map(str, args)]))
+        expected = cg_cli.TRANSFORM_FUNC[trans](expected, *args)
+    with cg_cli.Session(str(tmp_path), write_queue=0) as session:
+        session.run(cg_cli.iter_commands(lines))
+        # long chains are applied as they grow instead of piling up until a save
+        assert len(session.pending['p']) < cg_cli.PENDING_MAX
+        session.materialize(['p'])
+        assert [list(p) for p in session.item_dict['p'][1]] == [list(p) for p in expected]
+
+
+@pytest.mark.parametrize('line, error', [
+    ('rotate q 1 2 3', KeyError),
+    ('rotate p 1 2', TypeError),
+    ('translate p 1 2 3', TypeError),
+    ('scale p 1 2 x', TypeError),
+])
+def test_bad_transform_fails_at_the_command(tmp_path, line, error):
+    with cg_cli.Session(str(tmp_path), write_queue=0) as session:
+        session.run(cg_cli.iter_commands(['resetCanvas 10 10', 'drawLine p 0 0 5 5 DDA']))
+        with pytest.raises(error):
+            session.execute(line.split())
+        assert not session.pending.get('p')
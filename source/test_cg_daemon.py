@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# cg_daemon 的测试：任务执行、请求分派、按行读取的服务循环，以及经由Unix socket与进程池的完整往返
+# 在 source 目录下运行：python -m pytest -q
+import os
+import json
+import base64
+import tempfile
+import asyncio
+import pytest
+import cg_cli
+import cg_daemon
+
+SCRIPT = 'resetCanvas 40 30\ndrawLine a 0 0 39 29 Bresenham\nsaveCanvas one\n' \
+         'drawEllipse b 5 5 30 25\nsaveCanvas two\n'
+
+
+def expected(tmp_path):
+    '''直接用cg_cli执行SCRIPT得到的图像'''
+    output_dir = tmp_path / 'expected'
+    os.makedirs(output_dir)
+    with cg_cli.Session(str(output_dir), write_queue=0) as session:
+        session.run(cg_cli.iter_commands(SCRIPT.splitlines()))
+    return {name: (output_dir / f'{name}.bmp').read_bytes() for name in ('one', 'two')}
+
+
+def test_render_job_text_and_path(tmp_path):
+    images = expected(tmp_path)
+    result = cg_daemon.render_job(1, 'text', SCRIPT, str(tmp_path / 'text'))
+    assert result['ok'] and result['error'] is None
+    assert [s['name'] for s in result['saves']] == ['one', 'two']
+    for save in result['saves']:
+        with open(save['path'], 'rb') as fp:
+            assert fp.read() == images[save['name']]
+    assert result['run'] > 0 and 'cmd:saveCanvas' in result['stages']
+
+    script = tmp_path / 'scene.txt'
+    script.write_text(SCRIPT)
+    result = cg_daemon.render_job(2, 'path', str(script), str(tmp_path / 'path'))
+    assert [s['path'] for s in result['saves']] == \
+        [str(tmp_path / 'path' / f'{name}.bmp') for name in ('one', 'two')]
+
+
+def test_render_job_images_leave_no_files(tmp_path, monkeypatch):
+    images = expected(tmp_path)
+    monkeypatch.setenv('TMPDIR', str(tmp_path / 'tmp'))
+    os.makedirs(tmp_path / 'tmp')
+    monkeypatch.setattr(tempfile, 'tempdir', None)
+    result = cg_daemon.render_job(1, 'text', SCRIPT, None, images=True)
+    assert {s['name']: base64.b64decode(s['bmp']) for s in result['saves']} == images
+    assert all('path' not in s for s in result['saves'])
+    assert os.listdir(tmp_path / 'tmp') == []
+
+
+def test_render_job_error(tmp_path):
+    result = cg_daemon.render_job(7, 'text', 'resetCanvas 10 10\nrotate missing 0 0 90\n',
+                                  str(tmp_path))
+    assert not result['ok'] and result['id'] == 7
+    assert 'KeyError' in result['error']
+
+
+def test_handle(tmp_path):
+    async def scenario():
+        daemon = cg_daemon.Daemon(0, str(tmp_path / 'root'))
+        try:
+            assert (await daemon.handle({'op': 'ping', 'id': 1}))['pong']
+            assert not (await daemon.handle({'op': 'nope'}))['ok']
+            assert not (await daemon.handle({'id': 2}))['ok']
+            first = await daemon.handle({'id': 3, 'script': SCRIPT})
+            second = await daemon.handle({'id': 4, 'commands': SCRIPT.splitlines()})
+            bad = await daemon.handle({'id': 5, 'script': 'drawLine'})
+            stats = await daemon.handle({'op': 'stats'})
+        finally:
+            daemon.close()
+        return first, second, bad, stats
+
+    first, second, bad, stats = asyncio.run(scenario())
+    assert first['ok'] and second['ok'] and not bad['ok']
+    dirs = {os.path.dirname(s['path']) for r in (first, second) for s in r['saves']}
+    # every job writes into a directory of its own under the output root
+    assert len(dirs) == 2 and all(d.startswith(str(tmp_path / 'root')) for d in dirs)
+    latency = first['latency']
+    assert latency['total'] >= latency['run'] >= 0 and latency['queue'] >= 0
+    assert stats['done'] == 3 and stats['failed'] == 1 and stats['active'] == 0
+    assert stats['latency']['stats']['job']['count'] == 3
+
+
+def test_serve_reads_lines_until_eof(tmp_path):
+    async def scenario():
+        daemon = cg_daemon.Daemon(0, str(tmp_path))
+        reader = asyncio.StreamReader()
+        for line in [json.dumps({'id': 1, 'script': SCRIPT}), '', 'not json', '[1]',
+                     json.dumps({'op': 'ping', 'id': 2})]:
+            reader.feed_data((line + '\n').encode())
+        reader.feed_eof()
+        responses = []
+
+        async def send(response):
+            responses.append(response)
+
+        try:
+            await daemon.serve(reader, send)
+        finally:
+            daemon.close()
+        return responses
+
+    responses = asyncio.run(scenario())
+    assert len(responses) == 4
+    assert sum(r.get('error', '').startswith('bad request') for r in responses
+               if not r['ok']) == 2
+    by_id = {r['id']: r for r in responses if 'id' in r}
+    assert by_id[1]['ok'] and len(by_id[1]['saves']) == 2 and by_id[2]['pong']
+
+
+def test_serve_stops_on_shutdown(tmp_path):
+    async def scenario():
+        daemon = cg_daemon.Daemon(0, str(tmp_path))
+        reader = asyncio.StreamReader()
+        reader.feed_data(b'{"op": "shutdown"}\n')
+        responses = []
+
+        async def send(response):
+            responses.append(response)
+
+        try:
+            # no EOF follows: only the shutdown request ends the loop
+            await asyncio.wait_for(daemon.serve(reader, send), 10)
+        finally:
+            daemon.close()
+        return responses
+
+    assert asyncio.run(scenario()) == [{'id': None, 'ok': True, 'shutdown': True}]
+
+
+def test_unix_socket_with_workers(tmp_path):
+    images = expected(tmp_path)
+    path = str(tmp_path / 'd.sock')
+
+    async def scenario():
+        daemon = cg_daemon.Daemon(1, str(tmp_path / 'root'))
+        try:
+            await daemon.start()
+            server = asyncio.create_task(cg_daemon.serve_unix(daemon, path))
+            while not os.path.exists(path):
+                await asyncio.sleep(0.01)
+            reader, writer = await asyncio.open_unix_connection(path, limit=cg_daemon.LINE_LIMIT)
+            for request in [{'id': 1, 'script': SCRIPT, 'return': 'images'},
+                            {'id': 2, 'op': 'ping'}]:
+                writer.write(cg_daemon.encode(request))
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in range(2)]
+            writer.write(cg_daemon.encode({'op': 'shutdown'}))
+            await writer.drain()
+            await asyncio.wait_for(server, 10)
+            writer.close()
+        finally:
+            daemon.close()
+        return responses
+
+    responses = {r['id']: r for r in asyncio.run(scenario())}
+    assert responses[2]['pong']
+    job = responses[1]
+    assert job['ok'] and job['pid'] != os.getpid()
+    assert {s['name']: base64.b64decode(s['bmp']) for s in job['saves']} == images
+    assert not os.path.exists(path)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# gen_workload 与 bench_scaling 的测试：脚本可复现、坐标落在画布内、保存次数，以及扩展性测试的运行与输出
+# 在 source 目录下运行：python -m pytest -q
+import io
+import builtins
+import csv
+import pytest
+import gen_workload
+import bench_scaling
+
+
+def script(**kwargs):
+    fp = io.StringIO()
+    count = gen_workload.generate(fp, **kwargs)
+    lines = fp.getvalue().splitlines()
+    assert count == len(lines)
+    return lines
+
+
+def test_same_seed_same_script():
+    assert script(items=50, seed=3) == script(items=50, seed=3)
+    assert script(items=50, seed=3) != script(items=50, seed=4)
+
+
+def test_draw_coordinates_inside_canvas():
+    width, height = 120, 90
+    for line in script(items=300, width=width, height=height, seed=1):
+        tokens = line.split()
+        if tokens[0][:4] == 'draw':
+            nums = [int(s) for s in tokens[2:] if s.isdigit()]
+            assert len(nums) == len(tokens[2:]) - (tokens[0] != 'drawEllipse')
+            assert all(0 <= x <= width for x in nums[0::2])
+            assert all(0 <= y <= height for y in nums[1::2])
+
+
+@pytest.mark.parametrize('saves', [0, 1, 7])
+def test_saves(saves):
+    lines = script(items=40, saves=saves, seed=2)
+    assert lines[0] == 'resetCanvas 800 600'
+    assert [s for s in lines if s.startswith('saveCanvas')] == \
+        [f'saveCanvas {k}' for k in range(1, saves + 1)]
+    if saves:
+        assert lines[-1].startswith('saveCanvas')
+
+
+def test_transforms_refer_to_live_items():
+    drawn, clipped = set(), set()
+    for line in script(items=200, transforms=2, clips=0.5, seed=5):
+        tokens = line.split()
+        if tokens[0][:4] == 'draw':
+            drawn.add(tokens[1])
+        elif tokens[0] in ('translate', 'rotate', 'scale', 'clip'):
+            assert tokens[1] in drawn and tokens[1] not in clipped
+            assert not (tokens[0] == 'rotate' and tokens[1][0] == 'e')
+            if tokens[0] == 'clip':
+                clipped.add(tokens[1])
+
+
+def test_mix_and_range():
+    assert gen_workload.parse_range('3-8') == (3, 8)
+    assert gen_workload.parse_range('5') == (5, 5)
+    assert gen_workload.parse_mix('line=4,curve') == {'line': 4., 'curve': 1.}
+    with pytest.raises(ValueError):
+        gen_workload.parse_mix('circle=1')
+    lines = script(items=30, mix={'ellipse': 1}, seed=0)
+    assert {s.split()[0] for s in lines if s.startswith('draw')} == {'drawEllipse'}
+
+
+def test_run_scaling(tmp_path):
+    seen = []
+    results = bench_scaling.run_scaling([5, 10], [(40, 30)], str(tmp_path), progress=seen.append,
+                                        saves=1, seed=0)
+    assert seen == results
+    assert [(r['items'], r['width'], r['height']) for r in results] == [(5, 40, 30), (10, 40, 30)]
+    assert all(r['ok'] and r['wall'] > 0 and r['peak_rss'] > 0 for r in results)
+    assert (tmp_path / '40x30_10' / '1.bmp').exists()
+    path = tmp_path / 'results.csv'
+    bench_scaling.write_csv(path, results)
+    with open(path, newline='') as fp:
+        rows = list(csv.DictReader(fp))
+    assert [int(r['items']) for r in rows] == [5, 10]
+    # failures are kept in the table rather than dropped
+    assert bench_scaling.format_result(dict(results[0], ok=False)).endswith('FAILED')
+
+
+def test_plot_without_matplotlib(tmp_path, monkeypatch):
+    real_import = builtins.__import__
+
+    def no_matplotlib(name, *args, **kwargs):
+        if name.startswith('matplotlib'):
+            raise ImportError(name)
+        return real_import(name, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, '__import__', no_matplotlib)
+    assert not bench_scaling.plot(tmp_path / 'scaling.png', [])
+    assert not (tmp_path / 'scaling.png').exists()
+
+
+def test_canvas_and_list_arguments():
+    assert bench_scaling.parse_canvas('800x600') == (800, 600)
+    assert bench_scaling.parse_canvas('256') == (256, 256)
+    assert bench_scaling.parse_list('1,10,100') == [1, 10, 100]
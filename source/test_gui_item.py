@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 图形界面图元 MyItem 的光栅化测试，不需要显示器
+# 在 source 目录下运行：python -m pytest -q
+import os
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+import numpy as np
+import pytest
+import cg_algorithms_np as npalg
+from PyQt5.QtGui import QColor
+from PyQt5.QtWidgets import QApplication
+from gui_item import MyItem
+
+
+@pytest.fixture(scope='module', autouse=True)
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def item_pixels(item):
+    item.update_pixel()
+    return {(x + item.offset[0], y + item.offset[1])
+            for pixels, _ in item.rasters for x, y in pixels.tolist()}
+
+
+@pytest.mark.parametrize('p_list', [[[8, 7], [9, 4], [10, 4], [3, 7]], [[5, 5]] * 5])
+def test_degenerate_bspline_in_progress(p_list):
+    item = MyItem('c', 'curve', p_list, QColor(0, 0, 0), 'B-spline')
+    expected = {tuple(p) for p in npalg.draw_curve(p_list, 'B-spline').tolist()}
+    assert len(expected) == 1
+    assert item_pixels(item) == expected
+    item.in_progress = False
+    assert item_pixels(item) == expected
+
+
+def drag(item, points):
+    '''模拟绘制：逐个提交顶点，每提交一个之前先把最后一个顶点拖过几个位置'''
+    for x, y in points:
+        for dx in (7, -3, 0):
+            item.p_list[-1] = [x + dx, y - dx]
+            yield
+        item.p_list.append([x, y])
+
+
+POLYLINE = [[3, 4], [40, 9], [35, 50], [-10, 30], [0, 0], [60, 61], [20, -15]]
+
+
+@pytest.mark.parametrize('algorithm', ['DDA', 'Bresenham'])
+def test_polygon_in_progress_matches_full_raster(algorithm):
+    item = MyItem('p', 'polygon', [[0, 0], [1, 1]], QColor(0, 0, 0), algorithm)
+    done = 0
+    for _ in drag(item, POLYLINE):
+        expected = {tuple(p) for p in npalg.draw_fold_line(item.p_list.real, algorithm).tolist()}
+        assert item_pixels(item) == expected
+        stable, _ = item.chain_cache
+        # committed vertices are drawn once and then reused
+        assert len(stable) == len(item.p_list) - 1
+        assert len(stable) >= done
+        done = len(stable)
+    item.in_progress = False
+    assert item_pixels(item) == {tuple(p) for p in npalg.draw_polygon(
+        item.p_list.real, algorithm).tolist()}
+
+
+def test_bspline_in_progress_matches_full_raster():
+    item = MyItem('c', 'curve', [[0, 0], [1, 1]], QColor(0, 0, 0), 'B-spline')
+    for _ in drag(item, POLYLINE + [[90, 5], [70, 70]]):
+        expected = {tuple(p) for p in npalg.draw_curve(item.p_list.real, 'B-spline').tolist()}
+        assert item_pixels(item) == expected
+    item_pixels(item)
+    # one cached segment per window of four control points
+    assert len(item.segment_cache) == len(item.p_list) - 3
+    cached = dict(item.segment_cache)
+    item.p_list[-1] = [80, 80]
+    item_pixels(item)
+    # only the segment ending at the moved point is evaluated again
+    kept = [key for key in item.segment_cache if key in cached]
+    assert len(kept) == len(cached) - 1
+    assert all(item.segment_cache[key] is cached[key] for key in kept)
@@ -0,0 +1,128 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 后台写图像 ImageWriter 与分块写 BMP 的 BmpStream 的测试
+# 在 source 目录下运行：python -m pytest -q
+import io
+import threading
+import numpy as np
+import pytest
+from PIL import Image
+import image_writer
+from image_writer import BmpStream, ImageWriter
+
+
+class RecordingWriter(ImageWriter):
+    '''不写盘，只按实际写出的顺序记录路径；gate被设置前写出会一直等待'''
+
+    def __init__(self, *args, **kwargs):
+        self.written = []
+        self.gate = threading.Event()
+        self.gate.set()
+        super().__init__(*args, **kwargs)
+
+    def write(self, canvas, path):
+        self.gate.wait()
+        if path.startswith('fail'):
+            raise OSError(f'cannot write {path}')
+        self.written.append(path)
+
+
+def canvas(seed=0, shape=(7, 5)):
+    return np.random.default_rng(seed).integers(0, 256, (*shape, 3), dtype=np.uint8)
+
+
+@pytest.mark.parametrize('max_pending', [0, 1, 4])
+def test_writes_in_submission_order(max_pending):
+    writer = RecordingWriter(max_pending)
+    paths = [f'{i}.bmp' for i in range(20)]
+    for path in paths:
+        writer.submit(canvas(), path)
+    writer.flush()
+    assert writer.written == paths
+    writer.close()
+    writer.close()
+
+
+def test_error_surfaces_on_next_call_and_drops_the_rest():
+    writer = RecordingWriter(4)
+    writer.gate.clear()
+    writer.submit(canvas(), 'a.bmp')
+    writer.submit(canvas(), 'fail.bmp')
+    writer.submit(canvas(), 'b.bmp')
+    writer.gate.set()
+    with pytest.raises(OSError, match='fail.bmp'):
+        writer.flush()
+    assert writer.written == ['a.bmp']
+    # reported once, the writer keeps working afterwards
+    writer.submit(canvas(), 'c.bmp')
+    writer.close()
+    assert writer.written == ['a.bmp', 'c.bmp']
+
+
+def test_error_surfaces_on_close():
+    writer = RecordingWriter(2)
+    writer.submit(canvas(), 'fail.bmp')
+    with pytest.raises(OSError):
+        writer.close()
+    writer.close()
+
+
+def test_synchronous_error_is_immediate():
+    writer = RecordingWriter(0)
+    with pytest.raises(OSError):
+        writer.submit(canvas(), 'fail.bmp')
+
+
+def test_submit_blocks_while_the_queue_is_full():
+    writer = RecordingWriter(1)
+    writer.gate.clear()
+    writer.submit(canvas(), '0.bmp')
+    # whether the thread already holds 0.bmp or not, 1.bmp and 2.bmp can't both fit
+    submitted = threading.Event()
+
+    def producer():
+        for i in (1, 2):
+            writer.submit(canvas(), f'{i}.bmp')
+        submitted.set()
+    thread = threading.Thread(target=producer)
+    thread.start()
+    assert not submitted.wait(0.2)
+    writer.gate.set()
+    thread.join(5)
+    assert submitted.is_set()
+    writer.close()
+    assert writer.written == ['0.bmp', '1.bmp', '2.bmp']
+
+
+def test_real_write_matches_pil(tmp_path):
+    image = canvas(3, (13, 9))
+    writer = ImageWriter(2)
+    writer.submit(image, str(tmp_path / 'a.bmp'))
+    writer.close()
+    expected = io.BytesIO()
+    Image.fromarray(image).save(expected, 'bmp')
+    assert (tmp_path / 'a.bmp').read_bytes() == expected.getvalue()
+    with pytest.raises(OSError):
+        writer = ImageWriter(2)
+        writer.submit(image, str(tmp_path / 'missing' / 'b.bmp'))
+        writer.close()
+
+
+@pytest.mark.parametrize('width, height', [(1, 1), (5, 3), (8, 8), (13, 7)])
+def test_bmp_stream_matches_pil(tmp_path, width, height):
+    image = canvas(width * height, (height, width))
+    path = tmp_path / 'tiled.bmp'
+    with BmpStream(str(path), width, height) as stream:
+        # bands in any order, of uneven heights
+        bands = [(y, min(y + 2, height)) for y in range(0, height, 2)]
+        for y0, y1 in reversed(bands):
+            stream.write_rows(y0, image[y0:y1])
+    expected = io.BytesIO()
+    Image.fromarray(image).save(expected, 'bmp')
+    assert path.read_bytes() == expected.getvalue()
+
+
+def test_bmp_header_rejects_huge_images():
+    with pytest.raises(ValueError):
+        image_writer.bmp_header(1 << 16, 1 << 16)
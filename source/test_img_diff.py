@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# img_diff（位于仓库根目录）的测试：逐像素比较、差异图、目录配对与regress回归流程，
+# 以及大图的内存映射分块比较与整张解码比较结果一致
+# 在 source 目录下运行：python -m pytest -q
+import os
+import sys
+import numpy as np
+from PIL import Image
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+import img_diff  # noqa: E402
+
+SCRIPT = '''resetCanvas 60 40
+setColor 255 0 0
+drawLine a 2 3 50 30 DDA
+drawEllipse b 10 5 40 35
+saveCanvas one
+drawPolygon c 5 5 55 8 30 35 Bresenham
+saveCanvas two
+'''
+
+
+def save(array, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(array).save(path)
+    return str(path)
+
+
+@pytest.fixture
+def image():
+    rng = np.random.default_rng(23)
+    return rng.integers(0, 256, (37, 53, 3), np.uint8)
+
+
+def test_identical(tmp_path, image):
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(image, tmp_path / 'b.bmp')
+    result = img_diff.compare_file(a, b, mode='full')
+    assert result['status'] == 'ok'
+    assert result['mismatches'] == 0 and result['pixels'] == 37 * 53
+
+
+def test_mismatch_bbox_and_diff_image(tmp_path, image):
+    other = image.copy()
+    other[4, 7] ^= 1
+    other[30, 40, 2] = 255 - other[30, 40, 2]
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(other, tmp_path / 'b.bmp')
+    diff = str(tmp_path / 'diff' / 'b.diff.png')
+    result = img_diff.compare_file(a, b, diff, mode='full')
+    assert result['status'] == 'mismatch'
+    assert result['mismatches'] == 2
+    assert result['bbox'] == [7, 4, 40, 30]
+    assert result['max_delta'] == abs(int(image[30, 40, 2]) - int(other[30, 40, 2]))
+    with Image.open(diff) as im:
+        marked = np.asarray(im.convert('RGB'))
+    assert (marked[4, 7] == (255, 0, 0)).all() and (marked[30, 40] == (255, 0, 0)).all()
+
+
+def test_size_missing_extra(tmp_path, image):
+    a = save(image, tmp_path / 'g' / 'a.bmp')
+    save(image[:, :50], tmp_path / 'o' / 'a.bmp')
+    save(image, tmp_path / 'g' / 'only_golden.bmp')
+    save(image, tmp_path / 'o' / 'sub' / 'only_output.bmp')
+    pairs = img_diff.pair_images(str(tmp_path / 'g'), str(tmp_path / 'o'))
+    assert [os.path.relpath(g, tmp_path / 'g') for g, _, _ in pairs] == \
+        ['a.bmp', 'only_golden.bmp', os.path.join('sub', 'only_output.bmp')]
+    results = img_diff.compare_pairs(pairs, mode='full')
+    assert [r['status'] for r in results] == ['size', 'missing', 'extra']
+    assert results[0]['golden'] == a
+
+
+def test_unreadable_image_is_an_error(tmp_path, image):
+    a = save(image, tmp_path / 'a.bmp')
+    bad = tmp_path / 'b.bmp'
+    bad.write_bytes(b'not an image')
+    result = img_diff.compare_file(a, str(bad), mode='full')
+    assert result['status'] == 'error' and result['error']
+
+
+def test_pool_matches_serial(tmp_path, image):
+    pairs = []
+    for k in range(3):
+        other = image.copy()
+        other[k, k] = 0
+        pairs.append((save(image, tmp_path / 'g' / f'{k}.bmp'),
+                      save(other, tmp_path / 'o' / f'{k}.bmp'), None))
+    assert img_diff.compare_pairs(pairs, jobs=2, mode='full') == \
+        img_diff.compare_pairs(pairs, jobs=1, mode='full')
+
+
+def test_regress(tmp_path, capsys):
+    scripts = tmp_path / 'scripts'
+    scripts.mkdir()
+    (scripts / 'scene.txt').write_text(SCRIPT)
+    golden = tmp_path / 'golden'
+    assert img_diff.main(['regress', str(scripts), '-g', str(golden), '--update', '-j', '1']) == 0
+    assert sorted(os.listdir(golden / 'scene')) == ['one.bmp', 'two.bmp']
+    args = ['regress', str(scripts), '-g', str(golden), '-o', str(tmp_path / 'out'),
+            '-d', str(tmp_path / 'diff'), '-j', '1']
+    capsys.readouterr()
+    assert img_diff.main(args) == 0
+    assert '2 images compared, 2 identical' in capsys.readouterr().out
+
+    with Image.open(golden / 'scene' / 'two.bmp') as im:
+        pixels = np.array(im.convert('RGB'))
+    pixels[0, 0] = 0
+    save(pixels, golden / 'scene' / 'two.bmp')
+    assert img_diff.main(args) == 1
+    out = capsys.readouterr().out
+    assert 'MISMATCH' in out and '1 differ or are missing' in out
+    assert (tmp_path / 'diff' / 'scene' / 'two.diff.png').exists()
+
+
+def top_down(path, out):
+    '''把PIL写出的自下而上的BMP改写成高度为负、自上而下存放的同一张图'''
+    offset, width, height, stride, _ = img_diff.bmp_layout(path)
+    data = bytearray(open(path, 'rb').read())
+    rows = [data[offset + r * stride:offset + (r + 1) * stride] for r in range(height)]
+    data[offset:offset + height * stride] = b''.join(reversed(rows))
+    data[22:26] = (-height).to_bytes(4, 'little', signed=True)
+    with open(out, 'wb') as fp:
+        fp.write(data)
+    return str(out)
+
+
+def changed(image):
+    other = image.copy()
+    other[2, 50] = 0
+    other[20, 3, 1] ^= 0x80
+    other[36, 11] = 255
+    return other
+
+
+@pytest.mark.parametrize('chunk_bytes', [1, 160, 1 << 20])
+@pytest.mark.parametrize('flip', [False, True])
+def test_mapped_matches_full(tmp_path, image, chunk_bytes, flip):
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(changed(image), tmp_path / 'b.bmp')
+    if flip:
+        a = top_down(a, tmp_path / 'a_td.bmp')
+        b = top_down(b, tmp_path / 'b_td.bmp')
+    full = img_diff.compare_file(a, b, mode='full')
+    mapped = img_diff.compare_file(a, b, mode='mmap', chunk_bytes=chunk_bytes)
+    for key in ('status', 'pixels', 'mismatches', 'bbox', 'max_delta'):
+        assert mapped[key] == full[key]
+    # the first difference in file order: bottom row first unless stored top-down
+    assert mapped['first'] == ([50, 2] if flip else [11, 36])
+    chunks = mapped['chunks']
+    assert sum(c['mismatches'] for c in chunks) == 3
+    covered = sorted(y for c in chunks for y in range(*c['rows']))
+    assert covered == list(range(image.shape[0]))
+
+
+def test_mapped_strict_stops_at_first_bad_chunk(tmp_path, image):
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(changed(image), tmp_path / 'b.bmp')
+    stride = img_diff.bmp_layout(a)[3]
+    result = img_diff.compare_file(a, b, mode='mmap', strict=True, chunk_bytes=stride)
+    # file rows run bottom-up: row 36 is the first chunk and holds one difference
+    assert len(result['chunks']) == 1
+    assert result['chunks'][0]['rows'] == [36, 37]
+    assert result['status'] == 'mismatch' and result['mismatches'] == 1
+
+
+def test_mapped_size_and_truncated(tmp_path, image):
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(image[:30], tmp_path / 'b.bmp')
+    assert img_diff.compare_file(a, b, mode='mmap')['status'] == 'size'
+    data = open(a, 'rb').read()
+    cut = tmp_path / 'cut.bmp'
+    cut.write_bytes(data[:-100])
+    result = img_diff.compare_file(a, str(cut), mode='mmap')
+    assert result['status'] == 'error' and 'truncated' in result['error']
+
+
+def test_auto_mode(tmp_path, image, monkeypatch):
+    a = save(image, tmp_path / 'a.bmp')
+    b = save(image, tmp_path / 'b.bmp')
+    png = save(image, tmp_path / 'b.png')
+    assert not img_diff.use_mapped(a, b, 'auto')
+    monkeypatch.setattr(img_diff, 'MMAP_MIN_BYTES', 1)
+    assert img_diff.use_mapped(a, b, 'auto')
+    # anything but an uncompressed 24-bit BMP falls back to decoding
+    assert not img_diff.use_mapped(a, png, 'auto')
+    assert img_diff.compare_file(a, png)['status'] == 'ok'
+    assert 'chunks' in img_diff.compare_file(a, b)
+    with pytest.raises(ValueError):
+        img_diff.bmp_layout(png)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 仿射矩阵（cg_algorithms_np）与图形界面顶点列表 PList 的测试
+# 在 source 目录下运行：python -m pytest -q
+import math
+import random
+import numpy as np
+import pytest
+import cg_algorithms as alg
+import cg_algorithms_np as npalg
+from my_plist import PList
+
+rng = random.Random(0)
+POINTS = [[rng.randint(-200, 200), rng.randint(-200, 200)] for _ in range(50)]
+
+
+def as_lists(points):
+    return [list(p) for p in points]
+
+
+def test_matrices_match_scalar_transforms():
+    for dx, dy in [(0, 0), (3, -7), (-120, 45)]:
+        assert npalg.affine_points(npalg.translate_matrix(dx, dy), POINTS).tolist() \
+            == as_lists(alg.translate(POINTS, dx, dy))
+    for x, y, r in [(0, 0, 90), (5, 5, 30), (-17, 40, 245), (3, 3, 360)]:
+        assert npalg.affine_points(npalg.rotate_matrix(x, y, r), POINTS).tolist() \
+            == as_lists(alg.rotate(POINTS, x, y, r))
+    for x, y, sx, sy in [(0, 0, 2, None), (5, 5, 0.5, None), (-9, 12, 1.5, 0.25)]:
+        assert npalg.affine_points(npalg.scale_matrix(x, y, sx, sy), POINTS).tolist() \
+            == as_lists(alg.scale(POINTS, x, y, sx, sy))
+
+
+def test_compose_order():
+    # translate first, then rotate about the origin
+    matrix = npalg.compose(npalg.translate_matrix(10, 0), npalg.rotate_matrix(0, 0, 90))
+    assert npalg.affine_points(matrix, [[0, 0]]).tolist() == [[0, 10]]
+    assert np.array_equal(npalg.compose(), np.eye(3))
+    many = npalg.affine_many(matrix, [POINTS[:3], POINTS[3:4], POINTS[4:9]])
+    assert [len(p) for p in many] == [3, 1, 5]
+    assert np.concatenate(many).tolist() == npalg.affine_points(matrix, POINTS[:9]).tolist()
+    assert npalg.affine_many(matrix, []) == []
+
+
+def exact_rotate(p_list, x, y, r):
+    arc = math.radians(r)
+    return [((x0 - x) * math.cos(arc) - (y0 - y) * math.sin(arc) + x,
+             (x0 - x) * math.sin(arc) + (y0 - y) * math.cos(arc) + y) for x0, y0 in p_list]
+
+
+def test_plist_rounds_once():
+    p_list = PList(POINTS)
+    exact = [tuple(p) for p in POINTS]
+    for _ in range(36):
+        p_list.rotate([7, -3], 10)
+        exact = exact_rotate(exact, 7, -3, 10)
+    # the untransformed points are kept, only the view is rounded
+    assert list(map(list, p_list)) == POINTS
+    assert p_list.real == [[round(x), round(y)] for x, y in exact]
+    # rounding after every step drifts away instead
+    stepwise = POINTS
+    for _ in range(36):
+        stepwise = alg.rotate(stepwise, 7, -3, 10)
+    assert as_lists(stepwise) != p_list.real
+
+
+def test_plist_translate_and_scale():
+    p_list = PList(POINTS[:4])
+    p_list.translate(5, -2)
+    assert p_list.real == as_lists(alg.translate(POINTS[:4], 5, -2))
+    p_list.scale([0, 0], 2, 2)
+    assert p_list.real == as_lists(alg.scale(alg.translate(POINTS[:4], 5, -2), 0, 0, 2))
+
+
+def test_plist_scale_set_replaces_the_dragged_scale():
+    p_list = PList(POINTS[:4])
+    p_list.scale_set([10, 10], 2, 2)
+    p_list.scale_set([10, 10], 3, 0.5)
+    assert p_list.real == as_lists(alg.scale(POINTS[:4], 10, 10, 3, 0.5))
+    # a new center far away folds the previous scale in first
+    p_list.scale_set([100, 100], 2, 2)
+    matrix = npalg.compose(npalg.scale_matrix(10, 10, 3, 0.5), npalg.scale_matrix(100, 100, 2))
+    assert p_list.real == npalg.affine_points(matrix, POINTS[:4]).tolist()
+    # a zero scale is clamped, so the transform stays invertible
+    p_list.scale_set([100, 100], 0, 0)
+    assert np.linalg.det(p_list.affine) != 0
+
+
+def test_plist_copy_and_update():
+    p_list = PList(POINTS[:3])
+    p_list.rotate([0, 0], 45)
+    p_list.scale_set([1, 1], 2, 2)
+    copy = PList(p_list)
+    assert copy.real == p_list.real
+    copy.translate(1, 1)
+    assert copy.real != p_list.real
+    real = p_list.real
+    p_list.update()
+    assert list(map(list, p_list)) == real
+    assert np.array_equal(p_list.matrix, np.eye(3)) and p_list.sc is None
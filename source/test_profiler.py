@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# profiler 的测试：直方图估计的百分位数、内存有界、线程安全，以及报告与表格
+# 在 source 目录下运行：python -m pytest -q
+import json
+import random
+import threading
+import pytest
+import profiler as profiling
+
+
+def test_percentiles_within_half_a_bin():
+    rng = random.Random(20)
+    samples = [10 ** rng.uniform(-6, -1) for _ in range(5000)]
+    prof = profiling.Profiler()
+    for s in samples:
+        prof.record('op', s)
+    stats = prof.report()['stats']['op']
+    ordered = sorted(samples)
+    tolerance = 10 ** (1 / profiling.BINS_PER_DECADE)
+    for key, q in [('p50', 50), ('p99', 99)]:
+        exact = ordered[max(0, -(-len(ordered) * q // 100) - 1)]
+        assert exact / tolerance <= stats[key] <= exact * tolerance
+    assert stats['count'] == len(samples)
+    assert stats['total'] == pytest.approx(sum(samples))
+    assert stats['max'] == max(samples)
+
+
+def test_percentile_clamped_to_extremes():
+    prof = profiling.Profiler()
+    for s in [0, 1e-12, 5e-3, 1e6]:
+        prof.record('op', s)
+    stats = prof.report()['stats']['op']
+    # out-of-range samples fall in the edge bins and report the extremes
+    assert stats['p50'] == 0
+    assert stats['p99'] == stats['max'] == 1e6
+
+
+def test_memory_does_not_grow():
+    series = profiling._Series()
+    size = len(series.bins)
+    for k in range(100000):
+        series.add(k * 1e-7, k)
+    assert len(series.bins) == size == profiling.BINS + 2
+    assert sum(series.bins) == series.count == 100000
+
+
+def test_pixels_only_for_names_that_produce_them():
+    prof = profiling.Profiler()
+    prof.record('encode', 0.01, 100)
+    prof.record('encode', 0.02, 50)
+    prof.record('parse', 0.001)
+    stats = prof.report()['stats']
+    assert stats['encode']['pixels'] == 150
+    assert stats['parse']['pixels'] is None
+    table = prof.table()
+    line = next(row for row in table.splitlines() if row.startswith('parse'))
+    assert line.split()[-1] == '-'
+    # rows are sorted by total time
+    assert table.splitlines()[1].startswith('encode')
+    assert table.splitlines()[-1].startswith('wall')
+
+
+def test_concurrent_records():
+    prof = profiling.Profiler()
+
+    def work():
+        for _ in range(2000):
+            prof.record('op', 1e-4, 1)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = prof.report()['stats']['op']
+    assert stats['count'] == stats['pixels'] == 8000
+
+
+def test_dump(tmp_path):
+    prof = profiling.Profiler()
+    prof.since('op', profiling.clock())
+    report = prof.dump(tmp_path / 'report.json')
+    with open(tmp_path / 'report.json') as fp:
+        assert json.load(fp) == report
+    assert report['stats']['op']['count'] == 1
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+# -*- coding:utf-8 -*-
+
+# 光栅化结果 LRU 缓存的测试
+# 在 source 目录下运行：python -m pytest -q
+import numpy as np
+import pytest
+import cg_cli
+from raster_cache import RasterCache, make_key
+
+
+def block(n):
+    '''占用 n * 8 字节的值'''
+    return np.zeros(n, np.int64)
+
+
+def test_make_key_normalizes_points():
+    key = make_key('spans', 'line', [[1, 2], (3.0, np.int64(4))], 'DDA')
+    assert key == ('spans', 'line', 'DDA', ((1, 2), (3, 4)))
+    assert hash(key) == hash(make_key('spans', 'line', [(1, 2), [3, 4]], 'DDA'))
+    assert make_key('pixels', 'line', [[1, 2]], 'DDA') != make_key('spans', 'line', [[1, 2]], 'DDA')
+
+
+def test_evicts_least_recently_used_by_bytes():
+    cache = RasterCache(max_bytes=8 * 30)
+    for name in 'abc':
+        cache.put(name, block(10))
+    assert cache.nbytes == 8 * 30 and len(cache) == 3
+    cache.get('a')  # now b is the oldest
+    cache.put('d', block(10))
+    assert [k for k in 'abcd' if k in cache] == ['a', 'c', 'd']
+    # a large value pushes out as many entries as it needs
+    cache.put('e', block(25))
+    assert [k for k in 'abcde' if k in cache] == ['e']
+    assert cache.nbytes == 8 * 25
+
+
+def test_oversized_values_and_replacement():
+    cache = RasterCache(max_bytes=100)
+    value = cache.put('big', block(50))
+    assert 'big' not in cache and cache.nbytes == 0
+    assert not value.flags.writeable
+    cache.put('k', block(5))
+    cache.put('k', block(10))
+    assert len(cache) == 1 and cache.nbytes == 80
+    assert RasterCache(max_bytes=0).put('x', block(1)) is not None
+
+
+def test_values_are_read_only():
+    cache = RasterCache()
+    pixels, spans = cache.put('k', (block(3), block(4)))
+    with pytest.raises(ValueError):
+        pixels[0] = 1
+    assert not spans.flags.writeable
+
+
+def test_lookup_computes_once_and_counts():
+    cache = RasterCache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return block(2)
+    first = cache.lookup('k', compute)
+    assert cache.lookup('k', compute) is first
+    assert len(calls) == 1
+    assert cache.get('missing') is None
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses']) == (1, 2)
+    assert stats['hit_rate'] == pytest.approx(1 / 3)
+
+
+def test_resize_clear_and_kinds():
+    cache = RasterCache()
+    cache.put(make_key('spans', 'line', [[0, 0]], 'DDA'), block(4))
+    cache.put(make_key('spans', 'ellipse', [[0, 0]], None), block(6))
+    cache.put(make_key('pixels', 'curve', [[0, 0]], 'Bezier'), block(3))
+    cache.put(make_key('pixels', 'curve', [[1, 0]], 'Bezier'), np.empty((0, 2), np.int32))
+    kinds = cache.stats()['kinds']
+    assert kinds == {'spans': {'entries': 2, 'bytes': 80}, 'pixels': {'entries': 2, 'bytes': 24}}
+    cache.resize(8 * 9)
+    assert cache.nbytes <= 8 * 9
+    assert sum(k['entries'] for k in cache.stats()['kinds'].values()) == len(cache)
+    assert sum(k['bytes'] for k in cache.stats()['kinds'].values()) == cache.nbytes
+    cache.clear()
+    assert len(cache) == 0 and cache.nbytes == 0 and cache.stats()['kinds'] == {}
+
+
+def test_cli_caches_curves_as_pixels():
+    cache = RasterCache()
+    items = [['line', [[0, 0], [10, 3]], 'Bresenham', None],
+             ['ellipse', [[0, 0], [10, 6]], None, None],
+             ['curve', [[0, 0], [5, 9], [10, 0]], 'Bezier', None]]
+    rasters = cg_cli.rasterize(items, cache)
+    assert [r.shape[1] for r in rasters] == [3, 3, 2]
+    kinds = cache.stats()['kinds']
+    assert kinds['spans']['entries'] == 2 and kinds['pixels']['entries'] == 1
+    # a second pass is served from the cache
+    again = cg_cli.rasterize(items, cache)
+    assert all(np.array_equal(a, b) for a, b in zip(rasters, again))
+    assert cache.stats()['hits'] == 3